@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+u"""Performance benchmarks.
+
+Every module is run from the repository root, e.g.::
+
+    python -m benchmarks.bench_parser
+"""
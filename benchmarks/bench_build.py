@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+u"""Compares building trees out of dicts with ``build_etree`` and ``dict_to_etree``.
+
+.. :module: bench_build
+   :synopsis: Compares building trees out of dicts with ``build_etree`` and ``dict_to_etree``.
+"""
+from lxml import etree
+
+from benchmarks.documents import best_of, cars_message, report
+from mappet import helpers
+
+
+def main():
+    for count in (100, 10000):
+        print '{} cars'.format(count)
+        tree = etree.fromstring(cars_message(count))
+        _, value = helpers.etree_to_dict(tree, without_comments=True).popitem()
+
+        expected = etree.tostring(helpers.dict_to_etree(value, etree.Element('root')))
+        assert etree.tostring(helpers.build_etree(value, etree.Element('root'))) == expected
+
+        number = 3 if count > 1000 else 100
+        baseline = best_of(lambda: helpers.dict_to_etree(value, etree.Element('root')), number)
+        report('dict_to_etree', baseline)
+        report('build_etree', best_of(lambda: helpers.build_etree(value, etree.Element('root')), number), baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+u"""Compares lazy lists of repeated children with lists of mappet objects.
+
+.. :module: bench_children
+   :synopsis: Compares lazy lists of repeated children with lists of mappet objects.
+"""
+from benchmarks.documents import best_of, cars_message, report
+from mappet.mappet import Mappet
+
+
+def children_list(cars, name):
+    u"""Attribute access before children were returned as lazy lists."""
+    children = cars.children(name)
+    if len(children) > 1:
+        return children
+    elif len(children) == 1:
+        return children[0]
+
+
+def main():
+    for count in (100, 50000):
+        cars = Mappet(cars_message(count)).reply.cars
+        print '{} cars'.format(count)
+
+        baseline = best_of(lambda: children_list(cars, 'car')[-1], 10, repeat=3)
+        report('children()[-1]', baseline)
+        report('car[-1]', best_of(lambda: cars.car[-1], 10, repeat=3), baseline)
+
+        baseline = best_of(lambda: len(children_list(cars, 'car')), 10, repeat=3)
+        report('len(children())', baseline)
+        report('len(car)', best_of(lambda: len(cars.car), 10, repeat=3), baseline)
+
+        baseline = best_of(lambda: [car for car in children_list(cars, 'car')], 10, repeat=3)
+        report('iterating children()', baseline)
+        report('iterating car', best_of(lambda: [car for car in cars.car], 10, repeat=3), baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+
+u"""Compares extraction of columns of values with loops over mappet objects.
+
+.. :module: bench_column
+   :synopsis: Compares extraction of columns of values with loops over mappet objects.
+"""
+from benchmarks.documents import best_of, cars_message, report
+from mappet.mappet import Mappet
+
+
+def main():
+    for count in (100, 50000):
+        m = Mappet(cars_message(count))
+        print '{} cars'.format(count)
+
+        expected = [car.hp.to_int() for car in m.reply.cars.car]
+        assert m.column('reply.cars.car', 'hp', as_numpy=False).tolist() == expected
+
+        baseline = best_of(lambda: [car.hp.to_int() for car in m.reply.cars.car], 10, repeat=3)
+        report('loop with to_int()', baseline)
+        report('lxml iter', best_of(lambda: [int(hp.text) for hp in m._xml.iter('HP')], 10, repeat=3), baseline)
+        report('column', best_of(lambda: m.column('reply.cars.car', 'hp', as_numpy=False), 10, repeat=3), baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+u"""Compares parsing of ISO 8601 dates and times with ``dateutil``.
+
+.. :module: bench_dates
+   :synopsis: Compares parsing of ISO 8601 dates and times with ``dateutil``.
+"""
+import dateutil.parser
+
+from benchmarks.documents import best_of, cars_message, report
+from mappet import helpers
+from mappet.mappet import Mappet
+
+
+def dateutil_time(value):
+    u"""``to_time`` before ISO times were parsed without ``dateutil``."""
+    sep = value[2:3]
+    if not (sep == ':' or sep.isdigit()):
+        value = value[:2] + ':00' + value[2:]
+    return dateutil.parser.parse(value).time()
+
+
+def main():
+    head = Mappet(cars_message(1)).head
+    date = head.date.get()
+    values = [
+        (date, dateutil.parser.parse, helpers.to_datetime),
+        (head.id['@tstamp'], dateutil.parser.parse, helpers.to_datetime),
+        (date[:10], dateutil.parser.parse, helpers.to_date),
+        (date[11:], dateutil_time, helpers.to_time),
+    ]
+
+    for value, former, helper in values:
+        print value
+        assert former(value) == helper(value)
+
+        baseline = best_of(lambda: former(value), 1000)
+        report('dateutil', baseline)
+
+        helpers.cache_dates(0)
+        report(helper.__name__, best_of(lambda: helper(value), 1000), baseline)
+
+        helpers.cache_dates(1024)
+        report(helper.__name__ + ' (cached)', best_of(lambda: helper(value), 1000), baseline)
+        helpers.cache_dates(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+u"""Compares existence checks of paths with checks of ``sget`` results.
+
+.. :module: bench_exists
+   :synopsis: Compares existence checks of paths with checks of ``sget`` results.
+"""
+from benchmarks.documents import best_of, cars_message, report
+from mappet.mappet import NONE_NODE, Mappet
+
+
+def nested(depth):
+    u"""Returns a document with ``depth`` levels of nodes, each with a few siblings."""
+    xml = '<leaf attr="1">text</leaf>'
+    for level in reversed(xrange(depth)):
+        xml = '<level{0}>{1}<sibling/><sibling/></level{0}>'.format(level, xml)
+    return '<root>{}</root>'.format(xml)
+
+
+def sget_contains(m, path):
+    u"""The former implementation of ``in``."""
+    elem = m.sget(path)
+    return not (elem is None or elem is NONE_NODE)
+
+
+def attribute_contains(m, path):
+    u"""``in`` before paths were compiled."""
+    elem = Mappet.compile_path(path).resolve_attributes(m)
+    return not (elem is None or elem is NONE_NODE)
+
+
+def main():
+    depth = 20
+    levels = '.'.join('level{}'.format(level) for level in xrange(depth))
+    documents = [
+        (Mappet(nested(depth)), [levels + '.leaf.@attr', levels + '.fake', 'level0.level1.fake']),
+        (Mappet(cars_message(1000)), ['reply.cars.car.500.hp', 'reply.cars.car.-1.id.#text', 'reply.cars.fake']),
+    ]
+
+    for m, paths in documents:
+        for path in paths:
+            print path[-40:]
+            assert sget_contains(m, path) == (path in m)
+
+            baseline = best_of(lambda: attribute_contains(m, path), 1000)
+            report('attribute access', baseline)
+            report('sget', best_of(lambda: sget_contains(m, path), 1000), baseline)
+            report('in', best_of(lambda: path in m, 1000), baseline)
+
+
+if __name__ == '__main__':
+    main()
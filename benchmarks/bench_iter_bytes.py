@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+u"""Compares serializing documents in chunks with ``to_str``.
+
+.. :module: bench_iter_bytes
+   :synopsis: Compares serializing documents in chunks with ``to_str``.
+"""
+from benchmarks.documents import best_of, cars_message, report
+from mappet import mappet
+from mappet.parsing import FAST_PARSER
+
+
+def main():
+    for name, m in (
+        ('10000 cars', mappet.Mappet(cars_message(10000))),
+        ('10000 cars, without blank text', mappet.Mappet(cars_message(10000), FAST_PARSER)),
+    ):
+        print name
+        for options in ({}, {'pretty_print': True, 'encoding': 'utf-8'}, {'without_comments': True}):
+            assert ''.join(m.iter_bytes(**options)) == m.to_str(**options)
+
+            print '  {}'.format(options or 'default options')
+            baseline = best_of(lambda: m.to_str(**options), 5)
+            report('to_str', baseline)
+            report('iter_bytes, first chunk', best_of(lambda: next(m.iter_bytes(**options)), 5), baseline)
+            report('iter_bytes, all chunks', best_of(lambda: list(m.iter_bytes(**options)), 5), baseline)
+
+
+if __name__ == '__main__':
+    main()
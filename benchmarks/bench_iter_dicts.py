@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+u"""Compares peak memory of streaming records as dicts with converting whole documents.
+
+Every way of reading runs in a new process, which reports its peak memory.
+
+.. :module: bench_iter_dicts
+   :synopsis: Compares peak memory of streaming records as dicts with converting whole documents.
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.documents import cars_message
+from mappet import mappet
+
+COUNT = 50000
+
+
+def read_to_dict(filename):
+    u"""Converts the whole document, then picks out the records."""
+    return sum(int(car['HP']) for car in mappet.Mappet.from_file(filename).to_dict()['reply']['cars']['Car'])
+
+
+def read_iter_dicts(filename):
+    u"""Streams the records as dicts."""
+    return sum(int(car['HP']) for car in mappet.iter_dicts(filename, 'car'))
+
+
+READERS = {
+    'to_dict': read_to_dict,
+    'iter_dicts': read_iter_dicts,
+}
+
+
+def run(name, filename):
+    u"""Reads the document in the current process and prints the results."""
+    start = time.time()
+    total = READERS[name](filename)
+    print '{:<40} {:>10.1f} ms {:>8.1f} MB peak (sum {})'.format(
+        name,
+        (time.time() - start) * 1000,
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        total,
+    )
+
+
+def main():
+    with tempfile.NamedTemporaryFile(suffix='.xml', delete=False) as xml:
+        xml.write(cars_message(COUNT))
+
+    try:
+        print '{} cars, {:.1f} MB'.format(COUNT, os.path.getsize(xml.name) / 1e6)
+        for name in ('to_dict', 'iter_dicts'):
+            subprocess.check_call([sys.executable, '-m', 'benchmarks.bench_iter_dicts', name, xml.name])
+    finally:
+        os.remove(xml.name)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        run(*sys.argv[1:])
+    else:
+        main()
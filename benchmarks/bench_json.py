@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+u"""Compares converting documents from and to JSON with and without intermediate dicts.
+
+Every conversion runs in a new process, which reports its time and peak memory.
+
+.. :module: bench_json
+   :synopsis: Compares converting documents from and to JSON with and without intermediate dicts.
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.documents import cars_message
+from mappet import mappet
+
+COUNT = 50000
+
+
+def load_dict(filename):
+    u"""Decodes the JSON into dicts, then builds the tree."""
+    with open(filename) as fp:
+        return mappet.Mappet(json.load(fp))
+
+
+def load_json(filename):
+    u"""Builds the tree while the JSON is decoded."""
+    with open(filename) as fp:
+        return mappet.Mappet.from_json(fp)
+
+
+def dump_dict(filename):
+    u"""Converts the tree to dicts, then encodes them."""
+    m = mappet.Mappet.from_file(filename)
+    with open(os.devnull, 'w') as fp:
+        json.dump(m.to_dict(without_comments=True), fp)
+
+
+def dump_json(filename):
+    u"""Writes the JSON while the tree is walked."""
+    m = mappet.Mappet.from_file(filename)
+    with open(os.devnull, 'w') as fp:
+        m.to_json(fp, without_comments=True)
+
+
+CONVERSIONS = {
+    'Mappet(json.load(fp))': (load_dict, '.json'),
+    'Mappet.from_json(fp)': (load_json, '.json'),
+    'json.dump(m.to_dict(), fp)': (dump_dict, '.xml'),
+    'm.to_json(fp)': (dump_json, '.xml'),
+}
+
+
+def run(name, filename):
+    u"""Runs a conversion in the current process and prints the results."""
+    start = time.time()
+    CONVERSIONS[name][0](filename)
+    print '{:<40} {:>10.1f} ms {:>8.1f} MB peak'.format(
+        name,
+        (time.time() - start) * 1000,
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    )
+
+
+def main():
+    files = {}
+    with tempfile.NamedTemporaryFile(suffix='.xml', delete=False) as xml:
+        xml.write(cars_message(COUNT))
+        files['.xml'] = xml.name
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as body:
+        mappet.Mappet.from_file(xml.name).to_json(body, without_comments=True)
+        files['.json'] = body.name
+
+    try:
+        print '{} cars, {:.1f} MB of JSON'.format(COUNT, os.path.getsize(body.name) / 1e6)
+        for name in ('Mappet(json.load(fp))', 'Mappet.from_json(fp)', 'json.dump(m.to_dict(), fp)', 'm.to_json(fp)'):
+            subprocess.check_call([sys.executable, '-m', 'benchmarks.bench_json', name, files[CONVERSIONS[name][1]]])
+    finally:
+        for filename in files.values():
+            os.remove(filename)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        run(*sys.argv[1:])
+    else:
+        main()
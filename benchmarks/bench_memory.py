@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+u"""Measures memory and attribute dispatch of slotted mappet objects.
+
+Slotted classes are compared with subclasses adding a ``__dict__``, which is
+the layout the classes used to have, checking class members with ``dir``.
+
+.. :module: bench_memory
+   :synopsis: Measures memory and attribute dispatch of slotted mappet objects.
+"""
+import sys
+
+from lxml import etree
+
+from benchmarks.documents import best_of, report
+from mappet.mappet import Literal, Mappet
+
+
+class DictMappet(Mappet):
+    u"""A mappet object with the former ``__dict__`` layout and members check."""
+
+    def __setattr__(self, name, value):
+        if name not in dir(self.__class__):
+            return self.set(name, value)
+
+        return super(Mappet, self).__setattr__(name, value)
+
+
+class DictLiteral(Literal):
+    u"""A literal with the former ``__dict__`` layout."""
+
+
+def wrapper_size(obj):
+    u"""Returns the size of an object with its ``__dict__``, without the lxml element."""
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def main():
+    root = etree.Element('root')
+    leaf = etree.SubElement(root, 'leaf')
+    count = 1000000
+
+    print 'bytes per wrapper'
+    for cls, element in ((Mappet, root), (DictMappet, root), (Literal, leaf), (DictLiteral, leaf)):
+        print '{:<40} {:>10}'.format(cls.__name__, wrapper_size(cls(element)))
+
+    mappets = [Mappet(root) for _ in xrange(count)]
+    print '{:<40} {:>10.1f} MB'.format(
+        '{} Mappet objects'.format(count), sum(wrapper_size(m) for m in mappets) / 1e6
+    )
+    del mappets
+    mappets = [DictMappet(root) for _ in xrange(count)]
+    print '{:<40} {:>10.1f} MB'.format(
+        '{} DictMappet objects'.format(count), sum(wrapper_size(m) for m in mappets) / 1e6
+    )
+    del mappets
+
+    print 'attribute dispatch'
+    m = Mappet(root)
+    legacy = DictMappet(root)
+    number = 100000
+
+    def assign(obj):
+        obj._index = None
+
+    baseline = best_of(lambda: assign(legacy), number)
+    report('slot assignment, dir()', baseline)
+    report('slot assignment, frozenset', best_of(lambda: assign(m), number), baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+u"""Compares traversing documents of native elements and of wrapped ones.
+
+.. :module: bench_native
+   :synopsis: Compares traversing documents of native elements and of wrapped ones.
+"""
+from io import BytesIO
+
+from benchmarks.documents import best_of, cars_message, report
+from mappet import native
+from mappet.mappet import Mappet
+
+
+def read_cars(m):
+    u"""Reads a few values of every car, the way a batch job would."""
+    return sum(car.hp.to_int() + len(car.model_name.to_str()) for car in m.reply.cars.car)
+
+
+def stream_cars(records):
+    return sum(car.hp.to_int() + len(car.model_name.to_str()) for car in records)
+
+
+def main():
+    for count in (100, 10000, 100000):
+        xml = cars_message(count)
+        number = max(1, 1000 // count)
+        print '{} cars, {} kB'.format(count, len(xml) // 1024)
+
+        wrapped = Mappet(xml)
+        elements = native.fromstring(xml)
+        assert read_cars(wrapped) == read_cars(elements)
+
+        baseline = best_of(lambda: read_cars(wrapped), number, repeat=3)
+        report('traversal, Mappet', baseline)
+        report('traversal, MappetElement', best_of(lambda: read_cars(elements), number, repeat=3), baseline)
+
+        baseline = best_of(lambda: stream_cars(Mappet.iter_records(BytesIO(xml), 'car')), number, repeat=3)
+        report('iter_records, Mappet', baseline)
+        report(
+            'iter_records, MappetElement',
+            best_of(lambda: stream_cars(native.iter_records(BytesIO(xml), 'car')), number, repeat=3),
+            baseline,
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+u"""Measures how Mappet.parse_many scales with the number of workers.
+
+.. :module: bench_parse_many
+   :synopsis: Measures how Mappet.parse_many scales with the number of workers.
+"""
+from multiprocessing import cpu_count
+import time
+
+from benchmarks.documents import cars_message, report
+from mappet.mappet import Mappet
+
+
+def to_dict(m):
+    return m.to_dict()
+
+
+def best_of(fn, repeat=3):
+    timings = []
+    for _ in xrange(repeat):
+        start = time.time()
+        fn()
+        timings.append(time.time() - start)
+    return min(timings)
+
+
+def main():
+    sources = [cars_message(20) for _ in xrange(2000)]
+    print '{} documents, {} CPUs'.format(len(sources), cpu_count())
+
+    for transform in (None, to_dict):
+        print 'transform: {}'.format(transform and transform.__name__)
+        baseline = best_of(lambda: [
+            transform(Mappet(source)) if transform else Mappet(source) for source in sources
+        ])
+        report('sequential', baseline)
+
+        for backend in ('thread', 'process'):
+            workers = 1
+            while workers <= max(2, cpu_count()):
+                elapsed = best_of(lambda: list(Mappet.parse_many(
+                    sources,
+                    backend=backend,
+                    workers=workers,
+                    chunksize=50,
+                    transform=transform,
+                )))
+                report('{} x{}'.format(backend, workers), elapsed, baseline)
+                workers *= 2
+
+
+if __name__ == '__main__':
+    main()
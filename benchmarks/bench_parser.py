@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+u"""Compares parsing with the default and the tuned parser presets.
+
+.. :module: bench_parser
+   :synopsis: Compares parsing with the default and the tuned parser presets.
+"""
+from lxml import etree
+
+from benchmarks.documents import best_of, cars_message, report
+from mappet.mappet import Mappet
+from mappet.parsing import DEFAULT_PARSER, FAST_PARSER
+
+
+def main():
+    for count in (10, 1000, 50000):
+        xml = cars_message(count)
+        number = max(1, 2000 // count)
+        print '{} cars, {} kB'.format(count, len(xml) // 1024)
+
+        baseline = best_of(lambda: Mappet(etree.fromstring(xml)), number)
+        report('etree.fromstring', baseline)
+        report('DEFAULT_PARSER', best_of(lambda: Mappet(xml, DEFAULT_PARSER), number), baseline)
+        report('FAST_PARSER', best_of(lambda: Mappet(xml, FAST_PARSER), number), baseline)
+
+        default_nodes = sum(1 for _ in Mappet(xml, DEFAULT_PARSER)._xml.iter())
+        fast_nodes = sum(1 for _ in Mappet(xml, FAST_PARSER)._xml.iter())
+        print '{:<40} {:>10} / {}'.format('nodes (default / fast)', default_nodes, fast_nodes)
+
+
+if __name__ == '__main__':
+    main()
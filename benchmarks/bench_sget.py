@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+u"""Compares ``sget`` with compiled paths, attribute access and ``sget_many``.
+
+.. :module: bench_sget
+   :synopsis: Compares ``sget`` with compiled paths, attribute access and ``sget_many``.
+"""
+from benchmarks.documents import best_of, cars_message, report
+from mappet.mappet import Mappet
+
+PATHS = [
+    'head.id.@seq',
+    'head.id.@tstamp',
+    'head.initiator',
+    'head.date.#text',
+    'head.type.#text',
+    'auth.user.#text',
+    'auth.user.@first-name',
+    'auth.user.@last-name',
+    'status.result.#text',
+    'reply.cars.car.0.id.#text',
+    'reply.cars.car.0.manufacturer',
+    'reply.cars.car.0.hp.#text',
+    'reply.cars.car.1.model_name.#text',
+    'reply.cars.car.-1.weight',
+    'reply.cars.car.9.seats.#text',
+    'reply.fake_node.#text',
+]
+
+
+def main():
+    for count in (2, 10, 100):
+        m = Mappet(cars_message(count))
+        paths = [Mappet.compile_path(path) for path in PATHS]
+        print '{} cars, {} paths'.format(count, len(PATHS))
+
+        baseline = best_of(lambda: [path.resolve_attributes(m) for path in paths], 1000)
+        report('attribute access', baseline)
+        report('sget', best_of(lambda: [m.sget(path) for path in PATHS], 1000), baseline)
+        report('compiled paths', best_of(lambda: [path.resolve(m) for path in paths], 1000), baseline)
+        report('sget_many', best_of(lambda: m.sget_many(PATHS), 1000), baseline)
+
+
+if __name__ == '__main__':
+    main()
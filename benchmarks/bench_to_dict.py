@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+u"""Compares the conversion of trees to dicts with the former recursive one.
+
+.. :module: bench_to_dict
+   :synopsis: Compares the conversion of trees to dicts with the former recursive one.
+"""
+from collections import defaultdict
+from copy import deepcopy
+from functools import partial
+
+from lxml import etree
+
+from benchmarks.documents import best_of, cars_message, report
+from mappet import helpers
+
+
+def recursive_etree_to_dict(t, trim=True, **kw):
+    u"""``helpers.etree_to_dict`` before it was made iterative."""
+    d = {t.tag: {} if t.attrib else None}
+    children = list(t)
+    etree_to_dict_w_args = partial(recursive_etree_to_dict, trim=trim, **kw)
+
+    if children:
+        dd = defaultdict(list)
+        d = {t.tag: {}}
+
+        for dc in map(etree_to_dict_w_args, children):
+            for k, v in dc.iteritems():
+                # do not add Comment instance to the key
+                if k is not etree.Comment:
+                    dd[k].append(v)
+
+        d[t.tag] = {k: v[0] if len(v) == 1 else v for k, v in dd.iteritems()}
+
+    if t.attrib:
+        d[t.tag].update(('@' + k, v) for k, v in t.attrib.iteritems())
+    if trim and t.text:
+        t.text = t.text.strip()
+    if t.text:
+        if t.tag is etree.Comment and not kw.get('without_comments'):
+            # adds a comments node
+            d['#comments'] = t.text
+        elif children or t.attrib:
+            d[t.tag]['#text'] = t.text
+        else:
+            d[t.tag] = t.text
+    return d
+
+
+def deep(depth):
+    u"""Returns a tree with ``depth`` levels of nodes, each with a few leaves."""
+    root = element = etree.Element('root')
+    for level in xrange(depth):
+        etree.SubElement(element, 'leaf', attr=str(level)).text = ' text '
+        etree.SubElement(element, 'leaf')
+        element = etree.SubElement(element, 'level')
+    return root
+
+
+def main():
+    documents = [
+        ('wide (10000 cars)', etree.fromstring(cars_message(10000))),
+        ('deep (300 levels)', deep(300)),
+    ]
+
+    for name, tree in documents:
+        print name
+        for kw in ({}, {'without_comments': True}, {'trim': False}):
+            assert helpers.etree_to_dict(tree, **kw) == recursive_etree_to_dict(deepcopy(tree), **kw)
+
+        baseline = best_of(lambda: recursive_etree_to_dict(tree), 3, repeat=3)
+        report('recursive', baseline)
+        report('iterative', best_of(lambda: helpers.etree_to_dict(tree), 3, repeat=3), baseline)
+
+    # The recursive conversion exceeds the recursion limit.
+    print 'deep (10000 levels)'
+    tree = deep(10000)
+    report('iterative', best_of(lambda: helpers.etree_to_dict(tree), 3, repeat=3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+u"""Compares typed views with converting values on every access.
+
+.. :module: bench_typed
+   :synopsis: Compares typed views with converting values on every access.
+"""
+import datetime
+
+from benchmarks.documents import best_of, cars_message, report
+from mappet.mappet import Mappet
+
+SCHEMA = {
+    'head.id.@seq': int,
+    'head.date': datetime.datetime,
+    'reply.cars.car.hp': int,
+    'reply.cars.car.weight': int,
+}
+
+
+def read_converting(m):
+    u"""Reads the values of ``SCHEMA`` with helper functions."""
+    cars = m.reply.cars.car
+    return (
+        m.head.id.getattr('seq', callback=int),
+        m.head.date.to_datetime(),
+        [car.hp.to_int() for car in cars],
+        [car.weight.to_int() for car in cars],
+    )
+
+
+def read_view(view):
+    u"""Reads the values of ``SCHEMA`` from a typed view."""
+    return (
+        view['head.id.@seq'],
+        view['head.date'],
+        view['reply.cars.car.hp'],
+        view['reply.cars.car.weight'],
+    )
+
+
+def main():
+    for count in (10, 1000):
+        m = Mappet(cars_message(count))
+        view = m.typed(SCHEMA)
+        print '{} cars'.format(count)
+
+        assert read_converting(m) == read_view(view)
+
+        baseline = best_of(lambda: read_converting(m), 10)
+        report('helper functions', baseline)
+        report('new typed view', best_of(lambda: read_view(m.typed(SCHEMA)), 10), baseline)
+        report('typed view', best_of(lambda: read_view(view), 10), baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+u"""Compares peak memory of writing exports record by record with building whole trees.
+
+Every way of writing runs in a new process, which reports its peak memory.
+
+.. :module: bench_writer
+   :synopsis: Compares peak memory of writing exports record by record with building whole trees.
+"""
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from mappet import mappet
+
+COUNT = 200000
+
+
+def records():
+    u"""Yields the exported records as dicts."""
+    for index in xrange(COUNT):
+        yield {'@id': str(index), 'Manufacturer': 'BMW', 'Model_Name': 'X{}'.format(index), 'HP': str(100 + index % 300)}
+
+
+def write_tree(fp):
+    u"""Builds the whole document, then serializes it."""
+    m = mappet.Mappet({'export': {'Car': list(records())}})
+    fp.write(m.to_str(encoding='utf-8'))
+
+
+def write_records(fp):
+    u"""Writes the records one at a time."""
+    with mappet.Mappet.writer(fp) as writer:
+        for record in records():
+            writer.write({'Car': record})
+
+
+WRITERS = {
+    'to_str': write_tree,
+    'writer': write_records,
+}
+
+
+def run(name):
+    u"""Writes the document in the current process and prints the results."""
+    start = time.time()
+    with open(os.devnull, 'wb') as fp:
+        WRITERS[name](fp)
+    print '{:<40} {:>10.1f} ms {:>8.1f} MB peak'.format(
+        name,
+        (time.time() - start) * 1000,
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    )
+
+
+def main():
+    print '{} records'.format(COUNT)
+    for name in ('to_str', 'writer'):
+        subprocess.check_call([sys.executable, '-m', 'benchmarks.bench_writer', name])
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 2:
+        run(sys.argv[1])
+    else:
+        main()
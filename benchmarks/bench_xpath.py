@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+u"""Compares XPath queries with and without the cache of compiled expressions,
+and ways of reading values of many results.
+
+.. :module: bench_xpath
+   :synopsis: Compares XPath queries and ways of reading their results.
+"""
+from benchmarks.documents import best_of, cars_message, report
+from mappet.mappet import Literal, Mappet
+
+QUERIES = [
+    'head/initiator',
+    'count(//Car)',
+    '//Car[HP > 200]/Model_Name',
+    "//*[re:test(., '^mr', 'i')]",
+]
+
+RE_NAMESPACES = {'re': 'http://exslt.org/regular-expressions'}
+
+
+def main():
+    m = Mappet(cars_message(10))
+    Mappet.precompile(QUERIES, regexp=True)
+
+    for query in QUERIES:
+        print query
+
+        # What xpath did before compiled expressions were cached.
+        baseline = best_of(lambda: m.xpath_evaluator(namespaces=RE_NAMESPACES, regexp=True)(query), 10000)
+        report('XPathEvaluator', baseline)
+        report('xpath, single_use', best_of(lambda: m.xpath(query, regexp=True, single_use=True), 10000), baseline)
+        report('xpath, cached', best_of(lambda: m.xpath(query, regexp=True), 10000), baseline)
+
+    m = Mappet(cars_message(20000))
+    print '//Car/HP of 20000 cars'
+    # xpath returns a list of elements, which have to be wrapped.
+    baseline = best_of(lambda: [Literal(hp).to_int() for hp in m.xpath('//Car/HP')], 1, repeat=3)
+    report('xpath, wrapped, to_int() of each', baseline)
+    report('iterxpath, to_int() of each', best_of(lambda: [hp.to_int() for hp in m.iterxpath('//Car/HP')], 1, repeat=3), baseline)
+    report('xpath_values', best_of(lambda: m.xpath_values('//Car/HP', to='int'), 1, repeat=3), baseline)
+
+
+if __name__ == '__main__':
+    main()
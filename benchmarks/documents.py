@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+u"""Sample documents used by the benchmarks.
+
+.. :module: documents
+   :synopsis: Sample documents used by the benchmarks.
+"""
+import timeit
+
+CAR = '''
+            <Car>
+                <!-- record {index} -->
+                <id>{index}</id>
+                <Manufacturer>BMW</Manufacturer>
+                <Model_Name>X{index}</Model_Name>
+                <Body>SUV</Body>
+                <Fuel>Diesel</Fuel>
+                <Doors>5</Doors>
+                <ccm>3000</ccm>
+                <HP>{hp}</HP>
+                <TransType>Automatic</TransType>
+                <seats>5</seats>
+                <weight>{weight}</weight>
+            </Car>'''
+
+MESSAGE = '''<?xml version='1.0' encoding='iso-8859-2'?>
+<a-message>
+    <head>
+        <id seq="20" tstamp="2015-07-13T10:55:25+02:00"/>
+        <initiator>Mr Sender</initiator>
+        <date>2015-07-13T10:56:05.597420+02:00</date>
+        <type>reply-type</type>
+    </head>
+    <auth>
+        <user first-name="Name" last-name="LastName">id</user>
+    </auth>
+    <status>
+        <result>OK</result>
+    </status>
+    <reply>
+        <cars>{cars}
+        </cars>
+    </reply>
+</a-message>
+'''
+
+
+def cars_message(count):
+    u"""Returns the README example message with ``count`` cars."""
+    return MESSAGE.format(cars=''.join(
+        CAR.format(index=index, hp=100 + index % 300, weight=2000 + index % 2000)
+        for index in xrange(count)
+    ))
+
+
+def best_of(stmt, number, repeat=5):
+    u"""Returns the best time of a single call of ``stmt`` in seconds."""
+    return min(timeit.repeat(stmt, number=number, repeat=repeat)) / number
+
+
+def report(name, seconds, baseline=None):
+    u"""Prints a benchmark result, optionally compared to a baseline."""
+    line = '{:<40} {:>10.1f} us'.format(name, seconds * 1e6)
+    if baseline:
+        line += '  x{:.2f}'.format(baseline / seconds)
+    print line
@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 
-from mappet import Mappet
+from mappet import LazyMappet, Mappet
+from parsing import ParserConfig
 from version import __version__
 
 
 __all__ = [
+    'LazyMappet',
     'Mappet',
+    'ParserConfig',
     '__version__',
 ]
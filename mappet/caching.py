@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+u"""Caches of compiled objects.
+
+.. :module: caching
+   :synopsis: Caches of compiled objects.
+"""
+from collections import namedtuple, OrderedDict
+import threading
+
+__all__ = [
+    'CacheInfo',
+    'LRUCache',
+]
+
+#: Statistics of a cache, like the ones of ``functools.lru_cache``.
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class LRUCache(object):
+    u"""A thread-safe cache dropping the least recently used values.
+
+    >>> cache = LRUCache(maxsize=2)
+    >>> cache.get('a', str.upper)
+    'A'
+    >>> cache.get('a', str.upper)
+    'A'
+    >>> cache.info()
+    CacheInfo(hits=1, misses=1, maxsize=2, currsize=1)
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def get(self, key, factory):
+        u"""Returns the value cached for a key, creating it with ``factory(key)`` if needed.
+
+        The factory is called outside of the lock, so concurrent misses of the
+        same key may create the value more than once.
+        """
+        with self._lock:
+            try:
+                value = self._values.pop(key)
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._values[key] = value
+                return value
+
+        value = factory(key)
+
+        with self._lock:
+            self._values[key] = value
+            while len(self._values) > self.maxsize:
+                self._values.popitem(last=False)
+
+        return value
+
+    def clear(self):
+        u"""Removes all values and resets the statistics."""
+        with self._lock:
+            self._values.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        u"""Returns the statistics of the cache."""
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._values))
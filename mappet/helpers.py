@@ -5,13 +5,19 @@ u"""Helper functions.
 .. :module: helpers
    :synopsis: Helper functions.
 """
-from collections import defaultdict
 from decimal import Decimal
-from functools import partial, wraps
+from functools import wraps
 import datetime
+import json
+import re
+import time
+import types
 
 from lxml import etree
 import dateutil.parser
+import dateutil.tz
+
+import caching
 
 __all__ = [
     'to_bool',
@@ -29,9 +35,13 @@ __all__ = [
     'from_time',
 
     'CAST_DICT',
+    'cache_dates',
     'normalize_tag',
     'etree_to_dict',
     'dict_to_etree',
+    'build_etree',
+    'json_to_etree',
+    'etree_to_json',
 ]
 
 
@@ -84,9 +94,119 @@ def to_decimal(value):
     return Decimal(value)
 
 
-@no_empty_value
-def to_time(value):
-    value = str(value)
+#: Cache of parsed dates and times, see :func:`cache_dates`.
+DATE_CACHE = None
+
+_ISO_DATETIME_RE = re.compile(
+    r'^(\d{4})-(\d{2})-(\d{2})'
+    r'(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:[.,](\d+))?)?(Z|z|[+-]\d{2}(?::?\d{2})?)?)?$'
+)
+
+_ISO_TIME_RE = re.compile(
+    r'^(\d{2})(?::(\d{2})(?::(\d{2})(?:[.,](\d+))?)?)?(?:Z|z|[+-]\d{2}(?::?\d{2})?)?$'
+)
+
+
+#: Time zones of parsed offsets, by the offset in seconds.
+_tzoffsets = {}
+
+
+def cache_dates(maxsize=1024):
+    u"""Enables caching of values parsed by ``to_datetime``, ``to_date`` and ``to_time``.
+
+    Up to ``maxsize`` recently parsed values are kept, ``maxsize=0`` disables
+    the cache. Parsed values are immutable, so they are shared by all the
+    callers. Values without a date are completed with the date of the day
+    they were first parsed.
+    """
+    global DATE_CACHE
+    DATE_CACHE = caching.LRUCache(maxsize) if maxsize else None
+
+
+def _cached(parse, value):
+    u"""Parses a value, using ``DATE_CACHE`` if enabled."""
+    cache = DATE_CACHE
+    if cache is None:
+        return parse(value)
+    return cache.get((parse, value), _parse_key)
+
+
+def _parse_key(key):
+    parse, value = key
+    return parse(value)
+
+
+def _microseconds(fraction):
+    u"""Converts digits of a fraction of a second to microseconds, truncating like ``dateutil``."""
+    return int(fraction[:6].ljust(6, '0')) if fraction else 0
+
+
+def _parse_iso_datetime(value):
+    u"""Parses an ISO 8601 date or date and time exactly like ``dateutil.parser.parse``.
+
+    Returns ``None`` for other formats and for values ``dateutil`` would
+    handle differently (or reject), which are left to ``dateutil``.
+
+    >>> _parse_iso_datetime('2015-07-13T10:56:05.597420+02:00')
+    datetime.datetime(2015, 7, 13, 10, 56, 5, 597420, tzinfo=tzoffset(None, 7200))
+    """
+    match = _ISO_DATETIME_RE.match(value)
+    if match is None:
+        return None
+
+    year, month, day, hour, minute, second, fraction, offset = match.groups()
+    year = int(year)
+    if year < 100:
+        # dateutil treats years without a century differently.
+        return None
+
+    tzinfo = None
+    if offset:
+        seconds = 0
+        if len(offset) > 1:
+            seconds = int(offset[1:3]) * 3600 + int(offset[-2:] if len(offset) > 3 else 0) * 60
+            if offset[0] == '-':
+                seconds = -seconds
+
+        if seconds:
+            try:
+                tzinfo = _tzoffsets[seconds]
+            except KeyError:
+                tzinfo = _tzoffsets[seconds] = dateutil.tz.tzoffset(None, seconds)
+        elif 'UTC' in time.tzname:
+            # dateutil uses the local time zone named UTC.
+            return None
+        else:
+            tzinfo = dateutil.tz.tzutc()
+
+    try:
+        return datetime.datetime(
+            year,
+            int(month),
+            int(day),
+            int(hour or 0),
+            int(minute or 0),
+            int(second or 0),
+            _microseconds(fraction),
+            tzinfo,
+        )
+    except ValueError:
+        return None
+
+
+def _parse_datetime(value):
+    return _parse_iso_datetime(value) or dateutil.parser.parse(value)
+
+
+def _parse_time(value):
+    match = _ISO_TIME_RE.match(value)
+    if match is not None:
+        hour, minute, second, fraction = match.groups()
+        try:
+            return datetime.time(int(hour), int(minute or 0), int(second or 0), _microseconds(fraction))
+        except ValueError:
+            pass
+
     # dateutil.parse has problems parsing full hours without minutes
     sep = value[2:3]
     if not (sep == ':' or sep.isdigit()):
@@ -95,14 +215,24 @@ def to_time(value):
     return dateutil.parser.parse(value).time()
 
 
+@no_empty_value
+def to_time(value):
+    return parse_time(value)
+
+
+def parse_time(value):
+    u"""Parses a time, ISO 8601 times without ``dateutil``."""
+    return _cached(_parse_time, str(value))
+
+
 @no_empty_value
 def to_datetime(value):
     return parse_datetime(value)
 
 
 def parse_datetime(value):
-    value = str(value)
-    return dateutil.parser.parse(value)
+    u"""Parses a date and time, ISO 8601 values without ``dateutil``."""
+    return _cached(_parse_datetime, str(value))
 
 
 @no_empty_value
@@ -174,6 +304,9 @@ def normalize_tag(tag):
 def etree_to_dict(t, trim=True, **kw):
     u"""Converts an lxml.etree object to Python dict.
 
+    The tree is walked with an explicit stack, so deep trees don't hit the
+    recursion limit, and is left unchanged (texts are trimmed in the dict only).
+
     >>> etree_to_dict(etree.Element('root'))
     {'root': None}
 
@@ -181,35 +314,90 @@ def etree_to_dict(t, trim=True, **kw):
     :returns d: a dict representing the lxml tree ``t``
     :rtype: dict
     """
-    d = {t.tag: {} if t.attrib else None}
-    children = list(t)
-    etree_to_dict_w_args = partial(etree_to_dict, trim=trim, **kw)
-
-    if children:
-        dd = defaultdict(list)
-        d = {t.tag: {}}
-
-        for dc in map(etree_to_dict_w_args, children):
-            for k, v in dc.iteritems():
-                # do not add Comment instance to the key
-                if k is not etree.Comment:
-                    dd[k].append(v)
-
-        d[t.tag] = {k: v[0] if len(v) == 1 else v for k, v in dd.iteritems()}
-
-    if t.attrib:
-        d[t.tag].update(('@' + k, v) for k, v in t.attrib.iteritems())
-    if trim and t.text:
-        t.text = t.text.strip()
-    if t.text:
-        if t.tag is etree.Comment and not kw.get('without_comments'):
-            # adds a comments node
-            d['#comments'] = t.text
-        elif children or t.attrib:
-            d[t.tag]['#text'] = t.text
+    without_comments = kw.get('without_comments')
+
+    if t.tag is etree.Comment:
+        text = t.text.strip() if trim and t.text else t.text
+        if text and not without_comments:
+            return {t.tag: None, '#comments': text}
+        return {t.tag: text or None}
+
+    if not _element_len(t):
+        return {t.tag: _leaf_to_dict(t, trim)}
+
+    # Frames of the elements being converted: an element, an iterator over
+    # its children and the dict its children are converted into.
+    stack = [(t, iter(t), {})]
+
+    while True:
+        element, children, value = stack[-1]
+
+        for child in children:
+            tag = child.tag
+
+            if _element_len(child):
+                stack.append((child, iter(child), {}))
+                break
+
+            if tag is etree.Comment:
+                # Comments are gathered under a '#comments' key.
+                tag = '#comments'
+                leaf = child.text.strip() if trim and child.text else child.text
+                if not leaf or without_comments:
+                    continue
+            else:
+                leaf = _leaf_to_dict(child, trim)
+
+            if tag in value:
+                siblings = value[tag]
+                if siblings.__class__ is list:
+                    siblings.append(leaf)
+                else:
+                    value[tag] = [siblings, leaf]
+            else:
+                value[tag] = leaf
         else:
-            d[t.tag] = t.text
-    return d
+            stack.pop()
+
+            attributes = element.attrib
+            if attributes:
+                value.update(('@' + k, v) for k, v in attributes.iteritems())
+            text = element.text.strip() if trim and element.text else element.text
+            if text:
+                value['#text'] = text
+
+            if not stack:
+                return {element.tag: value}
+
+            tag = element.tag
+            value_of_parent = stack[-1][2]
+            if tag in value_of_parent:
+                siblings = value_of_parent[tag]
+                if siblings.__class__ is list:
+                    siblings.append(value)
+                else:
+                    value_of_parent[tag] = [siblings, value]
+            else:
+                value_of_parent[tag] = value
+
+
+#: Counts children of any element, including elements overriding ``len``.
+_element_len = etree._Element.__len__
+
+
+def _leaf_to_dict(element, trim):
+    u"""Converts an element without children, see :func:`etree_to_dict`."""
+    text = element.text.strip() if trim and element.text else element.text
+    # Processing instructions have pseudo-attributes in ``attrib`` only.
+    attributes = element.attrib
+
+    if not attributes:
+        return text or None
+
+    value = {'@' + k: v for k, v in attributes.iteritems()}
+    if text:
+        value['#text'] = text
+    return value
 
 
 def dict_to_etree(d, root):
@@ -273,3 +461,332 @@ def dict_to_etree(d, root):
 
     _to_etree(d, root)
     return root
+
+
+#: Types of values of repeated children accepted by :func:`build_etree`.
+_REPEATED_TYPES = (list, tuple, types.GeneratorType)
+
+
+def build_etree(d, root):
+    u"""Converts a dict to lxml.etree object, like :func:`dict_to_etree`, but faster.
+
+    The result is the same as the one of ``dict_to_etree``, including lists
+    with ``None``. The dict is walked with an explicit stack instead of
+    recursion. Repeated children may be given as lists, tuples or generators.
+    Keys starting with ``#`` other than ``#text`` and text or attribute values
+    which aren't strings raise a ValueError.
+
+    >>> etree.tostring(build_etree({'a': ['A', 'B'], '@attr': 'val'}, etree.Element('root')))
+    '<root attr="val"><a>A</a><a>B</a></root>'
+
+    :param dict d: dict representing the XML tree
+    :param etree.Element root: XML node which will be assigned the resulting tree
+    :returns: the root
+    """
+    sub_element = etree.SubElement
+    # Values to be converted into given elements, in reversed order.
+    stack = [(d, root)]
+
+    while stack:
+        d, node = stack.pop()
+
+        if d is None:
+            continue
+        if isinstance(d, basestring):
+            if d:
+                node.text = d
+            continue
+        if not isinstance(d, dict):
+            if len(d):
+                raise AttributeError('Argument is neither dict nor basestring.')
+            continue
+
+        pending = []
+
+        for k, v in d.iteritems():
+            first = k[:1]
+
+            if first == '#':
+                if k != '#text' or not isinstance(v, basestring):
+                    raise ValueError('Invalid text {!r}: {!r}.'.format(k, v))
+                node.text = v
+            elif first == '@':
+                if not isinstance(v, basestring):
+                    raise ValueError('Invalid attribute {!r}: {!r}.'.format(k, v))
+                node.set(k[1:], v)
+            elif isinstance(v, _REPEATED_TYPES):
+                element = sub_element(node, k)
+
+                for child_num, e in enumerate(v):
+                    if e is None:
+                        # The first empty child is the element created above,
+                        # others are appended to the parent.
+                        if child_num:
+                            sub_element(node, k)
+                    else:
+                        # Like in ``dict_to_etree``, dicts with empty values are
+                        # merged into the previous child.
+                        if child_num and not (isinstance(e, dict) and not all(e.itervalues())):
+                            element = sub_element(node, k)
+                        if isinstance(e, basestring):
+                            if e:
+                                element.text = e
+                        else:
+                            pending.append((e, element))
+            elif isinstance(v, basestring):
+                # Leaves are the most common values, they are built at once.
+                if v:
+                    sub_element(node, k).text = v
+                else:
+                    sub_element(node, k)
+            elif v is None:
+                sub_element(node, k)
+            else:
+                pending.append((v, sub_element(node, k)))
+
+        pending.reverse()
+        stack.extend(pending)
+
+    return root
+
+
+class _JsonObject(object):
+    u"""A decoded JSON object, already converted to an element.
+
+    Keeps what :func:`build_etree` checks of a dict: whether it is empty,
+    whether any of its values is empty (so it is merged into the previous
+    item of a list) and its only member, if it has exactly one.
+    """
+    __slots__ = ('element', 'size', 'has_empty', 'single')
+
+    def __init__(self, element, size, has_empty, single):
+        self.element = element
+        self.size = size
+        self.has_empty = has_empty
+        self.single = single
+
+
+def _json_truth(value):
+    u"""Returns the truth value of a decoded JSON value, as if it was a dict."""
+    if value.__class__ is _JsonObject:
+        return value.size > 0
+    return bool(value)
+
+
+def _json_to_element(value, element):
+    u"""Converts a decoded value into an element, like :func:`build_etree`."""
+    if value is None:
+        return
+    if value.__class__ is _JsonObject:
+        source = value.element
+        if source.text is not None:
+            element.text = source.text
+        for k, v in source.attrib.iteritems():
+            element.set(k, v)
+        element.extend(source)
+    elif isinstance(value, basestring):
+        if value:
+            element.text = value
+    elif value.__class__ is bool:
+        element.text = from_bool(value)
+    elif value:
+        raise AttributeError('Argument is neither dict nor basestring.')
+
+
+def _json_object(pairs):
+    u"""Builds an element out of the members of a JSON object, as they are decoded."""
+    node = etree.Element('json')
+    sub_element = etree.SubElement
+    has_empty = False
+
+    for k, v in pairs:
+        if not _json_truth(v):
+            has_empty = True
+
+        first = k[:1]
+
+        if first == '#':
+            if k != '#text' or not isinstance(v, basestring):
+                raise ValueError('Invalid text {!r}: {!r}.'.format(k, v))
+            node.text = v
+        elif first == '@':
+            if not isinstance(v, basestring):
+                raise ValueError('Invalid attribute {!r}: {!r}.'.format(k, v))
+            node.set(k[1:], v)
+        elif v.__class__ is _JsonObject:
+            # The element of a nested object is moved into place.
+            v.element.tag = k
+            node.append(v.element)
+        elif v.__class__ is list:
+            element = sub_element(node, k)
+
+            for child_num, e in enumerate(v):
+                if e is None:
+                    if child_num:
+                        sub_element(node, k)
+                elif not child_num or (e.__class__ is _JsonObject and e.has_empty):
+                    _json_to_element(e, element)
+                elif e.__class__ is _JsonObject:
+                    element = e.element
+                    element.tag = k
+                    node.append(element)
+                else:
+                    element = sub_element(node, k)
+                    _json_to_element(e, element)
+        else:
+            _json_to_element(v, sub_element(node, k))
+
+    return _JsonObject(node, len(pairs), has_empty, pairs[0] if len(pairs) == 1 else None)
+
+
+#: Options of the JSON decoder building elements.
+_JSON_DECODER_OPTIONS = {
+    'object_pairs_hook': _json_object,
+    'parse_int': str,
+    'parse_float': str,
+    'parse_constant': str,
+}
+
+
+def json_to_etree(source):
+    u"""Parses JSON into an lxml.etree object.
+
+    The result is the same as the one of :func:`build_etree` given the decoded
+    dict, with members in their JSON order; the root is named after the only
+    key of the object, or ``root``. Every object is converted to an element
+    as soon as it has been decoded, so no dict of the whole document is built.
+    Numbers are kept as they were written, ``true`` and ``false`` are
+    converted by :func:`from_bool`.
+
+    >>> etree.tostring(json_to_etree('{"car": {"@id": "1", "hp": 256}}'))
+    '<car id="1"><hp>256</hp></car>'
+
+    :param source: a string or a file object with a JSON object
+    :rtype: etree.Element
+    """
+    if hasattr(source, 'read'):
+        decoded = json.load(source, **_JSON_DECODER_OPTIONS)
+    else:
+        decoded = json.loads(source, **_JSON_DECODER_OPTIONS)
+
+    if decoded.__class__ is not _JsonObject:
+        raise AttributeError('Specified data cannot be used to construct a Mappet object.')
+
+    if decoded.single is None:
+        root = decoded.element
+        root.tag = 'root'
+    else:
+        root_name, value = decoded.single
+        root = etree.Element(root_name)
+        _json_to_element(value, root)
+
+    return root
+
+
+#: Encodes a string as a JSON string.
+_json_string = json.encoder.encode_basestring_ascii
+
+
+def _json_leaf(element, trim):
+    u"""Returns a leaf as JSON, like :func:`_leaf_to_dict` converts it."""
+    text = element.text.strip() if trim and element.text else element.text
+    attributes = element.attrib
+
+    if not attributes:
+        return _json_string(text) if text else 'null'
+
+    members = ['{}: {}'.format(_json_string('@' + k), _json_string(v)) for k, v in attributes.iteritems()]
+    if text:
+        members.append('"#text": {}'.format(_json_string(text)))
+    return '{' + ', '.join(members) + '}'
+
+
+def _json_members(element, trim, without_comments):
+    u"""Yields the JSON of an element with children in parts.
+
+    Children with children of their own are yielded as elements, to be
+    written by the caller.
+    """
+    groups = {}
+    order = []
+
+    for child in element:
+        tag = child.tag
+
+        if tag is etree.Comment:
+            text = child.text.strip() if trim and child.text else child.text
+            if not text or without_comments:
+                continue
+            tag = '#comments'
+        elif not isinstance(tag, basestring):
+            # Processing instructions and entities have no key in JSON.
+            continue
+
+        if tag in groups:
+            groups[tag].append(child)
+        else:
+            groups[tag] = [child]
+            order.append(tag)
+
+    separator = '{'
+    for k, v in element.attrib.iteritems():
+        yield '{}{}: {}'.format(separator, _json_string('@' + k), _json_string(v))
+        separator = ', '
+
+    text = element.text.strip() if trim and element.text else element.text
+    if text:
+        yield '{}"#text": {}'.format(separator, _json_string(text))
+        separator = ', '
+
+    for tag in order:
+        children = groups.pop(tag)
+        yield '{}{}: {}'.format(separator, _json_string(tag), '[' if len(children) > 1 else '')
+        separator = ', '
+
+        for child_num, child in enumerate(children):
+            if child_num:
+                yield ', '
+            if child.tag is etree.Comment:
+                yield _json_string(child.text.strip() if trim else child.text)
+            elif _element_len(child):
+                yield child
+            else:
+                yield _json_leaf(child, trim)
+
+        if len(children) > 1:
+            yield ']'
+
+    yield '}' if separator == ', ' else '{}'
+
+
+def etree_to_json(t, write, trim=True, **kw):
+    u"""Writes an lxml.etree object as JSON, in parts.
+
+    The JSON represents the value of the dict :func:`etree_to_dict` returns,
+    with members in document order, and is written as the tree is walked.
+
+    >>> parts = []
+    >>> etree_to_json(etree.fromstring('<car id="1"><hp>256</hp></car>'), parts.append)
+    >>> ''.join(parts)
+    '{"@id": "1", "hp": "256"}'
+
+    :param etree.Element t: lxml tree to convert
+    :param write: a function called with each part, e.g. ``fp.write``
+    """
+    without_comments = kw.get('without_comments')
+
+    if not _element_len(t):
+        write(_json_leaf(t, trim))
+        return
+
+    stack = [_json_members(t, trim, without_comments)]
+
+    while stack:
+        for part in stack[-1]:
+            if part.__class__ is str:
+                write(part)
+            else:
+                stack.append(_json_members(part, trim, without_comments))
+                break
+        else:
+            stack.pop()
@@ -6,26 +6,77 @@ u"""Module for dynamic mapping of XML trees to Python objects.
    :synopsis: Module for dynamic mapping of XML trees to Python objects.
 """
 
+import array
+import datetime
 import re
 
+from collections import Mapping, OrderedDict, Sequence
+from contextlib import contextmanager
 from copy import deepcopy
+from decimal import Decimal
+from functools import partial
+from itertools import chain, islice
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
 
 from lxml import etree
 
+import caching
 import helpers
+import parsing
 
 __all__ = [
+    'CompiledPath',
+    'FeedParser',
+    'LazyMappet',
     'Literal',
     'Mappet',
+    'MappetList',
     'Node',
+    'RecordWriter',
+    'TypedView',
+    'iter_dicts',
 ]
 
+#: Size of the chunks in which buffers are passed to the parser.
+PARSE_CHUNK_SIZE = 64 * 1024
+
+#: Size of the chunks yielded by ``Mappet.iter_bytes``.
+SERIALIZE_CHUNK_SIZE = 64 * 1024
+
+#: Maximum number of paths kept compiled by ``Mappet.compile_path``.
+PATH_CACHE_SIZE = 1024
+
+#: Maximum number of XPath expressions kept compiled by ``Mappet.xpath``.
+XPATH_CACHE_SIZE = 1024
+
+#: Maximum number of values converted by typed views kept per document.
+CONVERSION_CACHE_SIZE = 1024
+
+#: Pool classes used by ``Mappet.parse_many`` backends.
+POOL_BACKENDS = {
+    'thread': ThreadPool,
+    'process': Pool,
+}
+
+
+_class_members_cache = {}
+
+
+def _class_members(cls):
+    u"""Returns a set of names defined by a class, computed once per class."""
+    try:
+        return _class_members_cache[cls]
+    except KeyError:
+        members = _class_members_cache[cls] = frozenset(dir(cls))
+        return members
+
 
 class Node(object):
     u"""Base class representing an XML node."""
 
-    #: The lxml object representing parsed XML.
-    _xml = None
+    #: ``_xml`` is the lxml object representing parsed XML.
+    __slots__ = ('_xml',)
 
     def __init__(self, xml):
         self._xml = xml
@@ -116,6 +167,8 @@ class Node(object):
 class Literal(Node):
     u"""Represents a leaf in an XML tree."""
 
+    __slots__ = ()
+
     def __str__(self):
         u"""Represents a leaf as a str.
 
@@ -246,34 +299,741 @@ class _NoneNode(object):
 NONE_NODE = _NoneNode()
 
 
+class _TreeIndex(object):
+    u"""Index of children of the elements of a single tree.
+
+    It is shared by all mappet objects created while traversing the tree and
+    is built lazily, one element at a time. For every indexed element it
+    keeps a dict of normalized tagnames mapped to the original tagnames.
+    Children themselves are looked up in the tree, so changes made with
+    ``lxml`` or by other mappet objects wrapping the tree are seen. An entry
+    is built again when the last child of its element changes or when no
+    child has its tagname anymore. It also keeps
+    the ``CONVERSION_CACHE_SIZE`` text values most recently converted by typed
+    views, see :meth:`Mappet.typed`, until the tree is changed.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._normalized_tags = {}
+        self._converted = caching.LRUCache(CONVERSION_CACHE_SIZE)
+
+    def aliases(self, element):
+        u"""Returns a dict mapping normalized tagnames of children to the original ones."""
+        last = next(element.iterchildren(reversed=True), None)
+        entry = self._entries.get(element)
+        if entry is None or entry[0] is not last:
+            entry = self._entries[element] = (last, self._get_aliases(element))
+        return entry[1]
+
+    def find(self, element, name):
+        u"""Returns the original tagname of children with a normalized name and the first of them.
+
+        Returns ``(None, None)`` if there is no such child.
+        """
+        tag = self.aliases(element).get(name)
+        child = None if tag is None else next(element.iterchildren(tag=tag), None)
+
+        if tag is not None and child is None:
+            # The children were removed with ``lxml``, others may share the name.
+            tag = self.refresh(element).get(name)
+            child = None if tag is None else next(element.iterchildren(tag=tag), None)
+
+        return (None, None) if child is None else (tag, child)
+
+    def refresh(self, element):
+        u"""Builds the entry of an element again, e.g. before listing all of its children."""
+        self._entries.pop(element, None)
+        return self.aliases(element)
+
+    def convert(self, converter, text):
+        u"""Converts a text value, calling the converter once per tree for equal texts."""
+        return self._converted.get((converter, text), _convert)
+
+    def invalidate(self, element):
+        u"""Drops the entry of an element, whose children have changed, and converted values."""
+        self._entries.pop(element, None)
+        self._converted.clear()
+
+    def forget(self, element):
+        u"""Drops entries of an element and all of its descendants."""
+        if self._entries:
+            for descendant in element.iter():
+                self._entries.pop(descendant, None)
+
+    def _get_aliases(self, element):
+        aliases = {}
+        normalized_tags = self._normalized_tags
+
+        for child in element:
+            tag = child.tag
+            # Skips comments and processing instructions.
+            if not isinstance(tag, basestring):
+                continue
+
+            try:
+                aliases[normalized_tags[tag]] = tag
+            except KeyError:
+                normalized_tags[tag] = helpers.normalize_tag(tag)
+                aliases[normalized_tags[tag]] = tag
+
+        return aliases
+
+
+def _convert(key):
+    u"""Converts a text value for a ``(converter, text)`` key of ``_TreeIndex.convert``."""
+    converter, text = key
+    return converter(text)
+
+
+class MappetList(Sequence):
+    u"""A lazy sequence of children sharing a tagname.
+
+    Returned by attribute and dict access when several children match. Only
+    the tagname of the children is kept, they are looked up and wrapped in
+    mappet objects when they are accessed, so the list reflects later changes
+    of the node. A slice keeps the ordinals of its children.
+
+    >>> cars = Mappet('<cars><car>A</car><car>B</car><car>C</car></cars>').car
+    >>> len(cars), cars[-1].get()
+    (3, 'C')
+    >>> [car.get() for car in cars[:2]]
+    ['A', 'B']
+    """
+
+    __slots__ = ('_element', '_tag', '_ordinals', '_mappet_class', '_index')
+
+    def __init__(self, element, tag, mappet_class, index, ordinals=None):
+        u"""Creates a list of children of ``element`` with a given tagname.
+
+        :param element: the parent lxml element
+        :param tag: the original tagname of the children
+        :param mappet_class: class wrapping the children, see :meth:`Mappet._wrap`
+        :param _TreeIndex index: index of the tree shared with the children
+        :param ordinals: ordinals (among the children with the tagname) of
+            the children in the list, all of them by default
+        """
+        self._element = element
+        self._tag = tag
+        self._ordinals = ordinals
+        self._mappet_class = mappet_class
+        self._index = index
+
+    def __len__(self):
+        if self._ordinals is None:
+            return self._count()
+        return len(self._ordinals)
+
+    def __getitem__(self, key):
+        u"""Returns a child at a given index or a list of children of a slice."""
+        if isinstance(key, slice):
+            ordinals = self._ordinals
+            if ordinals is None:
+                ordinals = xrange(self._count())
+            return MappetList(
+                self._element,
+                self._tag,
+                self._mappet_class,
+                self._index,
+                [ordinals[i] for i in xrange(*key.indices(len(ordinals)))],
+            )
+
+        ordinal = key if self._ordinals is None else self._ordinals[key]
+        # Children at negative indexes are found walking from the last one.
+        child = _nth_child(self._element, self._tag, ordinal)
+        if child is None:
+            raise IndexError('MappetList index out of range')
+        return self._mappet_class._wrap(child, self._index)
+
+    def __iter__(self):
+        u"""Iterates over the children, walking the parent's children once."""
+        if self._ordinals is None:
+            wrap = self._mappet_class._wrap
+            index = self._index
+            return (wrap(child, index) for child in self._element.iterchildren(tag=self._tag))
+        return self._iter(self._ordinals)
+
+    def __reversed__(self):
+        return iter(self[::-1])
+
+    def __eq__(self, other):
+        u"""Compares children like lists do."""
+        if not isinstance(other, (list, tuple, MappetList)):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def _count(self):
+        u"""Returns the number of children with the tagname."""
+        return sum(1 for _ in self._element.iterchildren(tag=self._tag))
+
+    def _iter(self, ordinals):
+        u"""Yields children at given (either ascending or descending) ordinals."""
+        if not len(ordinals):
+            return
+
+        reverse = ordinals[0] > ordinals[-1]
+        count = self._count() if reverse else None
+        children = self._element.iterchildren(tag=self._tag, reversed=reverse)
+        wrap = self._mappet_class._wrap
+        index = self._index
+        current = 0
+
+        for ordinal in ordinals:
+            if reverse:
+                ordinal = count - 1 - ordinal
+            child = next(islice(children, ordinal - current, None), None)
+            if child is None:
+                return
+            current = ordinal + 1
+            yield wrap(child, index)
+
+
+def _nth_child(element, tag, ordinal):
+    u"""Returns a child with a tagname at an ordinal (from the end, if negative) or ``None``."""
+    if ordinal < 0:
+        children = element.iterchildren(tag=tag, reversed=True)
+        ordinal = -ordinal - 1
+    else:
+        children = element.iterchildren(tag=tag)
+    return next(islice(children, ordinal, None), None)
+
+
+#: Names resolved by attribute access of literals and lists of nodes, paths
+#: containing them are resolved like before by ``CompiledPath``.
+_RESERVED_NAMES = (
+    _class_members(Literal) |
+    _class_members(list) |
+    _class_members(MappetList) |
+    frozenset(name for name in dir(helpers) if name.startswith('to_'))
+)
+
+
+class CompiledPath(object):
+    u"""A path in ``sget`` notation, parsed once and resolved by walking elements.
+
+    Resolving does not create mappet objects for the intermediate nodes,
+    only the result is wrapped. Paths using names of class members (e.g.
+    ``head.keys``) are resolved with attribute access, like before. Empty
+    segments (``''`` or ``'head..id'``) raise a ValueError.
+
+    >>> path = CompiledPath('reply.cars.car.0.id.#text')
+    >>> path.segments
+    ('reply', 'cars', 'car', 0, 'id')
+    """
+
+    __slots__ = ('path', 'segments', 'text_or_attr', '_names', '_generic')
+
+    _index_re = re.compile(r'^\-?\d+$')
+
+    def __init__(self, path):
+        self.path = path
+        segments = path.split('.')
+        last_segment = segments[-1]
+
+        # Case of getting text or attribute.
+        self.text_or_attr = None
+        if last_segment == '#text' or last_segment.startswith('@'):
+            # #text => text, @attr => attr
+            self.text_or_attr = last_segment[1:]
+            segments.pop()
+
+        if '' in segments:
+            raise ValueError('Empty segment in path {!r}.'.format(path))
+
+        self.segments = tuple(
+            int(segment) if self._index_re.match(segment) else segment for segment in segments
+        )
+        self._names = frozenset(segments)
+        self._generic = not self._names.isdisjoint(_RESERVED_NAMES)
+
+    def __repr__(self):
+        return 'CompiledPath({!r})'.format(self.path)
+
+    def __str__(self):
+        return self.path
+
+    def resolve(self, mappet, default=NONE_NODE):
+        u"""Returns the node (or text or attribute) at the path, see :meth:`Mappet.sget`."""
+        if not self.compiles_for(mappet):
+            return self.resolve_attributes(mappet, default)
+
+        step = self.walk(mappet)
+        if step is None:
+            return self.default(default)
+
+        element, matches = step
+        return self.result(mappet, mappet._get_index(), element, matches)
+
+    def exists(self, mappet):
+        u"""Checks if there is a node (or text or attribute) at the path, see :meth:`Mappet.exists`."""
+        if not self.compiles_for(mappet):
+            value = self.resolve_attributes(mappet)
+            return not (value is None or value is NONE_NODE)
+
+        step = self.walk(mappet)
+        if step is None:
+            return False
+
+        element, matches = step
+        if self.text_or_attr:
+            if matches is not None:
+                return False
+            if self.text_or_attr == 'text':
+                return element.text is not None
+            return element.get(self.text_or_attr) is not None
+        return True
+
+    def walk(self, mappet):
+        u"""Walks the elements of a mappet object along the path.
+
+        Returns the node at the path as a pair, see :func:`_step`, or ``None``
+        if there is no node. The path must compile for the mappet object.
+        """
+        index = mappet._get_index()
+        element = mappet._xml
+        matches = None
+
+        for segment in self.segments:
+            step = _step(index, element, matches, segment)
+            if step is None:
+                return None
+            element, matches = step
+
+        return element, matches
+
+    def compiles_for(self, mappet):
+        u"""Checks if the path can be resolved by walking the elements of a mappet object."""
+        return not (self._generic or not self._names.isdisjoint(_class_members(mappet.__class__)))
+
+    def default(self, default):
+        u"""Returns the value of the path for a missing node."""
+        # When getting #text and @attr we want default value to be None.
+        if self.text_or_attr and default is NONE_NODE:
+            return None
+        return default
+
+    def result(self, mappet, index, element, matches):
+        u"""Returns the value of the path for a node (``element``) or nodes (``matches``), see :func:`_step`."""
+        # Return #text or @attr
+        if self.text_or_attr:
+            if matches is not None:
+                return None
+            if self.text_or_attr == 'text':
+                return element.text
+            return element.get(self.text_or_attr)
+
+        if matches is not None:
+            return MappetList(element, matches, mappet.__class__, index)
+        if element is mappet._xml:
+            return mappet
+        return mappet._wrap(element, index)
+
+    def resolve_attributes(self, obj, default=NONE_NODE):
+        u"""Resolves the path with attribute access, e.g. of mappet objects."""
+        default = self.default(default)
+
+        my_object = obj
+        for segment in self.segments:
+            try:
+                if isinstance(my_object, (list, tuple, MappetList)) and segment.__class__ is int:
+                    my_object_next = my_object[segment]
+                else:
+                    my_object_next = getattr(my_object, str(segment))
+                my_object = my_object_next
+            except (AttributeError, KeyError, IndexError):
+                return default
+
+        # Return #text or @attr
+        if self.text_or_attr:
+            try:
+                return my_object.getattr(self.text_or_attr)
+            except AttributeError:
+                # myObject can be a list.
+                return None
+        else:
+            return my_object
+
+
+def _iter_texts(index, elements, field, tag=None):
+    u"""Yields texts of the first children of elements matching a field, ``None`` if there is none.
+
+    Children are looked up by an original tagname (``tag``, the last one
+    found) or, if there is no such child, by the normalized name (``field``).
+    """
+    tag = tag or field
+    for element in elements:
+        child = next(element.iterchildren(tag=tag), None)
+        if child is None:
+            tag = index.aliases(element).get(field, tag)
+            child = next(element.iterchildren(tag=tag), None)
+        yield None if child is None else child.text
+
+
+def _iter_child_texts(index, parent, tag, field):
+    u"""Yields texts of the children of ``parent``'s children with a tagname matching a field.
+
+    Walks the subtree of ``parent`` once, like ``etree.iter``, which is
+    faster than looking into the children one by one. The field is looked up
+    by the tagname it has in the first child, other tagnames are looked up
+    separately, only for the children without the first one.
+    """
+    first = next(parent.iterchildren(tag=tag))
+    field_tag = index.aliases(first).get(field, field)
+
+    if field_tag == tag:
+        for text in _iter_texts(index, parent.iterchildren(tag=tag), field, field_tag):
+            yield text
+        return
+
+    record = None
+    text = None
+    found = False
+
+    for element in parent.iter(tag, field_tag):
+        if element.tag == tag:
+            if element.getparent() is not parent:
+                continue
+            if record is not None:
+                yield text if found else next(_iter_texts(index, [record], field, field_tag))
+            record = element
+            text = None
+            found = False
+        elif not found and record is not None and element.getparent() is record:
+            text = element.text
+            found = True
+
+    if record is not None:
+        yield text if found else next(_iter_texts(index, [record], field, field_tag))
+
+
+def _array_typecodes():
+    u"""Returns a dict mapping NumPy-like dtype names to ``array`` typecodes.
+
+    Typecodes are picked by their item size, which differs between platforms
+    (``'l'`` has 4 bytes on Windows).
+    """
+    typecodes = {'float32': 'f', 'float64': 'd'}
+    for prefix, codes in (('int', 'bhilq'), ('uint', 'BHILQ')):
+        for code in codes:
+            try:
+                itemsize = array.array(code).itemsize
+            except ValueError:
+                # ``'q'`` and ``'Q'`` are available since Python 3.3.
+                continue
+            typecodes.setdefault('{}{}'.format(prefix, itemsize * 8), code)
+    return typecodes
+
+
+#: Typecodes of arrays returned by ``Mappet.column``.
+ARRAY_TYPECODES = _array_typecodes()
+
+
+#: Names of helper functions converting text values.
+_CONVERTERS = frozenset(name for name in helpers.__all__ if name.startswith('to_'))
+
+
+def _import_numpy():
+    u"""Imports NumPy when it's needed, returns ``None`` if it isn't installed."""
+    try:
+        import numpy
+    except ImportError:  # pragma: nocover
+        return None
+    return numpy
+
+
+def _to_date(value):
+    return helpers.to_date(value).date()
+
+
+#: Converters of types which can't convert text themselves.
+_TYPE_CONVERTERS = {
+    bool: helpers.to_bool,
+    datetime.date: _to_date,
+    datetime.datetime: helpers.to_datetime,
+    datetime.time: helpers.to_time,
+    Decimal: helpers.to_decimal,
+}
+
+
+def _get_converter(converter):
+    u"""Returns a converter given as a callable or as a helper name (``'to_int'`` or ``'int'``).
+
+    Types such as ``datetime.datetime`` or ``bool`` are converted with the
+    respective helpers.
+    """
+    if converter in _TYPE_CONVERTERS:
+        return _TYPE_CONVERTERS[converter]
+    if callable(converter):
+        return converter
+
+    name = converter if converter.startswith('to_') else 'to_' + converter
+    if name not in _CONVERTERS:
+        raise ValueError('Unknown converter {}.'.format(converter))
+    return getattr(helpers, name)
+
+
+def _step(index, element, matches, segment):
+    u"""Moves along a path by one segment.
+
+    The position on the path is a single element (``matches`` is ``None``)
+    or several children of ``element``, given by their tagname (``matches``).
+    Returns the next position or ``None`` if there is no node at the path.
+    """
+    if matches is not None:
+        # Several nodes match, only an index can pick one of them.
+        if segment.__class__ is not int:
+            return None
+        child = _nth_child(element, matches, segment)
+        return None if child is None else (child, None)
+
+    tag, child = index.find(element, str(segment))
+    if child is None:
+        return None
+
+    if next(child.itersiblings(tag=tag), None) is None:
+        return child, None
+    return element, tag
+
+
+class _PathTrie(object):
+    u"""Compiled paths arranged in a trie of segments.
+
+    A node of the trie is a pair of a dict of subtries and a list of
+    positions of paths ending at it.
+    """
+
+    __slots__ = ('paths', 'root')
+
+    def __init__(self, paths):
+        self.paths = tuple(path if isinstance(path, CompiledPath) else Mappet.compile_path(path) for path in paths)
+        self.root = ({}, [])
+
+        for position, path in enumerate(self.paths):
+            node = self.root
+            for segment in path.segments:
+                subtries = node[0]
+                try:
+                    node = subtries[segment]
+                except KeyError:
+                    node = subtries[segment] = ({}, [])
+            node[1].append(position)
+
+    def resolve(self, mappet, default):
+        u"""Resolves the paths, walking their common prefixes once.
+
+        Returns a list of values in the order of the paths.
+        """
+        paths = self.paths
+        results = [None] * len(paths)
+        index = mappet._get_index()
+        stack = [(self.root, mappet._xml, None)]
+
+        while stack:
+            (subtries, positions), element, matches = stack.pop()
+
+            for position in positions:
+                results[position] = paths[position].result(mappet, index, element, matches)
+
+            for segment, subtrie in subtries.iteritems():
+                step = _step(index, element, matches, segment)
+                if step is None:
+                    missing = [subtrie]
+                    while missing:
+                        subtries_, positions_ = missing.pop()
+                        for position in positions_:
+                            results[position] = paths[position].default(default)
+                        missing.extend(subtries_.itervalues())
+                else:
+                    stack.append((subtrie,) + step)
+
+        for position, path in enumerate(paths):
+            if not path.compiles_for(mappet):
+                results[position] = path.resolve_attributes(mappet, default)
+
+        return results
+
+
+def _select(index, element, segments):
+    u"""Returns all elements at a path and whether several of them may match.
+
+    Unlike ``sget``, a path leading through repeated children continues in
+    every one of them. An index picks one of several matches of the previous
+    segment.
+    """
+    elements = [element]
+    many = False
+
+    for segment in segments:
+        if segment.__class__ is int:
+            if not many:
+                return [], False
+            try:
+                elements = [elements[segment]]
+            except IndexError:
+                return [], False
+            many = False
+            continue
+
+        selected = []
+        for parent in elements:
+            tag = index.aliases(parent).get(segment)
+            if tag is not None:
+                selected.extend(parent.iterchildren(tag=tag))
+
+        many = many or len(selected) > 1
+        elements = selected
+
+    return elements, many
+
+
+class TypedView(Mapping):
+    u"""Values at the paths of a schema, converted to the types the schema gives.
+
+    The values are converted when the view is created. Recently converted
+    texts are reused by other views of the document until it's changed, see
+    ``CONVERSION_CACHE_SIZE``. Paths leading through
+    repeated children give lists of values. Missing values and nodes with
+    children (unless ``#text`` is given) are ``None``. The view does not
+    reflect later changes of the document.
+
+    >>> m = Mappet('<cars><car><hp>256</hp></car><car><hp>198</hp></car></cars>')
+    >>> view = m.typed({'car.hp': int, 'car.0.hp': int})
+    >>> view['car.hp'], view['car.0.hp']
+    ([256, 198], 256)
+    """
+
+    __slots__ = ('_values',)
+
+    def __init__(self, mappet, schema):
+        u"""Converts the values of a mappet object.
+
+        :param dict schema: paths in ``sget`` notation mapped to converters,
+            see :meth:`Mappet.typed`
+        """
+        index = mappet._get_index()
+        element = mappet._xml
+        values = self._values = {}
+
+        for path, converter in schema.iteritems():
+            compiled = path if isinstance(path, CompiledPath) else Mappet.compile_path(path)
+            converter = _get_converter(converter)
+            text_or_attr = compiled.text_or_attr
+            elements, many = _select(index, element, compiled.segments)
+
+            converted = []
+            for node in elements:
+                if text_or_attr and text_or_attr != 'text':
+                    text = node.get(text_or_attr)
+                elif text_or_attr or not len(node):
+                    text = node.text
+                else:
+                    # Only leaves have values, like in the case of ``sget``.
+                    text = None
+                converted.append(None if text is None else index.convert(converter, text))
+
+            if many:
+                values[str(path)] = converted
+            else:
+                values[str(path)] = converted[0] if converted else None
+
+    def __getitem__(self, path):
+        return self._values[str(path)]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return 'TypedView({!r})'.format(self._values)
+
+
+#: Compiled paths, see :meth:`Mappet.compile_path`.
+PATH_CACHE = caching.LRUCache(PATH_CACHE_SIZE)
+
+#: Compiled ``etree.XPath`` objects, see :meth:`Mappet.xpath`.
+XPATH_CACHE = caching.LRUCache(XPATH_CACHE_SIZE)
+
+
+def _xpath_options(namespaces, regexp):
+    u"""Returns the namespaces used by an XPath query, like ``Mappet.xpath`` describes."""
+    if (
+        namespaces in ['exslt', 're'] or
+        (regexp and not namespaces)
+    ):
+        namespaces = {'re': "http://exslt.org/regular-expressions"}
+    return namespaces
+
+
+def _xpath_key(path, namespaces, regexp, smart_strings):
+    u"""Returns the key of a compiled XPath expression in ``XPATH_CACHE``."""
+    namespaces = _xpath_options(namespaces, regexp)
+    return (
+        path,
+        tuple(sorted(namespaces.items())) if namespaces else None,
+        bool(regexp),
+        bool(smart_strings),
+    )
+
+
+def _compile_xpath(key):
+    u"""Compiles an XPath expression described by a key of ``XPATH_CACHE``."""
+    path, namespaces, regexp, smart_strings = key
+    return etree.XPath(
+        path,
+        namespaces=dict(namespaces) if namespaces else None,
+        regexp=regexp,
+        smart_strings=smart_strings,
+    )
+
+
 class Mappet(Node):
     u"""A node that may have children."""
 
-    _aliases = None
-    u"""Dictionary with node aliases.
+    #: ``_aliases`` is a dict with node aliases, taken from the index on each
+    #: use. The keys are normalized tagnames, values are the original tagnames:
+    #: ``{'car_model_desc': 'car-model-desc', 'car': 'Car'}``.
+    #: ``_index`` is the index of children shared by mappet objects of the
+    #: same tree.
+    __slots__ = ('_aliases', '_index')
 
-    The keys are normalized tagnames, values are the original tagnames.
-    _aliases = {
-        'car_model_desc': 'car-model-desc',
-        'car': 'Car',
-    }
-    """
+    #: Parser configuration used when no other is specified.
+    parser_config = parsing.DEFAULT_PARSER
 
-    def __init__(self, xml):
+    #: Paths mapped to converters of their values, used by :meth:`typed`.
+    schema = None
+
+    def __init__(self, xml, parser_config=None):
         u"""Creates the mappet object from either lxml object, a string or a dict.
 
         If you pass a dict without root element, one will be created for you with
         'root' as tag name.
 
+        Strings are parsed with the parser described by ``parser_config``
+        (``parser_config`` class attribute by default).
+
         >>> Mappet({'a': {'#text': 'list_elem_1', '@attr1': 'val1'}}).to_str()
         '<a attr1="val1">list_elem_1</a>'
         >>> Mappet({'#text': 'list_elem_1', '@attr1': 'val1'}).to_str()
         '<root attr1="val1">list_elem_1</root>'
         """
+        self._aliases = None
+        self._index = None
+
         if etree.iselement(xml):
             self._xml = xml
         elif isinstance(xml, basestring):
-            self._xml = etree.fromstring(xml)
+            self._xml = etree.fromstring(xml, self.parser(parser_config))
         elif isinstance(xml, dict):
             if len(xml) == 1:
                 root_name = xml.keys()[0]
@@ -281,10 +1041,256 @@ class Mappet(Node):
             else:
                 root_name = 'root'
                 body = xml
-            self._xml = helpers.dict_to_etree(body, etree.Element(root_name))
+            self._xml = helpers.build_etree(body, etree.Element(root_name))
         else:
             raise AttributeError('Specified data cannot be used to construct a Mappet object.')
 
+    @classmethod
+    def parser(cls, parser_config=None):
+        u"""Returns the current thread's parser for a given configuration.
+
+        :param parsing.ParserConfig parser_config: parser options,
+            ``parser_config`` class attribute by default
+        :rtype: etree.XMLParser
+        """
+        return (parser_config or cls.parser_config).parser()
+
+    @classmethod
+    def from_file(cls, source, parser_config=None, only=None):
+        u"""Creates the mappet object from a file.
+
+        The file is read directly by libxml2, without building a string first.
+
+        :param source: a filename or a file object to read the XML from
+        :param parsing.ParserConfig parser_config: parser options
+        :param list only: paths of the subtrees to keep, see :meth:`from_bytes`
+        """
+        if only is None:
+            return cls(etree.parse(source, cls.parser(parser_config)).getroot())
+
+        selection = _Selection(only)
+        events = (parser_config or cls.parser_config).iterparse(source, events=('start', 'end'))
+        selection.process(events)
+        selection.finish()
+
+        return cls(events.root)
+
+    @classmethod
+    def from_bytes(cls, buf, parser_config=None, only=None):
+        u"""Creates the mappet object from a buffer with an encoded XML document.
+
+        Accepts ``str``, ``bytearray``, ``memoryview``, ``buffer`` and ``mmap``
+        objects. The encoding declaration of the document is respected.
+        Buffers other than ``str`` are passed to the parser in chunks of
+        ``PARSE_CHUNK_SIZE`` bytes, so they are never copied as a whole.
+
+        If ``only`` is given, just the subtrees under the listed paths (in
+        ``sget`` notation, relative to the root) and their ancestors are
+        built. Everything else is dropped while the document is parsed.
+
+        >>> Mappet.from_bytes(bytearray('<root><a>A</a></root>')).a.get()
+        'A'
+        >>> Mappet.from_bytes('<a><b>B</b><c><d>D</d><e/></c></a>', only=['c.d']).to_str()
+        '<a><c><d>D</d></c></a>'
+
+        :param list only: paths of the subtrees to keep
+        """
+        if only is not None:
+            selection = _Selection(only)
+            parser = (parser_config or cls.parser_config).pull_parser(events=('start', 'end'))
+            for chunk in _iter_chunks(buf):
+                parser.feed(chunk)
+                selection.process(parser.read_events())
+
+            root = parser.close()
+            selection.process(parser.read_events())
+            selection.finish()
+            return cls(root)
+
+        parser = cls.parser(parser_config)
+
+        if isinstance(buf, bytes):
+            return cls(etree.fromstring(buf, parser))
+
+        fed = False
+        try:
+            for chunk in _iter_chunks(buf):
+                parser.feed(chunk)
+            fed = True
+        finally:
+            if not fed:
+                # The parser is shared by the thread, it must not be left in feed mode.
+                try:
+                    parser.close()
+                except etree.XMLSyntaxError:
+                    pass
+
+        return cls(parser.close())
+
+    @classmethod
+    def from_json(cls, source):
+        u"""Creates the mappet object from a JSON string or file object.
+
+        The result is the same as of ``Mappet(json.loads(source))``, but the
+        elements are built while the JSON is decoded, without a dict of the
+        whole document. See :func:`helpers.json_to_etree`.
+
+        >>> Mappet.from_json('{"car": {"@id": "1", "hp": 256}}').to_str()
+        '<car id="1"><hp>256</hp></car>'
+        """
+        return cls(helpers.json_to_etree(source))
+
+    @classmethod
+    def iter_records(cls, source, tag, parser_config=None):
+        u"""Iterates over records of an XML document without loading it whole.
+
+        Every element matching ``tag`` is yielded as soon as its closing tag
+        is parsed, either as a mappet object or as a :class:`Literal` if it
+        has no children. Tag names are compared after normalization, so
+        ``car_model`` matches ``<Car-Model>``.
+
+        A record is yielded once the parser moves past it, detached from the
+        document. Everything parsed before it is removed, so the memory use
+        does not grow with the size of the document.
+
+        :param source: a filename or a file object to read the XML from
+        :param str tag: tag name of the records
+        :param parsing.ParserConfig parser_config: parser options
+        """
+        records = _RecordFilter(tag)
+        events = (parser_config or cls.parser_config).iterparse(source, events=('start', 'end'))
+
+        for element in chain(records.process(events), records.finish()):
+            yield cls._wrap(element)
+
+    def iter_dicts(self, path, **kw):
+        u"""Iterates over the nodes at a path converted to dicts, like :meth:`to_dict`.
+
+        Nodes are converted one at a time, so only the dict of the current
+        node is held besides the document. To stream records of documents not
+        loaded yet, see :func:`iter_dicts`.
+
+        >>> m = Mappet('<cars><car><hp>256</hp></car><car><hp>198</hp></car></cars>')
+        >>> list(m.iter_dicts('car'))
+        [{'hp': '256'}, {'hp': '198'}]
+
+        :param path: path of the nodes in ``sget`` notation
+        :param kw: options of :func:`helpers.etree_to_dict`, e.g. ``without_comments``
+        """
+        for element in self._iter_elements(path):
+            _, value = helpers.etree_to_dict(element, **kw).popitem()
+            yield value
+
+    @classmethod
+    def from_chunks(cls, chunks, parser_config=None):
+        u"""Creates the mappet object from an iterable of encoded XML chunks.
+
+        Every chunk is parsed as soon as it is produced, so parsing overlaps
+        with reading the input, e.g. from a network stream.
+
+        >>> Mappet.from_chunks(['<root><a>', 'A</a></root>']).a.get()
+        'A'
+        """
+        parser = cls.feed_parser(parser_config=parser_config)
+        for chunk in chunks:
+            parser.feed(chunk)
+
+        return parser.close()
+
+    @classmethod
+    def parse_many(
+            cls,
+            sources,
+            backend='thread',
+            workers=None,
+            chunksize=1,
+            ordered=True,
+            transform=None,
+            parser_config=None,
+    ):
+        u"""Parses many documents in a pool of workers.
+
+        ``lxml`` releases the GIL while parsing, so the ``thread`` backend
+        scales with cores when parsing dominates. The ``process`` backend
+        suits the case when the documents are also converted: pass the
+        conversion as ``transform`` so it runs in the workers and only its
+        results are sent back. It must be a module-level function, e.g.
+        ``def to_dict(m): return m.to_dict()``, methods (``Mappet.to_dict``)
+        can't be pickled on Python 2. Without ``transform`` the parsed objects
+        are pickled back to the caller.
+
+        :param sources: iterable of documents accepted by :meth:`from_bytes`
+        :param str backend: either ``'thread'`` or ``'process'``
+        :param int workers: pool size, the number of CPUs by default
+        :param int chunksize: number of documents sent to a worker at once
+        :param bool ordered: if ``False``, results are returned as they are
+            completed rather than in the order of ``sources``
+        :param transform: a picklable callable (not a method) applied to every
+            parsed object
+        :param parsing.ParserConfig parser_config: parser options
+        :returns: an iterator of parsed objects or ``transform`` results, the
+            workers are started when it's first advanced and stopped when it's
+            exhausted or closed
+        """
+        try:
+            pool_class = POOL_BACKENDS[backend]
+        except KeyError:
+            raise ValueError('Unknown backend {!r}, expected one of: {}.'.format(
+                backend, ', '.join(sorted(POOL_BACKENDS)),
+            ))
+
+        parse = partial(_parse_document, cls, parser_config, transform)
+        return _iter_pool_results(pool_class, workers, parse, sources, chunksize, ordered)
+
+    @classmethod
+    def feed_parser(cls, tag=None, parser_config=None):
+        u"""Creates a :class:`FeedParser` building objects of this class.
+
+        :param str tag: tag name of the records to be returned by ``feed``
+        :param parsing.ParserConfig parser_config: parser options
+        """
+        return FeedParser(cls, tag=tag, parser_config=parser_config)
+
+    @classmethod
+    @contextmanager
+    def writer(cls, fp, root='export', encoding='utf-8', compression=0, pretty_print=False):
+        u"""Writes a document record by record, without building its tree.
+
+        Yields a :class:`RecordWriter`, whose records are serialized into the
+        ``root`` element right away. The document is complete when the
+        ``with`` block ends.
+
+        >>> from io import BytesIO
+        >>> out = BytesIO()
+        >>> with Mappet.writer(out, root='cars') as writer:
+        ...     writer.write({'car': {'hp': '256'}})
+        ...     writer.write(Mappet('<car><hp>198</hp></car>'))
+        >>> out.getvalue()
+        "<?xml version='1.0' encoding='utf-8'?>\\n<cars><car><hp>256</hp></car><car><hp>198</hp></car></cars>"
+
+        :param fp: a filename or a file object opened for writing bytes
+        :param str root: tag name of the root element
+        :param str encoding: encoding of the document
+        :param int compression: gzip compression level, 0 writes plain XML
+        :param bool pretty_print: writes every record indented, in a new line
+        """
+        with etree.xmlfile(fp, encoding=encoding, compression=compression) as xf:
+            xf.write_declaration()
+            with xf.element(root):
+                yield RecordWriter(xf, pretty_print)
+
+    @classmethod
+    def _wrap(cls, element, index=None):
+        u"""Wraps an element in a mappet object or, if it's a leaf, in a :class:`Literal`.
+
+        :param _TreeIndex index: index of the tree to be shared with the new object
+        """
+        if len(element):
+            mappet = cls(element)
+            mappet._index = index
+            return mappet
+        return Literal(element)
+
     def __nonzero__(self):
         u"""Checks if this node has children, otherwise returns False."""
         return self.has_children()
@@ -304,15 +1310,10 @@ class Mappet(Node):
     def __getattr__(self, name):
         u"""Attribute access.
 
-        Returns a list o children, if there is more than 1.
+        Returns a :class:`MappetList` of children, if there is more than 1.
         Returns a child, if there is exactly 1.
         """
-        children = self.children(name)
-
-        if len(children) > 1:
-            return children
-        elif len(children) == 1:
-            return children[0]
+        return self._get_children(name)
 
     def __setattr__(self, name, value):
         u"""Node attribute assignment.
@@ -320,7 +1321,7 @@ class Mappet(Node):
         Calls ``set`` in the end.
         """
         # Only elements that aren't a part of class definition are overwritten.
-        if name not in dir(self.__class__):
+        if name not in _class_members(self.__class__):
             return self.set(name, value)
 
         return super(Mappet, self).__setattr__(name, value)
@@ -335,10 +1336,7 @@ class Mappet(Node):
         u"""Dictionary access."""
         # Checks if the call isn't to an attribute.
         if isinstance(key, basestring) and not key.startswith('@'):
-            children = self.children(key)
-
-            if len(children) == 1:
-                children = children[0]
+            children = self._get_children(key)
 
             # Return the value if it's a leaf.
             if isinstance(children, Literal):
@@ -351,8 +1349,10 @@ class Mappet(Node):
     def __delitem__(self, key):
         u"""Removes all children with a given key."""
         # Checks if name is not a part of class definition.
-        if key not in dir(self.__class__):
-            for child in self._xml.iterchildren(tag=key):
+        if key not in _class_members(self.__class__):
+            children = list(self._xml.iterchildren(tag=key))
+            self._invalidate_index(*children)
+            for child in children:
                 self._xml.remove(child)
 
     def __eq__(self, other):
@@ -363,9 +1363,8 @@ class Mappet(Node):
         return etree.tostring(self._xml) == etree.tostring(other._xml)
 
     def __contains__(self, path):
-        u"""Check if object contains given path."""
-        elem = self.sget(path)
-        return not (elem is None or elem is NONE_NODE)
+        u"""Check if object contains given path, see :meth:`exists`."""
+        return self.exists(path)
 
     def __getstate__(self):
         u"""Converts the lxml to string for Pickling."""
@@ -375,7 +1374,9 @@ class Mappet(Node):
 
     def __setstate__(self, dict_):
         u"""Restores a Pickled mappet object."""
-        self._xml = etree.fromstring(dict_['_xml'])
+        self._aliases = None
+        self._index = None
+        self._xml = etree.fromstring(dict_['_xml'], self.parser())
 
     def __iter__(self):
         u"""Returns children as an iterator."""
@@ -394,16 +1395,28 @@ class Mappet(Node):
         :rtype: str
         :returns: node's representation as a string
         """
-        if kw.get('without_comments') and not kw.get('method'):
-            kw.pop('without_comments')
-            kw['method'] = 'c14n'
-            kw['with_comments'] = False
-        return etree.tostring(
-            self._xml,
-            pretty_print=pretty_print,
-            encoding=encoding,
-            **kw
-        )
+        return etree.tostring(self._xml, **_serialization_options(pretty_print, encoding, kw))
+
+    def iter_bytes(self, chunk_size=SERIALIZE_CHUNK_SIZE, encoding=None, pretty_print=False, **kw):
+        u"""Serializes the node incrementally, yielding chunks of ``chunk_size`` bytes.
+
+        Joined, the chunks are equal to ``to_str`` called with the same
+        arguments. The tree is serialized subtree by subtree, as the chunks
+        are consumed, so the whole string is never held in memory (e.g. for
+        streaming responses). Output whose parts depend on their context is
+        serialized at once and then yielded in chunks: pretty printed, C14N
+        (e.g. ``without_comments``) and other than ``xml``, and nodes in the
+        scope of namespace declarations. Descendants declaring namespaces are
+        serialized at once, each.
+
+        >>> list(Mappet('<cars><car>X6</car><car>X1</car></cars>').iter_bytes(chunk_size=16))
+        ['<cars><car>X6</c', 'ar><car>X1</car>', '</cars>']
+
+        :param int chunk_size: size of the chunks, the last one may be shorter
+        :param kw: arguments of ``to_str``, like ``without_comments``
+        """
+        parts = _iter_serialized(self._xml, chunk_size, _serialization_options(pretty_print, encoding, kw))
+        return _iter_rechunked(parts, chunk_size)
 
     def has_children(self):
         u"""Returns true if a node has children."""
@@ -422,11 +1435,9 @@ class Mappet(Node):
             if not tag:
                 raise KeyError(key)
 
+        index = self._get_index()
         for child in self._xml.iterchildren(tag=tag):
-            if len(child):
-                yield self.__class__(child)
-            else:
-                yield Literal(child)
+            yield self._wrap(child, index)
 
     def children(self, key=None):
         u"""Returns node's children.
@@ -452,7 +1463,7 @@ class Mappet(Node):
                 element = etree.Element(key)
                 element.text = helper(value)
                 self._xml.append(element)
-                self._aliases = None
+                self._invalidate_index()
 
     def sget(self, path, default=NONE_NODE):
         u"""Enables access to nodes if one or more of them don't exist.
@@ -473,38 +1484,162 @@ class Mappet(Node):
         >>> m.sget('reply.fake_node').to_dict() is None
         True
         """
-        attrs = str(path).split(".")
-        text_or_attr = None
-        last_attr = attrs[-1]
-        # Case of getting text or attribute
-        if last_attr == '#text' or last_attr.startswith('@'):
-            # #text => text, @attr => attr
-            text_or_attr = last_attr[1:]
-            attrs = attrs[:-1]
-            # When getting #text and @attr we want default value to be None.
-            if default is NONE_NODE:
-                default = None
-
-        my_object = self
-        for attr in attrs:
-            try:
-                if isinstance(my_object, (list, tuple)) and re.match('^\-?\d+$', attr):
-                    my_object_next = my_object[int(attr)]
-                else:
-                    my_object_next = getattr(my_object, attr)
-                my_object = my_object_next
-            except (AttributeError, KeyError, IndexError):
-                return default
+        if not isinstance(path, CompiledPath):
+            path = self.compile_path(path)
+        return path.resolve(self, default)
+
+    def exists(self, path):
+        u"""Checks if there is a node (or a text or an attribute) at a given path.
+
+        Gives the same answer as checking the result of ``sget``, but walks
+        the elements without creating any mappet objects.
+
+        >>> m = Mappet('<root><car attr1="attr text">text value</car></root>')
+        >>> m.exists('car.@attr1'), m.exists('car.@attr2'), m.exists('reply.cars')
+        (True, False, False)
+        """
+        if not isinstance(path, CompiledPath):
+            path = self.compile_path(path)
+        return path.exists(self)
+
+    @staticmethod
+    def compile_path(path):
+        u"""Returns a :class:`CompiledPath` for a path in ``sget`` notation.
+
+        Compiled paths are cached, the ``PATH_CACHE_SIZE`` most recently used
+        are kept. A compiled path can be passed to ``sget`` in place of a string.
+
+        >>> path = Mappet.compile_path('car.@attr1')
+        >>> path is Mappet.compile_path('car.@attr1')
+        True
+        >>> Mappet('<root><car attr1="attr text"/></root>').sget(path)
+        'attr text'
+        """
+        return PATH_CACHE.get(str(path), CompiledPath)
+
+    def sget_many(self, paths, default=NONE_NODE, converters=None):
+        u"""Returns a dict of values at given paths, like ``sget`` would.
+
+        Paths sharing a prefix are resolved walking the prefix once, e.g. all
+        ``head.*`` paths descend into ``head`` just once. Like single paths,
+        sets of paths are compiled once and cached.
+
+        Converters map paths to the names of helper functions (``'to_int'``
+        or ``'int'``) or to callables. They are called with the value at the path: the text
+        of a leaf, the text or attribute value, or the node(s) otherwise.
+        Missing values are not converted.
+
+        >>> m = Mappet('<root><head><id seq="20"/><type>reply</type></head></root>')
+        >>> values = m.sget_many(['head.id.@seq', 'head.type.#text'], converters={'head.id.@seq': 'to_int'})
+        >>> values['head.id.@seq'], values['head.type.#text']
+        (20, 'reply')
+
+        :param paths: paths in ``sget`` notation (strings or compiled paths)
+        :param default: value returned for paths without a node
+        :param dict converters: converters of values at given paths
+        """
+        paths = tuple(paths)
+        values = dict(zip(paths, PATH_CACHE.get(paths, _PathTrie).resolve(self, default)))
+
+        for path, converter in (converters or {}).iteritems():
+            converter = _get_converter(converter)
+            value = values.get(path)
+            if value is None or value is NONE_NODE or value is default:
+                continue
+            if isinstance(value, Literal):
+                value = value.get()
+                if value is None:
+                    continue
+            values[path] = converter(value)
+
+        return values
+
+    def typed(self, schema=None):
+        u"""Returns a view of values at given paths converted to given types.
+
+        The schema maps paths in ``sget`` notation to converters: types (e.g.
+        ``int`` or ``datetime.datetime``), names of helper functions (``'to_int'``
+        or ``'int'``) or other callables. By default, the ``schema`` attribute
+        of the class is used, which may be set by subclasses.
+
+        Converted texts are kept with the document, so the same values are not
+        converted again by other views, see :class:`TypedView`.
+
+        >>> m = Mappet('<root><head><date>2015-07-13</date></head></root>')
+        >>> m.typed({'head.date': datetime.date})['head.date']
+        datetime.date(2015, 7, 13)
+        """
+        schema = self.schema if schema is None else schema
+        if schema is None:
+            raise ValueError('No schema given.')
+        return TypedView(self, schema)
+
+    def column(self, path, field, dtype='int64', missing='raise', invalid='raise', as_numpy=None):
+        u"""Returns values of a field of the nodes at a path as an array.
+
+        The nodes are walked once, without creating mappet objects, and the
+        values are stored in an ``array.array`` or, if NumPy is installed, in
+        a NumPy array.
+
+        ``missing`` and ``invalid`` tell what to do with nodes without the
+        field (or without its text) and with values which can't be converted:
+        ``'raise'`` a ValueError, ``'skip'`` the node or store a given value
+        in its place.
+
+        A field named by a child is looked up by the tagname it has in the
+        first node (e.g. ``HP`` for ``hp``) and only in nodes without such
+        child by the normalized name. Unlike ``sget``, a node with children
+        of both spellings (``<HP>`` and ``<hp>``) gives the value of the one
+        spelled like in the first node.
+
+        >>> m = Mappet('<cars><car><hp>256</hp></car><car><hp>198</hp></car><car/></cars>')
+        >>> m.column('car', 'hp', missing=0, as_numpy=False)
+        array('l', [256, 198, 0])
+
+        :param path: path of the nodes in ``sget`` notation
+        :param field: a (normalized) name of a child, ``'@attr'`` or ``'#text'``
+        :param str dtype: type of the values, e.g. ``'int32'`` or ``'float64'``
+        :param missing: ``'raise'``, ``'skip'`` or a value of missing fields
+        :param invalid: ``'raise'``, ``'skip'`` or a value of invalid fields
+        :param as_numpy: whether to return a NumPy array, by default if NumPy is installed
+        """
+        try:
+            typecode = ARRAY_TYPECODES[dtype]
+        except KeyError:
+            raise ValueError('Unsupported dtype {}.'.format(dtype))
+
+        convert = float if typecode in 'fd' else int
+        values = array.array(typecode)
+        append = values.append
+
+        for text in self._iter_field_texts(path, field):
+            if text is None:
+                if missing == 'skip':
+                    continue
+                if missing == 'raise':
+                    raise ValueError('Missing {} of a node at {}.'.format(field, path))
+                append(missing)
+                continue
 
-        # Return #text or @attr
-        if text_or_attr:
             try:
-                return my_object.getattr(text_or_attr)
-            except AttributeError:
-                # myObject can be a list.
-                return None
-        else:
-            return my_object
+                append(convert(text))
+            except (ValueError, OverflowError):
+                if invalid == 'skip':
+                    continue
+                if invalid == 'raise':
+                    raise ValueError('Invalid {} {!r} of a node at {}.'.format(field, text, path))
+                append(invalid)
+
+        if as_numpy is False:
+            return values
+        numpy = _import_numpy()
+        if numpy is None:
+            if as_numpy:
+                raise ImportError('NumPy is required to return NumPy arrays.')
+            return values
+        if not values:
+            return numpy.empty(0, dtype=dtype)
+        return numpy.frombuffer(values, dtype=dtype)
 
     def create(self, tag, value):
         u"""Creates a node, if it doesn't exist yet.
@@ -551,6 +1686,9 @@ class Mappet(Node):
             # with current root as parent (self._xml).
             element = etree.SubElement(self._xml, name)
 
+        # Clear the aliases.
+        self._invalidate_index(element)
+
         if isinstance(value, dict):
             self.assign_dict(element, value)
         elif isinstance(value, (list, tuple, set)):
@@ -559,9 +1697,6 @@ class Mappet(Node):
             # Literal value.
             self.assign_literal(element, value)
 
-        # Clear the aliases.
-        self._aliases = None
-
     def assign_dict(self, node, xml_dict):
         """Assigns a Python dict to a ``lxml`` node.
 
@@ -569,12 +1704,13 @@ class Mappet(Node):
         :param xml_dict: The dict with attributes/children to use.
         """
         new_node = etree.Element(node.tag)
+        self._invalidate_index(node)
 
         # Replaces the previous node with the new one
         self._xml.replace(node, new_node)
 
         # Copies #text and @attrs from the xml_dict
-        helpers.dict_to_etree(xml_dict, new_node)
+        helpers.build_etree(xml_dict, new_node)
 
     @staticmethod
     def assign_sequence_or_set(element, value):
@@ -582,7 +1718,7 @@ class Mappet(Node):
 
         for item in value:
             temp_element = etree.Element('temp')
-            helpers.dict_to_etree(item, temp_element)
+            helpers.build_etree(item, temp_element)
             for child in temp_element.iterchildren():
                 element.append(child)
             del temp_element
@@ -612,19 +1748,105 @@ class Mappet(Node):
         _, value = helpers.etree_to_dict(self._xml, **kw).popitem()
         return value
 
+    def to_json(self, fp=None, **kw):
+        u"""Converts the lxml object to JSON.
+
+        The JSON represents the dict returned by ``to_dict``, and is written
+        while the tree is walked, without building the dict.
+
+        :param fp: a file object to write the JSON to, or None to return it
+        :param kw: options of ``to_dict``
+        """
+        if fp is not None:
+            helpers.etree_to_json(self._xml, fp.write, **kw)
+            return
+
+        parts = []
+        helpers.etree_to_json(self._xml, parts.append, **kw)
+        return ''.join(parts)
+
     def _get_aliases(self):
         u"""Creates a dict with aliases.
 
-        The key is a normalized tagname, value the original tagname.
+        The key is a normalized tagname, value the original tagname. The
+        index builds the dict again if the children have changed.
         """
-        if self._aliases is None:
-            self._aliases = {}
+        self._aliases = {} if self._xml is None else self._get_index().aliases(self._xml)
+        return self._aliases
 
-            if self._xml is not None:
-                for child in self._xml.iterchildren():
-                    self._aliases[helpers.normalize_tag(child.tag)] = child.tag
+    def _get_children(self, key):
+        u"""Returns a child with a given key or a :class:`MappetList`, if there are many.
 
-        return self._aliases
+        Children are scanned only until the second one with the tagname.
+        """
+        if self._xml is None:
+            raise KeyError(key)
+
+        index = self._get_index()
+        tag, child = index.find(self._xml, key)
+
+        if child is None:
+            raise KeyError(key)
+        if next(child.itersiblings(tag=tag), None) is None:
+            return self._wrap(child, index)
+        return MappetList(self._xml, tag, self.__class__, index)
+
+    def _iter_elements(self, path):
+        u"""Returns an iterable of elements at a path, without wrapping them."""
+        if not isinstance(path, CompiledPath):
+            path = self.compile_path(path)
+        if path.text_or_attr:
+            raise ValueError('Path {} does not lead to nodes.'.format(path))
+
+        if not path.compiles_for(self):
+            nodes = path.resolve_attributes(self)
+            if isinstance(nodes, Node):
+                return [nodes._xml]
+            if isinstance(nodes, (list, tuple, MappetList)):
+                return [node._xml for node in nodes]
+            return []
+
+        step = path.walk(self)
+        if step is None:
+            return []
+
+        element, matches = step
+        if matches is None:
+            return [element]
+        return element.iterchildren(tag=matches)
+
+    def _iter_field_texts(self, path, field):
+        u"""Yields the text of a field of every node at a path, ``None`` if it's missing.
+
+        :param field: a (normalized) name of a child, ``'@attr'`` or ``'#text'``
+        """
+        index = self._get_index()
+
+        if field == '#text':
+            return (element.text for element in self._iter_elements(path))
+        if field.startswith('@'):
+            return (element.get(field[1:]) for element in self._iter_elements(path))
+
+        if not isinstance(path, CompiledPath):
+            path = self.compile_path(path)
+        step = path.walk(self) if path.compiles_for(self) and not path.text_or_attr else None
+        if step is not None and step[1] is not None:
+            return _iter_child_texts(index, step[0], step[1], field)
+        return _iter_texts(index, self._iter_elements(path), field)
+
+    def _get_index(self):
+        u"""Returns the index of children of the tree, creating it if needed."""
+        if self._index is None:
+            self._index = _TreeIndex()
+        return self._index
+
+    def _invalidate_index(self, *subtrees):
+        u"""Drops cached children of this node and of given subtrees about to be changed."""
+        self._aliases = None
+        if self._index is not None:
+            self._index.invalidate(self._xml)
+            for subtree in subtrees:
+                self._index.forget(subtree)
 
     def xpath(
             self,
@@ -644,7 +1866,10 @@ class Mappet(Node):
             ``exslt`` namespace
         :param bool smart_strings:
         :param bool single_use: faster method for using only once. Does not
-            create ``XPathEvaluator`` instance.
+            compile the expression nor keep it in the cache.
+
+        Compiled expressions are kept in ``XPATH_CACHE``, which holds the
+        ``XPATH_CACHE_SIZE`` most recently used ones; see also :meth:`precompile`.
 
         >>> root = mappet.Mappet("<root><a>aB</a><b>aBc</b></root>")
         >>> root.XPath(
@@ -653,29 +1878,93 @@ class Mappet(Node):
             regexp=True,
         )
         """
-        if (
-            namespaces in ['exslt', 're'] or
-            (regexp and not namespaces)
-        ):
-            namespaces = {'re': "http://exslt.org/regular-expressions"}
         if single_use:
-            node = self._xml.xpath(path)
-        else:
-            xpe = self.xpath_evaluator(
-                namespaces=namespaces,
+            node = self._xml.xpath(
+                path,
+                namespaces=_xpath_options(namespaces, regexp),
                 regexp=regexp,
-                smart_strings=smart_strings
+                smart_strings=smart_strings,
             )
-            node = xpe(path)
+        else:
+            key = _xpath_key(path, namespaces, regexp, smart_strings)
+            node = XPATH_CACHE.get(key, _compile_xpath)(self._xml)
 
-        if len(node) == 1:
-            node = node[0]
-            if len(node):
-                return self.__class__(node)
-            else:
-                return Literal(node)
+        if isinstance(node, list) and len(node) == 1:
+            return self._wrap(node[0], self._get_index())
         return node
 
+    def iterxpath(self, path, namespaces=None, regexp=False, smart_strings=True):
+        u"""Iterates over results of an XPath query, wrapping nodes one at a time.
+
+        Elements are yielded as mappet objects or :class:`Literal` objects,
+        other results (text, attribute values) as they are. Takes the same
+        options as :meth:`xpath`.
+
+        >>> [car.id.get() for car in Mappet('<a><b><id>1</id></b><b><id>2</id></b></a>').iterxpath('b')]
+        ['1', '2']
+        """
+        key = _xpath_key(path, namespaces, regexp, smart_strings)
+        result = XPATH_CACHE.get(key, _compile_xpath)(self._xml)
+
+        if not isinstance(result, list):
+            yield result
+            return
+
+        index = self._get_index()
+        for item in result:
+            if etree.iselement(item):
+                yield self._wrap(item, index)
+            else:
+                yield item
+
+    def xpath_values(self, path, to=None, namespaces=None, regexp=False):
+        u"""Returns text values of results of an XPath query, optionally converted.
+
+        Elements give their text, other results (text, attribute values,
+        numbers) are taken as they are. Empty values are returned as ``None``
+        and aren't converted.
+
+        >>> Mappet('<a><b>1</b><b>2</b><b/></a>').xpath_values('b', to='int')
+        [1, 2, None]
+        >>> Mappet('<a><b x="1.5"/></a>').xpath_values('b/@x', to='float')
+        [1.5]
+
+        :param str path: XPath expression
+        :param to: a converter: name of a helper (``'int'``, ``'to_decimal'``)
+            or a callable
+        """
+        key = _xpath_key(path, namespaces, regexp, False)
+        result = XPATH_CACHE.get(key, _compile_xpath)(self._xml)
+        converter = _get_converter(to) if to is not None else None
+
+        if not isinstance(result, list):
+            result = [result]
+
+        values = []
+        for item in result:
+            value = item.text if etree.iselement(item) else item
+            if value is not None and converter is not None:
+                value = converter(value)
+            values.append(value)
+        return values
+
+    @staticmethod
+    def precompile(paths, namespaces=None, regexp=False, smart_strings=True):
+        u"""Compiles XPath expressions ahead of use by :meth:`xpath`.
+
+        Meant to be called at startup: compiled expressions are put in the
+        cache and syntax errors are raised early.
+
+        >>> Mappet.precompile(['//car', 'count(//car)'])
+
+        :param list paths: XPath expressions
+        :param namespaces: namespaces, as passed to :meth:`xpath`
+        :param bool regexp: as passed to :meth:`xpath`
+        :param bool smart_strings: as passed to :meth:`xpath`
+        """
+        for path in paths:
+            XPATH_CACHE.get(_xpath_key(path, namespaces, regexp, smart_strings), _compile_xpath)
+
     def xpath_evaluator(self, namespaces=None, regexp=False, smart_strings=True):
         u"""Creates an XPathEvaluator instance for an ElementTree or an Element.
 
@@ -690,4 +1979,559 @@ class Mappet(Node):
 
     def keys(self):
         """Returns a set of node's keys."""
+        if self._xml is not None:
+            # Children removed with ``lxml`` may remain in the index.
+            self._get_index().refresh(self._xml)
         return set(self._get_aliases().keys())
+
+
+class LazyMappet(Mappet):
+    u"""A mappet object which parses its document on first access.
+
+    Useful for documents which are often only passed on and never read.
+    Until the document is parsed, ``to_str`` called without arguments
+    returns the original string verbatim and pickling does not serialize
+    the tree.
+
+    >>> m = LazyMappet('<root><a>A</a></root>')
+    >>> m.to_str()
+    '<root><a>A</a></root>'
+    >>> m.a.get()
+    'A'
+    """
+
+    #: ``_raw`` is the unparsed document, dropped once it is parsed,
+    #: ``_raw_parser_config`` the parser configuration used to parse it and
+    #: ``_tree`` the lxml object, once parsed.
+    __slots__ = ('_raw', '_raw_parser_config', '_tree')
+
+    def __init__(self, xml, parser_config=None):
+        u"""Stores a string for later parsing; other data is handled as in :class:`Mappet`."""
+        self._raw = None
+        self._raw_parser_config = None
+        self._tree = None
+
+        if isinstance(xml, basestring):
+            self._aliases = None
+            self._index = None
+            self._raw = xml
+            self._raw_parser_config = parser_config
+        else:
+            super(LazyMappet, self).__init__(xml, parser_config)
+
+    @property
+    def _xml(self):
+        u"""The lxml object, parsed on first access."""
+        if self._tree is None:
+            self._tree = etree.fromstring(self._raw, self.parser(self._raw_parser_config))
+            self._raw = None
+        return self._tree
+
+    @_xml.setter
+    def _xml(self, xml):
+        self._tree = xml
+        self._raw = None
+
+    def __deepcopy__(self, memodict):
+        u"""Copies the unparsed document or performs a deepcopy on the tree."""
+        if self._tree is None:
+            return self.__class__(self._raw, self._raw_parser_config)
+        return super(LazyMappet, self).__deepcopy__(memodict)
+
+    def __getstate__(self):
+        u"""Pickles the unparsed document as is."""
+        if self._tree is None:
+            return {'_xml': self._raw}
+        return super(LazyMappet, self).__getstate__()
+
+    def __setstate__(self, dict_):
+        u"""Restores a pickled object without parsing it."""
+        self.__init__(dict_['_xml'])
+
+    def to_str(self, pretty_print=False, encoding=None, **kw):
+        u"""Converts the node to a string, see :meth:`Mappet.to_str`.
+
+        If the document hasn't been parsed and no formatting options are
+        given, the original string is returned.
+        """
+        if self._tree is None and not (pretty_print or encoding or kw):
+            return self._raw
+        return super(LazyMappet, self).to_str(pretty_print=pretty_print, encoding=encoding, **kw)
+
+    def iter_bytes(self, chunk_size=SERIALIZE_CHUNK_SIZE, encoding=None, pretty_print=False, **kw):
+        u"""Serializes the node in chunks, see :meth:`Mappet.iter_bytes`.
+
+        If the document hasn't been parsed and no formatting options are
+        given, the original string is yielded in chunks.
+        """
+        if self._tree is None and not (pretty_print or encoding or kw):
+            return _iter_rechunked([self._raw], chunk_size)
+        return super(LazyMappet, self).iter_bytes(chunk_size, encoding=encoding, pretty_print=pretty_print, **kw)
+
+
+class FeedParser(object):
+    u"""Incremental parser fed with chunks of an encoded XML document.
+
+    Suitable for event-driven code receiving a document in parts: every
+    call to ``feed`` parses the chunk right away and returns the records
+    (elements matching ``tag``) the parser has moved past. The records are
+    detached from the document, just like in :meth:`Mappet.iter_records`.
+
+    >>> parser = Mappet.feed_parser(tag='car')
+    >>> parser.feed('<cars><Car><id>1</id></Car><Car><i')
+    [<Car> (1)]
+    >>> parser.feed('d>2</id></Car></cars>')
+    [<Car> (1)]
+    >>> parser.close()
+    <cars/> (0)
+    """
+
+    def __init__(self, mappet_class=None, tag=None, parser_config=None):
+        u"""Creates the parser.
+
+        :param type mappet_class: class of the returned objects,
+            :class:`Mappet` by default
+        :param str tag: tag name of the records to be returned by ``feed``
+        :param parsing.ParserConfig parser_config: parser options
+        """
+        self._mappet_class = mappet_class or Mappet
+        self._records = _RecordFilter(tag) if tag else None
+        config = parser_config or self._mappet_class.parser_config
+        # Without records to pick, no events are collected for the whole document.
+        self._parser = config.pull_parser(events=('start', 'end') if tag else ())
+
+    def feed(self, chunk):
+        u"""Parses a chunk of the document.
+
+        :param str chunk: next part of the encoded document
+        :rtype: list
+        :returns: records the parser has moved past in this chunk
+        """
+        self._parser.feed(chunk)
+
+        if self._records is None:
+            return []
+
+        records = self._records.process(self._parser.read_events())
+        return [self._mappet_class._wrap(element) for element in records]
+
+    def close(self):
+        u"""Finishes parsing and returns the root of the document."""
+        root = self._parser.close()
+
+        if self._records is not None:
+            # The root closes the document, hence the only record left may be
+            # the root itself, which is returned anyway.
+            for _ in chain(self._records.process(self._parser.read_events()), self._records.finish()):
+                pass
+
+        return self._mappet_class(root)
+
+
+class RecordWriter(object):
+    u"""Writes records into a document opened by :meth:`Mappet.writer`.
+
+    Each record is serialized as soon as it is written, so only the record
+    being written is held in memory.
+    """
+    __slots__ = ('_xf', '_pretty_print')
+
+    def __init__(self, xf, pretty_print=False):
+        u"""Creates the writer.
+
+        :param xf: the ``etree.xmlfile`` context to write to
+        :param bool pretty_print: writes every record indented, in a new line
+        """
+        self._xf = xf
+        self._pretty_print = pretty_print
+
+        if pretty_print:
+            xf.write('\n')
+
+    def write(self, record):
+        u"""Writes a record.
+
+        :param record: a :class:`Mappet`, an element or a dict in the format
+            accepted by ``Mappet``, whose keys are tag names of the written
+            elements (e.g. ``{'car': {'hp': '256'}}``)
+        """
+        if isinstance(record, Mappet):
+            elements = (record._xml,)
+        elif etree.iselement(record):
+            elements = (record,)
+        elif isinstance(record, dict):
+            elements = helpers.build_etree(record, etree.Element('record'))
+
+            if elements.text or elements.attrib:
+                raise ValueError('Records cannot have text or attributes: {!r}.'.format(record))
+        else:
+            raise TypeError('Unexpected type {} of record {!r}.'.format(type(record), record))
+
+        for element in elements:
+            self._xf.write(element, pretty_print=self._pretty_print, with_tail=False)
+
+    def flush(self):
+        u"""Writes the buffered output to the file."""
+        self._xf.flush()
+
+
+def iter_dicts(source, tag, parser_config=None, **kw):
+    u"""Iterates over records of an XML document converted to dicts.
+
+    Records are picked out and dropped from the document like in the case of
+    :meth:`Mappet.iter_records`, so the memory use is bounded by the largest
+    record rather than by the document. Dicts follow the conventions of
+    :meth:`Mappet.to_dict`.
+
+    :param source: a filename or a file object to read the XML from
+    :param str tag: tag name of the records
+    :param parsing.ParserConfig parser_config: parser options
+    :param kw: options of :func:`helpers.etree_to_dict`, e.g. ``without_comments``
+    """
+    records = _RecordFilter(tag)
+    events = (parser_config or Mappet.parser_config).iterparse(source, events=('start', 'end'))
+
+    for element in chain(records.process(events), records.finish()):
+        _, value = helpers.etree_to_dict(element, **kw).popitem()
+        yield value
+
+
+def _iter_chunks(buf):
+    u"""Yields a buffer in ``str`` chunks of ``PARSE_CHUNK_SIZE`` bytes."""
+    for start in xrange(0, len(buf), PARSE_CHUNK_SIZE):
+        chunk = buf[start:start + PARSE_CHUNK_SIZE]
+        if isinstance(chunk, memoryview):
+            chunk = chunk.tobytes()
+        elif not isinstance(chunk, bytes):
+            chunk = bytes(chunk)
+        yield chunk
+
+
+def _serialization_options(pretty_print, encoding, kw):
+    u"""Returns the arguments of ``etree.tostring`` for ``Mappet.to_str`` options."""
+    if kw.get('without_comments') and not kw.get('method'):
+        kw = dict(kw, method='c14n', with_comments=False)
+        kw.pop('without_comments')
+    return dict(kw, pretty_print=pretty_print, encoding=encoding)
+
+
+def _iter_rechunked(parts, chunk_size):
+    u"""Yields strings joined and split into chunks of ``chunk_size``."""
+    buffered = []
+    size = 0
+
+    for part in parts:
+        buffered.append(part)
+        size += len(part)
+
+        if size >= chunk_size:
+            data = ''.join(buffered)
+            end = size - size % chunk_size
+            for start in xrange(0, end, chunk_size):
+                yield data[start:start + chunk_size]
+            buffered = [data[end:]]
+            size -= end
+
+    if size:
+        yield ''.join(buffered)
+
+
+#: Counts children of any element, including elements overriding ``len``.
+_element_len = helpers._element_len
+
+#: Options of ``etree.tostring`` with which the output can be split into parts.
+_PARTIAL_SERIALIZATION_OPTIONS = frozenset([
+    'encoding', 'xml_declaration', 'standalone', 'doctype', 'with_tail', 'pretty_print', 'method',
+])
+
+#: A processing instruction marking where the serialized parts are split.
+_MARKER = '<?mappet marker?>'
+
+
+def _serializes_in_parts(element, options):
+    u"""Checks if an element serialized with ``options`` can be split into parts.
+
+    Pretty printing, methods other than ``xml`` (including C14N) and namespace
+    declarations depend on the context of the serialized elements, so the
+    output of subtrees serialized separately may differ. The output is split
+    at a marker, so the encoding must be compatible with ASCII.
+    """
+    if options.get('pretty_print') or options.get('method', 'xml') != 'xml':
+        return False
+    if not _PARTIAL_SERIALIZATION_OPTIONS.issuperset(options):
+        return False
+
+    encoding = options.get('encoding')
+    if encoding is not None:
+        if not isinstance(encoding, str):
+            return False
+        try:
+            # E.g. UTF-16 and UTF-32 aren't.
+            if _MARKER.decode('ascii').encode(encoding) != _MARKER:
+                return False
+        except LookupError:
+            return False
+
+    if element.getparent() is not None and not _has_ascii_attributes(element):
+        # The serialized element itself has its attributes escaped differently.
+        return False
+    return not element.nsmap
+
+
+def _has_ascii_attributes(element):
+    u"""Checks if the values of the attributes of an element are ASCII (``str``)."""
+    return all(value.__class__ is str for value in element.attrib.itervalues())
+
+
+def _shell(element):
+    u"""Returns a copy of an element without namespaces, with a marker in place of its children.
+
+    The copy has no parent, so its attributes are serialized like the ones of
+    an element nested in the serialized tree.
+    """
+    shell = etree.Element(element.tag, OrderedDict(element.attrib))
+    shell.text = element.text
+    shell.append(etree.PI('mappet', 'marker'))
+    shell.tail = element.tail
+    return shell
+
+
+def _split_shell(serialized):
+    u"""Splits a serialized shell into the parts before and after its children."""
+    marker = serialized.index(_MARKER)
+    return serialized[:marker], serialized[marker + len(_MARKER):]
+
+
+def _serialize_nodes(nodes, options):
+    u"""Serializes children of an element, like ``tostring`` of the element does.
+
+    ``tostring`` puts non-ASCII characters of the attributes of the serialized
+    element itself as character references, unless it has no parent. Such
+    children are serialized from copies, which have no parent and keep the
+    namespace declarations of the children (there are none in their scope).
+    """
+    return ''.join(
+        etree.tostring(
+            deepcopy(node) if isinstance(node.tag, basestring) and not _has_ascii_attributes(node) else node,
+            **options
+        )
+        for node in nodes
+    )
+
+
+def _iter_serialized(element, chunk_size, options):
+    u"""Yields an element serialized in parts, like ``etree.tostring(element, **options)``.
+
+    Elements of more than ``chunk_size // 32`` nodes are serialized as their
+    start tag, their children and their end tag, smaller ones at once, in
+    batches of about as many nodes. Children are serialized as they are in the
+    tree; only the start and end tags of split elements, which must not have
+    namespaces, are serialized from copies without children, like children
+    with non-ASCII attributes serialized at once (see :func:`_serialize_nodes`).
+    If the output can't be split (see :func:`_serializes_in_parts`), the
+    element is serialized at once.
+    """
+    if not (_element_len(element) and _serializes_in_parts(element, options)):
+        yield etree.tostring(element, **options)
+        return
+
+    limit = max(chunk_size // 32, 1)
+    # The declaration, the doctype and ``with_tail`` only apply to the element itself.
+    nested = {'encoding': options.get('encoding'), 'xml_declaration': False}
+
+    head, end = _split_shell(etree.tostring(_shell(element), **options))
+    yield head
+
+    # Iterators over the children of the elements being serialized and the
+    # ends of these elements.
+    stack = [(iter(element), end)]
+
+    while stack:
+        children, end = stack[-1]
+        batch = []
+        size = 0
+
+        for child in children:
+            count = 1
+            if _element_len(child):
+                for count, _ in enumerate(islice(child.iter(), limit + 1), 1):
+                    pass
+
+            # Elements declaring namespaces are serialized at once, their
+            # declarations are kept by ``tostring`` only.
+            if count <= limit or child.nsmap:
+                batch.append(child)
+                size += count
+                if size >= limit:
+                    yield _serialize_nodes(batch, nested)
+                    batch = []
+                    size = 0
+                continue
+
+            if batch:
+                yield _serialize_nodes(batch, nested)
+
+            head, child_end = _split_shell(etree.tostring(_shell(child), **nested))
+            yield head
+            stack.append((iter(child), child_end))
+            break
+        else:
+            if batch:
+                yield _serialize_nodes(batch, nested)
+            yield end
+            stack.pop()
+
+
+class _ParsedElementsFilter(object):
+    u"""Base class for handlers of parser events removing parsed elements.
+
+    An element cannot be removed while its own ``end`` event is handled:
+    libxml2 may still append text (element's tail) to its last sibling.
+    Elements are thus removed on the next event, or after parsing is finished.
+    """
+
+    def __init__(self):
+        self._normalized_tags = {}
+        self._to_remove = None
+
+    def normalize_tag(self, tag):
+        u"""Normalizes a tag name, caching the result."""
+        try:
+            return self._normalized_tags[tag]
+        except KeyError:
+            normalized = self._normalized_tags[tag] = helpers.normalize_tag(tag)
+            return normalized
+
+    def remove_later(self, element):
+        u"""Removes the element of the current ``end`` event once it's safe."""
+        self.remove_pending()
+        self._to_remove = element
+
+    def remove_pending(self):
+        u"""Removes the element scheduled by ``remove_later``."""
+        element = self._to_remove
+        if element is not None:
+            self._to_remove = None
+            parent = element.getparent()
+            if parent is not None:
+                parent.remove(element)
+
+    #: Called after parsing is finished.
+    finish = remove_pending
+
+
+class _RecordFilter(_ParsedElementsFilter):
+    u"""Picks records out of parser's ``start`` and ``end`` events and drops parsed elements.
+
+    Once a record is found, everything parsed before it (its preceding siblings
+    and the preceding siblings of its ancestors) is removed. The record itself
+    is held until the next event, when it can be detached safely, and only
+    then yielded. The last record is yielded by ``finish``.
+    """
+
+    def __init__(self, tag):
+        super(_RecordFilter, self).__init__()
+        self.tag = helpers.normalize_tag(tag)
+
+    def process(self, events):
+        u"""Yields detached elements of ``(event, element)`` pairs matching the tag."""
+        for event, element in events:
+            for record in self.finish():
+                yield record
+
+            if event != 'end' or self.normalize_tag(element.tag) != self.tag:
+                continue
+
+            node = element
+            while node.getparent() is not None:
+                node_parent = node.getparent()
+                while node.getprevious() is not None:
+                    del node_parent[0]
+                node = node_parent
+
+            self.remove_later(element)
+
+    def finish(self):
+        u"""Detaches and yields the record held since the last event, if any."""
+        record = self._to_remove
+        if record is not None:
+            self.remove_pending()
+            yield record
+
+
+class _Selection(_ParsedElementsFilter):
+    u"""Drops elements outside of selected subtrees while a document is parsed.
+
+    Selected paths are kept in a trie of normalized tag names, where ``True``
+    marks a subtree kept as a whole:
+    {'head': True, 'status': {'result': True}}
+    """
+
+    def __init__(self, paths):
+        super(_Selection, self).__init__()
+        self.trie = {}
+        self._states = []
+
+        for path in paths:
+            names = str(path).split('.')
+            # Text and attributes are kept with their node.
+            if names[-1] == '#text' or names[-1].startswith('@'):
+                names = names[:-1]
+
+            node = self.trie
+            for position, name in enumerate(names, 1):
+                if re.match(r'^-?\d+$', name):
+                    raise ValueError('Indices are not supported in selected paths: {}'.format(path))
+                name = helpers.normalize_tag(name)
+                if position == len(names):
+                    node[name] = True
+                else:
+                    node = node.setdefault(name, {})
+                    if node is True:
+                        # An ancestor is already selected as a whole.
+                        break
+
+    def process(self, events):
+        u"""Handles ``start`` and ``end`` parser events.
+
+        Every element gets the state of its trie node: a dict for ancestors of
+        selected subtrees, ``True`` inside them and ``None`` elsewhere. Elements
+        with ``None`` state are removed once they are parsed.
+        """
+        states = self._states
+        for event, element in events:
+            self.remove_pending()
+
+            if event == 'start':
+                if not states:
+                    states.append(self.trie)
+                    continue
+
+                state = states[-1]
+                if isinstance(state, dict):
+                    state = state.get(self.normalize_tag(element.tag))
+                states.append(state)
+            elif states.pop() is None:
+                self.remove_later(element)
+
+
+def _parse_document(mappet_class, parser_config, transform, source):
+    u"""Parses a single document of :meth:`Mappet.parse_many`."""
+    result = mappet_class.from_bytes(source, parser_config)
+    return transform(result) if transform else result
+
+
+def _iter_pool_results(pool_class, workers, fn, iterable, chunksize, ordered):
+    u"""Yields results of ``fn`` mapped over ``iterable`` by a pool, then closes it.
+
+    The pool is created on the first ``next`` call, so an iterator that is
+    never consumed leaves no workers behind.
+    """
+    pool = pool_class(workers)
+    imap = pool.imap if ordered else pool.imap_unordered
+    try:
+        for result in imap(fn, iterable, chunksize):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,455 @@
+# -*- coding: utf-8 -*-
+
+u"""Parsed elements exposing the mappet API, without wrapper objects.
+
+.. :module: native
+   :synopsis: Parsed elements exposing the mappet API, without wrapper objects.
+
+Documents parsed with :data:`NATIVE_PARSER` are built of :class:`MappetElement`
+instances, which are ``lxml`` elements themselves, so traversing them does not
+allocate a mappet object for every accessed node.
+
+>>> m = fromstring('<root><Car><HP>256</HP></Car></root>')
+>>> m.car.hp.to_int()
+256
+"""
+from itertools import chain
+
+from lxml import etree
+
+import caching
+import helpers
+import parsing
+from mappet import (
+    NONE_NODE,
+    XPATH_CACHE,
+    CompiledPath,
+    Mappet,
+    _class_members,
+    _compile_xpath,
+    _RecordFilter,
+    _step,
+    _xpath_key,
+    _xpath_options,
+)
+
+__all__ = [
+    'MappetElement',
+    'NATIVE_PARSER',
+    'fromstring',
+    'iter_records',
+    'parse',
+]
+
+#: The plain ``lxml`` element class, whose methods are overridden by :class:`MappetElement`.
+_Element = etree._Element
+
+#: Names of the converters available for leaves.
+_CONVERTERS = frozenset(name for name in dir(helpers) if name.startswith('to_'))
+
+#: Maximum number of tag names kept normalized.
+TAG_CACHE_SIZE = 1024
+
+#: Normalized tag names of the children looked up by name.
+TAG_CACHE = caching.LRUCache(TAG_CACHE_SIZE)
+
+
+def _normalize_tag(tag):
+    u"""Normalizes a tag name, caching the result."""
+    return TAG_CACHE.get(tag, helpers.normalize_tag)
+
+
+class MappetElement(etree.ElementBase):
+    u"""An element with the API of :class:`mappet.Mappet` and :class:`mappet.Literal`.
+
+    An element with children behaves like a mappet object, a leaf like a
+    literal, with the exception of the names ``lxml`` elements already use.
+    The ``lxml`` API is kept intact, so the elements can be passed to any
+    code expecting plain ones: ``set`` and ``keys`` handle attributes and
+    ``xpath`` returns lists; the mappet methods are named ``assign``,
+    ``child_keys`` and ``xpath_one`` instead. ``get`` returns the value of a
+    leaf only when no attribute name is given, like ``get_value``.
+
+    Names of ``lxml`` methods and properties (``text``, ``tail``, ``items``,
+    ``index``...) take precedence over children with the same names, which
+    are accessible by dict access.
+    """
+
+    def __repr__(self):
+        u"""Represents the node like :class:`mappet.Node`, or a leaf as its textual value."""
+        if not _Element.__len__(self):
+            return str(self)
+
+        return '<{tagname}{attributes}{closing_paren}> ({children})'.format(
+            tagname=self.tag,
+            attributes=''.join(
+                [' {}="{}"'.format(attr, value) for attr, value in self.attrib.items()]
+            ),
+            closing_paren='',
+            children=_Element.__len__(self),
+        )
+
+    def __str__(self):
+        u"""Represents a leaf as a str."""
+        if _Element.__len__(self):
+            return repr(self)
+        return str(self.get_value())
+
+    #: Represents the leaf as unicode.
+    __unicode__ = __str__
+
+    def __int__(self):
+        u"""Represents the literal as an int."""
+        return helpers.to_int(self.text)
+
+    def __float__(self):
+        u"""Represents the literal as an float."""
+        return helpers.to_float(self.text)
+
+    def __eq__(self, other):
+        u"""Compares nodes like mappet objects, leaves by identity."""
+        if not etree.iselement(other):
+            return NotImplemented
+        if _Element.__len__(self):
+            return etree.tostring(self) == etree.tostring(other)
+        return self is other
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return id(self)
+
+    def __add__(self, other):
+        u"""String concatenation."""
+        return self.to_str() + str(other)
+
+    def __radd__(self, other):
+        u"""Reverse string concatenation."""
+        return str(other) + self.to_str()
+
+    def __dir__(self):
+        u"""Returns a list of children and available helper methods."""
+        if _Element.__len__(self):
+            return sorted(self.child_keys() | {m for m in dir(self.__class__) if m.startswith('to_')})
+        return sorted(_CONVERTERS)
+
+    def __getattr__(self, name):
+        u"""Attribute access.
+
+        Returns a list of children, if there is more than 1, or a child, if
+        there is exactly 1. For a leaf, returns a function converting its value.
+        """
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        if not _Element.__len__(self):
+            if name in _CONVERTERS:
+                fn = getattr(helpers, name)
+                return lambda: fn(self.text)
+            raise AttributeError(name)
+
+        children = self.children(name)
+
+        if len(children) > 1:
+            return children
+        elif len(children) == 1:
+            return children[0]
+
+    def __setattr__(self, name, value):
+        u"""Node attribute assignment.
+
+        Calls ``assign`` for names that aren't a part of the class definition.
+        """
+        if name not in _class_members(self.__class__):
+            return self.assign(name, value)
+
+        return super(MappetElement, self).__setattr__(name, value)
+
+    def __delattr__(self, key):
+        u"""Node removal."""
+        del self[self._find_tag(key) or key]
+
+    def __getitem__(self, key):
+        u"""Dictionary access.
+
+        Integer indices and slices are handled by the ``lxml`` element.
+        """
+        if not isinstance(key, basestring):
+            return _Element.__getitem__(self, key)
+
+        if self.is_key_attr_or_text(key):
+            return self.getattr(key[1:])
+
+        if not _Element.__len__(self):
+            raise KeyError(key)
+
+        children = self.children(key)
+
+        if len(children) == 1:
+            children = children[0]
+            if not _Element.__len__(children):
+                return children.get_value()
+
+        return children
+
+    def __setitem__(self, key, value):
+        u"""Attribute assignment by dict access (``@attr`` or ``#text``).
+
+        Other keys (indices and slices) are handled by the ``lxml`` element.
+        """
+        if self.is_key_attr_or_text(key):
+            return self.setattr(key[1:], value)
+        return _Element.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        u"""Removes all children with a given key."""
+        if not isinstance(key, basestring):
+            return _Element.__delitem__(self, key)
+
+        if key not in _class_members(self.__class__):
+            for child in list(_Element.iterchildren(self, tag=key)):
+                self.remove(child)
+
+    def __contains__(self, path):
+        u"""Checks if the node contains a given path (or a given element)."""
+        if etree.iselement(path):
+            return _Element.__contains__(self, path)
+
+        elem = self.sget(path)
+        return not (elem is None or elem is NONE_NODE)
+
+    def __reduce__(self):
+        u"""Pickles the element as a string."""
+        return fromstring, (etree.tostring(self, with_tail=False),)
+
+    @staticmethod
+    def is_key_attr_or_text(key):
+        return isinstance(key, basestring) and key.startswith(('@', '#'))
+
+    def get(self, key=None, default=None, callback=None):
+        u"""Returns an attribute, like ``lxml`` does, or leaf's value if no ``key`` is given.
+
+        Unlike :meth:`mappet.Literal.get`, the default value has to be passed
+        as a keyword argument.
+        """
+        if key is None:
+            return self.get_value(default, callback)
+        return _Element.get(self, key, default)
+
+    def get_value(self, default=None, callback=None):
+        u"""Returns leaf's value, like :meth:`mappet.Literal.get`."""
+        value = self.text if self.text else default
+        return callback(value) if callback else value
+
+    def getattr(self, key, default=None, callback=None):
+        u"""Getting the attribute of an element."""
+        value = self.text if key == 'text' else _Element.get(self, key, default)
+        return callback(value) if callback else value
+
+    def setattr(self, key, value):
+        u"""Sets an attribute on a node."""
+        if key == 'text':
+            self.text = str(value)
+        else:
+            _Element.set(self, key, str(value))
+
+    def has_children(self):
+        u"""Returns true if a node has children."""
+        return bool(_Element.__len__(self))
+
+    def iter_children(self, key=None):
+        u"""Iterates over children.
+
+        :param key: A key for filtering children by tagname.
+        """
+        tag = None
+
+        if key:
+            tag = self._find_tag(key)
+
+            if not tag:
+                raise KeyError(key)
+
+        return _Element.iterchildren(self, tag=tag)
+
+    def children(self, key=None):
+        u"""Returns node's children.
+
+        :param key: A key for filtering children by tagname.
+        """
+        return list(self.iter_children(key))
+
+    def child_keys(self):
+        u"""Returns a set of node's keys, like :meth:`mappet.Mappet.keys`."""
+        return {_normalize_tag(child.tag) for child in _Element.iterchildren(self, tag=etree.Element)}
+
+    def to_str(self, pretty_print=False, encoding=None, **kw):
+        u"""Converts a node with all of it's children to a string.
+
+        A leaf called without arguments returns its text, like a literal.
+        """
+        if not (_Element.__len__(self) or pretty_print or encoding or kw):
+            return helpers.to_str(self.text)
+
+        if kw.get('without_comments') and not kw.get('method'):
+            kw.pop('without_comments')
+            kw['method'] = 'c14n'
+            kw['with_comments'] = False
+        return etree.tostring(self, pretty_print=pretty_print, encoding=encoding, **kw)
+
+    def to_dict(self, **kw):
+        u"""Converts the element to a dict.
+
+        possible kwargs:
+            without_comments: bool
+        """
+        _, value = helpers.etree_to_dict(self, **kw).popitem()
+        return value
+
+    def to_json(self, fp=None, **kw):
+        u"""Converts the element to JSON, see :meth:`mappet.Mappet.to_json`."""
+        if fp is not None:
+            helpers.etree_to_json(self, fp.write, **kw)
+            return
+
+        parts = []
+        helpers.etree_to_json(self, parts.append, **kw)
+        return ''.join(parts)
+
+    def sget(self, path, default=NONE_NODE):
+        u"""Enables access to nodes if one or more of them don't exist, see :meth:`mappet.Mappet.sget`.
+
+        The path is walked like compiled paths of mappet objects are, paths
+        using names of class members are resolved with attribute access.
+        """
+        if not isinstance(path, CompiledPath):
+            path = Mappet.compile_path(path)
+        if not path.compiles_for(self):
+            return path.resolve_attributes(self, default)
+
+        element = self
+        matches = None
+        for segment in path.segments:
+            step = _step(_ChildFinder, element, matches, segment)
+            if step is None:
+                return path.default(default)
+            element, matches = step
+
+        if path.text_or_attr:
+            if matches is not None:
+                return None
+            return element.getattr(path.text_or_attr)
+        if matches is not None:
+            return list(_Element.iterchildren(element, tag=matches))
+        return element
+
+    def update(self, **kwargs):
+        u"""Updating or creation of new simple nodes.
+
+        Each dict key is used as a tagname and value as text.
+        """
+        for key, value in kwargs.items():
+            helper = helpers.CAST_DICT.get(type(value), str)
+            tag = self._find_tag(key) or key
+
+            elements = list(_Element.iterchildren(self, tag=tag))
+            if elements:
+                for element in elements:
+                    element.text = helper(value)
+            else:
+                etree.SubElement(self, key).text = helper(value)
+
+    def create(self, tag, value):
+        u"""Creates a node, if it doesn't exist yet."""
+        if any(True for _ in _Element.iterchildren(self, tag=tag)):
+            raise KeyError('Node {} already exists in XML tree.'.format(tag))
+
+        self.assign(tag, value)
+
+    def assign(self, name, value):
+        u"""Assigns a new XML structure to the node.
+
+        A literal value, dict or list can be passed in, like to :meth:`mappet.Mappet.set`.
+        """
+        try:
+            element = next(_Element.iterchildren(self, tag=name))
+        except StopIteration:
+            element = etree.SubElement(self, name)
+
+        if isinstance(value, dict):
+            self.replace(element, helpers.build_etree(value, etree.Element(element.tag)))
+        elif isinstance(value, (list, tuple, set)):
+            Mappet.assign_sequence_or_set(element, value)
+        else:
+            Mappet.assign_literal(element, value)
+
+    def xpath_one(self, path, namespaces=None, regexp=False, smart_strings=True, single_use=False):
+        u"""Executes XPath query, unpacking a single result like :meth:`mappet.Mappet.xpath`."""
+        if single_use:
+            node = _Element.xpath(
+                self,
+                path,
+                namespaces=_xpath_options(namespaces, regexp),
+                regexp=regexp,
+                smart_strings=smart_strings,
+            )
+        else:
+            key = _xpath_key(path, namespaces, regexp, smart_strings)
+            node = XPATH_CACHE.get(key, _compile_xpath)(self)
+
+        if isinstance(node, list) and len(node) == 1:
+            return node[0]
+        return node
+
+    def _find_tag(self, key):
+        u"""Returns the tagname of children matching a (normalized) key."""
+        for child in _Element.iterchildren(self, tag=key):
+            return key
+
+        for child in _Element.iterchildren(self, tag=etree.Element):
+            if _normalize_tag(child.tag) == key:
+                return child.tag
+
+
+class _ChildFinder(object):
+    u"""Finds children of native elements for ``mappet._step``, in place of the index of a tree."""
+
+    @staticmethod
+    def find(element, name):
+        u"""Returns the tagname of children matching a (normalized) name and the first of them."""
+        tag = MappetElement._find_tag(element, name)
+        if tag is None:
+            return None, None
+        return tag, next(_Element.iterchildren(element, tag=tag))
+
+
+#: Parser options building documents of :class:`MappetElement` instances.
+NATIVE_PARSER = parsing.ParserConfig(element_class=MappetElement)
+
+
+def fromstring(xml, parser_config=NATIVE_PARSER):
+    u"""Parses a string into a :class:`MappetElement`.
+
+    :param parsing.ParserConfig parser_config: parser options, including
+        ``element_class`` (e.g. ``FAST_PARSER.updated(element_class=MappetElement)``)
+    """
+    return etree.fromstring(xml, parser_config.parser())
+
+
+def parse(source, parser_config=NATIVE_PARSER):
+    u"""Parses a filename or a file object into a :class:`MappetElement`."""
+    return etree.parse(source, parser_config.parser()).getroot()
+
+
+def iter_records(source, tag, parser_config=NATIVE_PARSER):
+    u"""Iterates over records of an XML document, see :meth:`mappet.Mappet.iter_records`.
+
+    Records are yielded as :class:`MappetElement` instances.
+    """
+    records = _RecordFilter(tag)
+    events = parser_config.iterparse(source, events=('start', 'end'))
+
+    for element in chain(records.process(events), records.finish()):
+        yield element
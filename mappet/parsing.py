@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+u"""Configuration of XML parsers.
+
+.. :module: parsing
+   :synopsis: Configuration of XML parsers.
+"""
+import threading
+from functools import partial
+
+from lxml import etree
+
+__all__ = [
+    'ParserConfig',
+    'DEFAULT_PARSER',
+    'FAST_PARSER',
+]
+
+
+class ParserConfig(object):
+    u"""Options of the parser used to build mappet objects.
+
+    Accepts the same keyword arguments as ``etree.XMLParser``. Parsers are
+    created lazily and reused, one per thread, since ``lxml`` parsers cannot
+    be shared between threads.
+
+    An additional ``element_class`` option sets the class of parsed elements
+    (a subclass of ``etree.ElementBase``), see :mod:`mappet.native`.
+
+    >>> config = ParserConfig(remove_blank_text=True)
+    >>> config.parser() is config.parser()
+    True
+    """
+
+    def __init__(self, **options):
+        self.options = options
+        self._local = threading.local()
+
+    def __repr__(self):
+        return 'ParserConfig({})'.format(', '.join(
+            '{}={!r}'.format(key, value) for key, value in sorted(self.options.items())
+        ))
+
+    def __getstate__(self):
+        u"""Parsers cannot be pickled, only the options are kept."""
+        return self.options
+
+    def __setstate__(self, options):
+        self.__init__(**options)
+
+    def updated(self, **options):
+        u"""Returns a new configuration with given options changed.
+
+        >>> ParserConfig(huge_tree=True).updated(remove_comments=True)
+        ParserConfig(huge_tree=True, remove_comments=True)
+        """
+        return self.__class__(**dict(self.options, **options))
+
+    def parser(self):
+        u"""Returns the ``etree.XMLParser`` instance of the current thread."""
+        try:
+            return self._local.parser
+        except AttributeError:
+            self._local.parser = self._create(etree.XMLParser)
+            return self._local.parser
+
+    def iterparse(self, source, **kw):
+        u"""Creates an ``etree.iterparse`` iterator using configured options.
+
+        Remaining arguments are passed to ``etree.iterparse`` as is.
+        """
+        return self._create(partial(etree.iterparse, source), **kw)
+
+    def pull_parser(self, **kw):
+        u"""Creates an ``etree.XMLPullParser`` using configured options.
+
+        Remaining arguments are passed to ``etree.XMLPullParser`` as is.
+        """
+        return self._create(etree.XMLPullParser, **kw)
+
+    def _create(self, factory, **kw):
+        u"""Calls a parser factory with the options, setting the element class."""
+        options = dict(self.options, **kw)
+        element_class = options.pop('element_class', None)
+        parser = factory(**options)
+        if element_class is not None:
+            parser.set_element_class_lookup(etree.ElementDefaultClassLookup(element=element_class))
+        return parser
+
+
+#: Default ``lxml`` parser options.
+DEFAULT_PARSER = ParserConfig()
+
+#: Options reducing the node count and the parsing time of data documents.
+#: Drops whitespace-only text and comments, skips ID collection and does not
+#: resolve entities.
+FAST_PARSER = ParserConfig(
+    remove_blank_text=True,
+    remove_comments=True,
+    collect_ids=False,
+    resolve_entities=False,
+)
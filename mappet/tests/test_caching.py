@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+u"""Unittests for caches of compiled objects.
+
+.. :module: test_caching
+   :synopsis: Unittests for caches of compiled objects.
+"""
+import threading
+
+from mappet import caching
+
+
+class TestLRUCache(object):
+    u"""Unittests for the LRU cache."""
+
+    def test_get__should_create_missing_values_once(self):
+        cache = caching.LRUCache(maxsize=4)
+        created = []
+
+        def factory(key):
+            created.append(key)
+            return key * 2
+
+        assert [cache.get(key, factory) for key in 'abab'] == ['aa', 'bb', 'aa', 'bb']
+        assert created == ['a', 'b']
+        assert cache.info() == caching.CacheInfo(hits=2, misses=2, maxsize=4, currsize=2)
+
+    def test_get__should_drop_least_recently_used_values(self):
+        cache = caching.LRUCache(maxsize=2)
+        cache.get('a', str.upper)
+        cache.get('b', str.upper)
+        cache.get('a', str.upper)
+        cache.get('c', str.upper)
+
+        assert 'a' in cache
+        assert 'b' not in cache
+        assert len(cache) == 2
+
+    def test_clear(self):
+        cache = caching.LRUCache()
+        cache.get('a', str.upper)
+        cache.clear()
+
+        assert len(cache) == 0
+        assert cache.info() == (0, 0, 1024, 0)
+
+    def test_get__should_be_thread_safe(self):
+        cache = caching.LRUCache(maxsize=8)
+
+        def work():
+            for i in xrange(1000):
+                assert cache.get(i % 16, str) == str(i % 16)
+
+        threads = [threading.Thread(target=work) for _ in xrange(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        info = cache.info()
+        assert info.hits + info.misses == 4000
+        assert info.currsize == 8
@@ -5,11 +5,16 @@ u"""Unittests for helper functions.
 .. :module: test_helpers
    :synopsis: Unittests for helper functions.
 """
+from collections import OrderedDict
 from decimal import Decimal
 
 from lxml import etree
 import datetime
+import json
+import random
+import time
 
+import dateutil.parser
 import mock
 import pytest
 
@@ -273,6 +278,42 @@ class TestTreeHelpers(object):
             'root': {}
         }
 
+    def test_etree_to_dict__should_gather_comments_and_repeated_children(self):
+        root = etree.fromstring(
+            '<root><!-- c1 --><a>1</a><!-- c2 --><a x="2"> t </a><!----><!--   -->'
+            '<b><c/><c>x</c><!-- n --></b><?pi a="1"?><d>  </d></root>'
+        )
+        assert helpers.etree_to_dict(root) == {
+            'root': {
+                '#comments': ['c1', 'c2'],
+                'a': ['1', {'@x': '2', '#text': 't'}],
+                'b': {'#comments': 'n', 'c': [None, 'x']},
+                etree.PI: {'@a': '1', '#text': 'a="1"'},
+                'd': None,
+            }
+        }
+        assert helpers.etree_to_dict(root, without_comments=True)['root']['b'] == {'c': [None, 'x']}
+        assert helpers.etree_to_dict(root, trim=False)['root']['#comments'] == [' c1 ', ' c2 ', '   ']
+        assert helpers.etree_to_dict(root[0]) == {etree.Comment: None, '#comments': 'c1'}
+
+    def test_etree_to_dict__should_not_change_the_tree(self):
+        xml = '<root a="1"> text <child> child text </child><!-- comment --></root>'
+        root = etree.fromstring(xml)
+
+        assert helpers.etree_to_dict(root) == {'root': {'@a': '1', '#text': 'text', 'child': 'child text', '#comments': 'comment'}}
+        assert etree.tostring(root) == xml
+
+    def test_etree_to_dict__should_convert_deep_trees(self):
+        root = element = etree.Element('root')
+        for _ in range(5000):
+            element = etree.SubElement(element, 'level')
+        element.text = 'bottom'
+
+        value = helpers.etree_to_dict(root)['root']
+        for _ in range(4999):
+            value = value['level']
+        assert value == {'level': 'bottom'}
+
     def test__dict_to_etree__given_node_with_whitespace__should_preserve_it(self):
         tag = etree.Element('root')
         tag.text = ' '
@@ -415,3 +456,166 @@ class TestTreeHelpers(object):
         etree_from_dict = helpers.dict_to_etree(xml_dict, self.root)
         assert etree.iselement(etree_from_dict)
         assert etree.tostring(etree_from_dict) == '<root><node1/><node1/><node1>text_node</node1></root>'
+
+    @staticmethod
+    def random_dict(rnd, depth=0):
+        u"""Generates a dict like the ones converted by ``dict_to_etree``."""
+        value = {}
+        for num in range(rnd.randint(0, 4)):
+            choice = rnd.random()
+            key = 'node{}'.format(rnd.randint(0, 3))
+            if choice < 0.15:
+                value['@attr{}'.format(num)] = rnd.choice(['', 'val', u'zażółć'])
+            elif choice < 0.25:
+                value['#text'] = rnd.choice(['', ' ', 'text'])
+            elif choice < 0.5 and depth < 4:
+                value[key] = [
+                    rnd.choice([None, '', 'text', {'empty': None}, {'@a': ''}])
+                    if rnd.random() < 0.4 else TestTreeHelpers.random_dict(rnd, depth + 1)
+                    for _ in range(rnd.randint(0, 4))
+                ]
+            elif choice < 0.75 and depth < 4:
+                value[key] = TestTreeHelpers.random_dict(rnd, depth + 1)
+            else:
+                value[key] = rnd.choice([None, '', 'text', u'zażółć'])
+        return value
+
+    def test_build_etree__should_give_the_same_result_as_dict_to_etree(self):
+        rnd = random.Random(20)
+
+        for _ in range(500):
+            value = self.random_dict(rnd)
+            expected = helpers.dict_to_etree(value, etree.Element('root'))
+            assert etree.tostring(helpers.build_etree(value, etree.Element('root'))) == etree.tostring(expected)
+
+    def test_build_etree__given_tuples_and_generators__should_treat_them_like_lists(self):
+        value = {'a': ['x', None, {'b': 'y'}, {'c': None}], '@attr': 'val'}
+        expected = etree.tostring(helpers.dict_to_etree(value, etree.Element('root')))
+
+        value['a'] = tuple(value['a'])
+        assert etree.tostring(helpers.build_etree(value, etree.Element('root'))) == expected
+
+        value['a'] = (child for child in value['a'])
+        assert etree.tostring(helpers.build_etree(value, etree.Element('root'))) == expected
+
+    def test_build_etree__given_invalid_values__should_raise(self):
+        with pytest.raises(AttributeError):
+            helpers.build_etree(['node'], self.root)
+        with pytest.raises(ValueError):
+            helpers.build_etree({'#comments': 'text'}, self.root)
+        with pytest.raises(ValueError):
+            helpers.build_etree({'@attr': 1}, self.root)
+
+    def test_json_to_etree__should_give_the_same_result_as_build_etree(self):
+        rnd = random.Random(23)
+
+        for _ in range(500):
+            value = {'top': self.random_dict(rnd)}
+            body = json.dumps(value)
+            expected = helpers.build_etree(json.loads(body, object_pairs_hook=OrderedDict)['top'], etree.Element('top'))
+            assert etree.tostring(helpers.json_to_etree(body)) == etree.tostring(expected)
+
+    def test_etree_to_json__should_give_the_same_result_as_etree_to_dict(self):
+        rnd = random.Random(23)
+
+        for _ in range(200):
+            root = helpers.build_etree(self.random_dict(rnd), etree.Element('root'))
+            parts = []
+            helpers.etree_to_json(root, parts.append)
+            assert json.loads(''.join(parts)) == helpers.etree_to_dict(root)['root']
+
+    def test_build_etree__should_convert_deep_dicts(self):
+        value = bottom = {}
+        for _ in range(5000):
+            bottom['level'] = bottom = {}
+        bottom['#text'] = 'bottom'
+
+        root = helpers.build_etree(value, self.root)
+        assert len(list(root.iter('level'))) == 5000
+        assert root.findtext('level' + '/level' * 4999) == 'bottom'
+
+
+ISO_DATETIMES = [
+    '2015-07-13T10:56:05.597420+02:00',
+    '2015-07-13T10:56:05.5974209-05:30',
+    '2015-07-13T10:56:05,5+0130',
+    '2015-07-13T10:56:05.1+02',
+    '2015-07-13T10:56:05+14:00',
+    '2015-07-13T10:56:05Z',
+    '2015-07-13T10:56:05+00:00',
+    '2015-07-13T10:56:05-00:00',
+    '2015-07-13 10:56',
+    '2015-07-13',
+    '2016-02-29T23:59:59.999999',
+]
+
+NON_ISO_DATETIMES = [
+    '13 Jul 2015 10:56',
+    '2015-07-13T10',
+    '2015-07-13T10:56:05 UTC',
+    '20150713T105605',
+    ' 2015-07-13 ',
+]
+
+
+class TestIsoParsing(object):
+    u"""Tests for parsing of ISO 8601 dates and times without ``dateutil``."""
+
+    @pytest.fixture(params=[('UTC', 'UTC'), ('CET', 'CEST')])
+    def tzname(self, request, monkeypatch):
+        monkeypatch.setattr(time, 'tzname', request.param)
+        return request.param
+
+    @pytest.mark.parametrize('value', ISO_DATETIMES + NON_ISO_DATETIMES)
+    def test_parse_datetime__should_match_dateutil(self, value, tzname):
+        expected = dateutil.parser.parse(value)
+        parsed = helpers.parse_datetime(value)
+
+        assert parsed == expected
+        assert repr(parsed) == repr(expected)
+
+    @pytest.mark.parametrize('value', ISO_DATETIMES)
+    def test_parse_datetime__should_not_use_dateutil_for_iso_values(self, value, monkeypatch):
+        monkeypatch.setattr(time, 'tzname', ('CET', 'CEST'))
+        monkeypatch.setattr(dateutil.parser, 'parse', None)
+
+        assert isinstance(helpers.to_datetime(value), datetime.datetime)
+
+    @pytest.mark.parametrize('value', ['2015-02-30', '0099-01-01', '2015-07-13T24:00:00'])
+    def test_parse_datetime__should_leave_invalid_values_to_dateutil(self, value):
+        try:
+            expected = dateutil.parser.parse(value)
+        except ValueError as error:
+            with pytest.raises(ValueError) as execinfo:
+                helpers.parse_datetime(value)
+            assert str(execinfo.value) == str(error)
+        else:
+            assert helpers.parse_datetime(value) == expected
+
+    @pytest.mark.parametrize('value,expected', [
+        ('10:56:05.597420+02:00', datetime.time(10, 56, 5, 597420)),
+        ('10:56:05Z', datetime.time(10, 56, 5)),
+        ('10:56', datetime.time(10, 56)),
+        ('10', datetime.time(10)),
+        ('10L', datetime.time(10)),
+        (u'10:56:05,5', datetime.time(10, 56, 5, 500000)),
+    ])
+    def test_to_time(self, value, expected):
+        assert helpers.to_time(value) == expected
+
+    def test_to_time__should_leave_invalid_values_to_dateutil(self):
+        with pytest.raises(ValueError):
+            helpers.to_time('25:00')
+
+    def test_cache_dates(self, monkeypatch):
+        monkeypatch.setattr(helpers, 'DATE_CACHE', None)
+        helpers.cache_dates(maxsize=2)
+
+        first = helpers.to_datetime('2015-07-13T10:56:05.597420+02:00')
+        assert helpers.to_datetime('2015-07-13T10:56:05.597420+02:00') is first
+        assert helpers.to_time('10:56') == datetime.time(10, 56)
+        assert helpers.DATE_CACHE.info() == (1, 2, 2, 2)
+
+        helpers.cache_dates(maxsize=0)
+        assert helpers.DATE_CACHE is None
+        assert helpers.to_datetime('2015-07-13T10:56:05.597420+02:00') is not first
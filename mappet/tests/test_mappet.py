@@ -7,13 +7,25 @@ u"""Unittests for the Mappet module.
 .. :module: test_mappet
    :synopsis: Unittests for the Mappet module.
 """
+import array
+from collections import OrderedDict, Sequence
 from decimal import Decimal
+import datetime
+import gzip
+from io import BytesIO
+import json
+import os
+import random
+import subprocess
+import sys
 
 from lxml import etree
 import pytest
 
 from mappet import mappet
 
+EXAMPLE_XML = os.path.join(os.path.dirname(mappet.__file__), 'example.xml')
+
 
 class TestNode(object):
     u"""Unittests for the class representing base node."""
@@ -382,7 +394,7 @@ class TestMappet(object):
     def test__dir__(self):
         u"""Tests for returning a list of node's children."""
         # dir() should return names of all the children as well as helper methods.
-        assert set(dir(self.m)) == {'node1', 'node2', 'node3', 'node_list'} | {'to_str', 'to_dict'}
+        assert set(dir(self.m)) == {'node1', 'node2', 'node3', 'node_list'} | {'to_str', 'to_dict', 'to_json'}
 
     def test__getattr__(self):
         u"""Tests for returning node's children."""
@@ -410,6 +422,27 @@ class TestMappet(object):
         self.m._xml = 'my_xml'
         assert self.m._xml == 'my_xml'
 
+    def test_slots__should_not_create_instance_dicts(self):
+        u"""Mappet objects and literals keep their state in slots."""
+        assert not hasattr(self.m, '__dict__')
+        assert not hasattr(self.m.node1.subnode2, '__dict__')
+        assert not hasattr(mappet.LazyMappet('<root/>'), '__dict__')
+        assert not hasattr(mappet.Node(self.xml), '__dict__')
+
+    def test_setattr__should_check_class_members_once(self):
+        u"""Members of a class are collected once and cover slots and subclasses."""
+        members = mappet._class_members(mappet.Mappet)
+
+        assert members is mappet._class_members(mappet.Mappet)
+        assert {'_xml', '_aliases', '_index', 'set'} <= members
+        assert '_raw' in mappet._class_members(mappet.LazyMappet)
+
+        # Slots are assigned directly, other names create nodes.
+        self.m._index = None
+        self.m.set_ = 'x'
+        assert self.m.set_.get() == 'x'
+        assert '_index' not in self.m.keys()
+
     def test__delattr__(self):
         u"""Tests for attribute removal."""
         assert len(self.m.node1) == 3
@@ -423,7 +456,7 @@ class TestMappet(object):
         #  if we access a single leaf, its value should be returned.
         assert self.m.node1['subnode2'] == 'subnode2_text'
         # For many leafs, the result should be them all.
-        assert isinstance(self.m.node1['subnode1'], list)
+        assert isinstance(self.m.node1['subnode1'], Sequence)
         assert set(self.m.node1['subnode1']) == {self.m.node1.subnode1[0], self.m.node1.subnode1[1]}
 
     def test__delitem__(self):
@@ -900,3 +933,1306 @@ class TestMappet(object):
 
     def test_keys(self):
         assert self.m.keys() == {'node1', 'node2', 'node3', 'node_list'}
+
+
+class TestMappetIterRecords(object):
+    u"""Tests for streaming records out of XML documents."""
+
+    xml = (
+        '<a-message>'
+        '<head><id>1</id></head>'
+        '<reply><cars>'
+        '<Car-Model><id>1</id><name>X6</name></Car-Model>'
+        '<Car-Model><id>2</id><name>X1</name></Car-Model>'
+        '<Car-Model/>'
+        '</cars></reply>'
+        '</a-message>'
+    )
+
+    def test_iter_records__given_normalized_tag__should_yield_matching_records(self):
+        records = list(mappet.Mappet.iter_records(BytesIO(self.xml), 'car_model'))
+
+        assert len(records) == 3
+        assert [record.sget('id.#text') for record in records[:2]] == ['1', '2']
+        # A record without children is a leaf.
+        assert isinstance(records[2], mappet.Literal)
+
+    def test_iter_records__should_detach_records_and_drop_preceding_elements(self):
+        records = mappet.Mappet.iter_records(BytesIO(self.xml), 'Car-Model')
+
+        first = next(records)
+        assert first._xml.getparent() is None
+        second = next(records)
+        # Records are detached before they are yielded, so they don't see
+        # the rest of the document.
+        assert second._xml.getparent() is None
+        assert second._xml.xpath('ancestor::*') == []
+        assert first.name.get() == 'X6'
+        assert second.name.get() == 'X1'
+
+    def test_iter_records__when_abandoned__should_leave_no_record_in_document(self, monkeypatch):
+        elements = []
+        process = mappet._RecordFilter.process
+        monkeypatch.setattr(mappet._RecordFilter, 'process', lambda self, events: process(self, (
+            elements.append(element) or (event, element) for event, element in events
+        )))
+
+        record = next(mappet.Mappet.iter_records(BytesIO(self.xml), 'Car-Model'))
+        document = elements[0].getroottree().getroot()
+
+        assert record._xml.getparent() is None
+        # Neither the record nor anything parsed before it is left.
+        assert document.find('head') is None
+        assert [car.findtext('id') for car in document.iter('Car-Model')] == ['2', None]
+
+    def test_iter_records__given_whitespace_between_records__should_drop_them_safely(self, monkeypatch):
+        xml = '<root>\n  text\n  ' + '<Car><id>1</id></Car>\n  tail text\n  ' * 200 + '</root>'
+        for size in (7, 16, 64):
+            monkeypatch.setattr(mappet, 'PARSE_CHUNK_SIZE', size)
+            parser = mappet.Mappet.feed_parser(tag='car')
+            records = []
+            for chunk in mappet._iter_chunks(xml):
+                records.extend(parser.feed(chunk))
+
+            assert len(records) == 200
+            assert all(record._xml.getparent() is None for record in records)
+            assert parser.close().to_str() == '<root>\n  text\n  </root>'
+
+    def test_iter_records__given_filename__should_parse_the_file(self):
+        records = list(mappet.Mappet.iter_records(EXAMPLE_XML, 'Car'))
+
+        assert [record.hp.to_int() for record in records] == [256, 198]
+
+    def test_iter_records__given_missing_tag__should_yield_nothing(self):
+        assert list(mappet.Mappet.iter_records(BytesIO(self.xml), 'truck')) == []
+
+
+class TestMappetIterDicts(object):
+    u"""Tests for converting records to dicts one at a time."""
+
+    xml = TestMappetIterRecords.xml
+
+    def test_iter_dicts__should_match_to_dict(self):
+        m = mappet.Mappet.from_file(EXAMPLE_XML)
+        expected = m.to_dict()['reply']['cars']['Car']
+
+        assert list(m.iter_dicts('reply.cars.car')) == expected
+        assert list(mappet.iter_dicts(EXAMPLE_XML, 'car')) == expected
+        assert list(m.iter_dicts('reply.cars.car.-1')) == expected[-1:]
+
+    def test_iter_dicts__should_pass_options(self):
+        xml = '<cars><car><!-- first --><id>1</id></car><car><id>2</id></car></cars>'
+        m = mappet.Mappet(xml)
+
+        assert next(m.iter_dicts('car')) == {'#comments': 'first', 'id': '1'}
+        assert next(m.iter_dicts('car', without_comments=True)) == {'id': '1'}
+        assert next(mappet.iter_dicts(BytesIO(xml), 'car', without_comments=True)) == {'id': '1'}
+
+    def test_iter_dicts__should_stream_records(self, monkeypatch):
+        records = []
+        process = mappet._RecordFilter.process
+        monkeypatch.setattr(mappet._RecordFilter, 'process', lambda self, events: (records.append(element) or element for element in process(self, events)))
+
+        dicts = mappet.iter_dicts(BytesIO(self.xml), 'car_model')
+        assert next(dicts) == {'id': '1', 'name': 'X6'}
+        assert next(dicts) == {'id': '2', 'name': 'X1'}
+        assert next(dicts) is None
+        # Records are dropped from the document as soon as the parser moves past them.
+        assert records[0].getparent() is None
+        assert records[1].getparent() is None
+        assert list(dicts) == []
+
+    def test_iter_dicts__given_missing_nodes__should_yield_nothing(self):
+        assert list(mappet.Mappet(self.xml).iter_dicts('reply.trucks')) == []
+        assert list(mappet.iter_dicts(BytesIO(self.xml), 'truck')) == []
+
+
+class TestMappetJson(object):
+    u"""Tests for the conversion from and to JSON."""
+
+    def test_to_json__should_match_to_dict(self):
+        m = mappet.Mappet.from_file(EXAMPLE_XML)
+
+        assert json.loads(m.to_json()) == m.to_dict()
+        assert json.loads(m.to_json(without_comments=True, trim=False)) == m.to_dict(without_comments=True, trim=False)
+
+    def test_to_json__should_follow_document_order(self):
+        m = mappet.Mappet('<root a="1"> text <b/><c>C</c><b x="y">B</b><!-- note --></root>')
+
+        assert m.to_json() == '{"@a": "1", "#text": "text", "b": [null, {"@x": "y", "#text": "B"}], "c": "C", "#comments": "note"}'
+        assert mappet.Mappet('<root/>').to_json() == 'null'
+        assert mappet.Mappet(u'<root>zażółć</root>').to_json() == '"za\\u017c\\u00f3\\u0142\\u0107"'
+
+    def test_to_json__given_file__should_write_to_it(self):
+        m = mappet.Mappet.from_file(EXAMPLE_XML)
+        fp = BytesIO()
+
+        assert m.to_json(fp) is None
+        assert fp.getvalue() == m.to_json()
+
+    def test_from_json__should_match_mappet_of_decoded_dict(self):
+        m = mappet.Mappet.from_file(EXAMPLE_XML)
+        body = m.to_json(without_comments=True)
+
+        expected = mappet.Mappet(json.loads(body, object_pairs_hook=OrderedDict))
+        assert mappet.Mappet.from_json(body).to_str() == expected.to_str()
+        assert mappet.Mappet.from_json(BytesIO(body)).to_str() == expected.to_str()
+
+        body = '{"car": {"@id": "1", "hp": 256, "weight": 2.5e3, "new": true}}'
+        assert mappet.Mappet.from_json(body).to_str() == '<car id="1"><hp>256</hp><weight>2.5e3</weight><new>YES</new></car>'
+
+    def test_from_json__given_invalid_documents__should_raise(self):
+        with pytest.raises(AttributeError):
+            mappet.Mappet.from_json('["car"]')
+        with pytest.raises(AttributeError):
+            mappet.Mappet.from_json('{"cars": ["X6", "X1"]}')
+        with pytest.raises(ValueError):
+            mappet.Mappet.from_json('{"car": {"#comments": "note"}}')
+
+
+class TestMappetWriter(object):
+    u"""Tests for writing documents record by record."""
+
+    def test_writer__should_write_records(self):
+        out = BytesIO()
+
+        with mappet.Mappet.writer(out, root='cars') as writer:
+            writer.write({'car': {'@id': '1', 'hp': '256'}})
+            writer.write({'car': [{'hp': '198'}, None]})
+            writer.write(mappet.Mappet('<truck><hp>400</hp></truck>'))
+            writer.write(etree.fromstring('<bus/>'))
+
+        assert out.getvalue() == (
+            "<?xml version='1.0' encoding='utf-8'?>\n"
+            '<cars><car id="1"><hp>256</hp></car><car><hp>198</hp></car><car/><truck><hp>400</hp></truck><bus/></cars>'
+        )
+
+    def test_writer__should_give_parsable_documents(self):
+        m = mappet.Mappet.from_file(EXAMPLE_XML)
+        out = BytesIO()
+
+        with mappet.Mappet.writer(out, encoding='iso-8859-2', pretty_print=True) as writer:
+            for car in m.iter_dicts('reply.cars.car', without_comments=True):
+                writer.write({'Car': car})
+
+        exported = mappet.Mappet(out.getvalue())
+        assert exported.to_dict() == {'Car': m.to_dict(without_comments=True)['reply']['cars']['Car']}
+        assert exported.car[1].model_name.get() == 'X1'
+
+    def test_writer__given_compression__should_write_gzip(self):
+        out = BytesIO()
+
+        with mappet.Mappet.writer(out, compression=6) as writer:
+            writer.write({'car': 'X6'})
+
+        assert gzip.GzipFile(fileobj=BytesIO(out.getvalue())).read().endswith('<export><car>X6</car></export>')
+
+    def test_writer__given_invalid_records__should_raise(self):
+        with pytest.raises(ValueError):
+            with mappet.Mappet.writer(BytesIO()) as writer:
+                writer.write({'@id': '1'})
+        with pytest.raises(TypeError):
+            with mappet.Mappet.writer(BytesIO()) as writer:
+                writer.write(['car'])
+
+
+class TestMappetIterBytes(object):
+    u"""Tests for serializing documents in chunks."""
+
+    @pytest.mark.parametrize('chunk_size', [1, 100, 64 * 1024])
+    @pytest.mark.parametrize('options', [
+        {},
+        {'pretty_print': True},
+        {'encoding': 'iso-8859-2'},
+        {'encoding': 'utf-8', 'pretty_print': True},
+        {'without_comments': True},
+        {'xml_declaration': True},
+        {'encoding': 'utf-8', 'standalone': True, 'doctype': '<!DOCTYPE a-message>'},
+        {'with_tail': False},
+        {'method': 'html'},
+        {'method': 'text'},
+        {'method': 'c14n', 'exclusive': True},
+        {'without_comments': True, 'exclusive': True},
+    ])
+    def test_iter_bytes__should_match_to_str(self, chunk_size, options):
+        from mappet.parsing import FAST_PARSER
+
+        parsed = mappet.Mappet.from_file(EXAMPLE_XML)
+        stripped = mappet.Mappet.from_file(EXAMPLE_XML, FAST_PARSER)
+
+        for m in (parsed, stripped, parsed.reply.cars, mappet.Mappet(stripped.to_dict())):
+            chunks = list(m.iter_bytes(chunk_size, **options))
+            assert ''.join(chunks) == m.to_str(**options)
+            assert all(len(chunk) == chunk_size for chunk in chunks[:-1])
+
+    @pytest.mark.parametrize('xml', [
+        '<root/>',
+        '<root a="1"> text <a>A</a>tail<b x="y"><c/><?pi data?></b><!-- comment --></root>',
+        u'<root a="zażółć"><a b="żółw">ółć<b c="ł"/></a><c/></root>'.encode('utf-8'),
+        '<root xmlns="urn:a"><a><d/><b:e xmlns:b="urn:b" b:c="1"/></a>\n<f/></root>',
+        '<r xmlns="urn:a"><a><p:c xmlns="urn:c" xmlns:p="urn:a"/></a></r>',
+        u'<zażółć a="ą"><gęś b="ę">x</gęś><b c="ć"/>t<d/></zażółć>'.encode('utf-8'),
+    ])
+    def test_iter_bytes__given_small_chunks__should_match_to_str(self, xml):
+        root = etree.fromstring(xml)
+
+        for element in root.iter(etree.Element):
+            m = mappet.Mappet(element)
+            for options in ({}, {'pretty_print': True}, {'encoding': 'utf-8'}, {'without_comments': True}):
+                assert ''.join(m.iter_bytes(1, **options)) == m.to_str(**options)
+
+    @pytest.mark.parametrize('encoding', ['utf-16', 'UTF-16', 'utf-32'])
+    def test_iter_bytes__given_encoding_incompatible_with_ascii__should_match_to_str(self, encoding):
+        m = mappet.Mappet(u'<a x="ó"><b/><c>ż<d/></c></a>'.encode('utf-8'))
+
+        for node in (m, m.c):
+            assert ''.join(node.iter_bytes(1, encoding=encoding)) == node.to_str(encoding=encoding)
+
+    @pytest.mark.parametrize('seed', range(20))
+    @pytest.mark.parametrize('namespaced', [True, False])
+    def test_iter_bytes__given_random_trees__should_match_to_str(self, seed, namespaced):
+        rand = random.Random(seed)
+        namespaces = ['urn:a', 'urn:b'] if namespaced else []
+
+        def texts():
+            return rand.choice([None, '', 'x', u'ł&<', '\n  '])
+
+        def build(parent, depth):
+            for _ in xrange(rand.randint(0, 4)):
+                kind = rand.random()
+                if kind < 0.1:
+                    child = etree.Comment('c')
+                    parent.append(child)
+                elif kind < 0.15:
+                    child = etree.PI('pi', 'd')
+                    parent.append(child)
+                else:
+                    nsmap = {}
+                    if namespaces and rand.random() < 0.3:
+                        nsmap[rand.choice([None, 'p', 'q'])] = rand.choice(namespaces)
+                    tag = rand.choice(['a', 'b', u'ż'])
+                    if namespaces and rand.random() < 0.5:
+                        tag = '{%s}%s' % (rand.choice(namespaces), tag)
+                    child = etree.SubElement(parent, tag, nsmap=nsmap)
+                    for name in rand.sample(['x', 'y', '{urn:b}z' if namespaced else 'z'], rand.randint(0, 2)):
+                        child.set(name, rand.choice(['1', u'ó', '"<']))
+                    child.text = texts()
+                    if depth < 4:
+                        build(child, depth + 1)
+                child.tail = texts()
+
+        # Namespaces declared by the root or only by its descendants.
+        root = etree.Element('root', nsmap={'p': 'urn:a'} if namespaced and seed % 2 else None)
+        build(root, 0)
+
+        # Trees are serialized both as built and as parsed back.
+        for tree in (root, etree.fromstring(etree.tostring(root, encoding='utf-8'))):
+            for element in tree.iter(etree.Element):
+                m = mappet.Mappet(element)
+                for options in ({}, {'encoding': 'utf-8'}, {'encoding': 'iso-8859-2', 'with_tail': False}):
+                    for chunk_size in (1, 64):
+                        assert ''.join(m.iter_bytes(chunk_size, **options)) == m.to_str(**options)
+
+    def test_iter_bytes__should_serialize_lazily(self):
+        m = mappet.Mappet({'cars': {'car': [{'id': str(index)} for index in xrange(10000)]}})
+        chunks = m.iter_bytes(1024)
+
+        assert next(chunks) == m.to_str()[:1024]
+        # Changes made before the remaining chunks are consumed show up in them.
+        m.car[-1].id = 'last'
+        assert ''.join(chunks).endswith('<car><id>last</id></car></cars>')
+
+    def test_iter_bytes__given_lazy_mappet__should_yield_the_original_string(self):
+        xml = '<root>  <a>A</a></root>'
+        m = mappet.LazyMappet(xml)
+
+        assert list(m.iter_bytes(10)) == ['<root>  <a', '>A</a></ro', 'ot>']
+        assert m._tree is None
+        assert ''.join(m.iter_bytes(10, pretty_print=True)) == mappet.Mappet(xml).to_str(pretty_print=True)
+
+
+class TestMappetFromFileAndBytes(object):
+    u"""Tests for creating mappet objects from files and buffers."""
+
+    xml = "<?xml version='1.0' encoding='iso-8859-2'?><root><a attr='\xb1'>A</a></root>"
+
+    def test_from_file__given_filename__should_parse_the_file(self):
+        m = mappet.Mappet.from_file(EXAMPLE_XML)
+        assert m.tag == 'a-message'
+        assert m.sget('head.id.@seq') == '20'
+
+    def test_from_file__given_file_object__should_parse_its_contents(self):
+        m = mappet.Mappet.from_file(BytesIO(self.xml))
+        assert m.a.get() == 'A'
+        assert m.a['@attr'] == u'ą'
+
+    @pytest.mark.parametrize('buf_type', [bytes, bytearray, memoryview, buffer])
+    def test_from_bytes__given_buffer__should_parse_it(self, buf_type):
+        m = mappet.Mappet.from_bytes(buf_type(self.xml))
+        assert m.a.get() == 'A'
+        # The encoding declaration is respected.
+        assert m.a['@attr'] == u'ą'
+
+    def test_from_bytes__given_mmap__should_parse_it(self, tmpdir):
+        import mmap
+
+        xml_file = tmpdir.join('doc.xml')
+        xml_file.write(self.xml, mode='wb')
+        with xml_file.open('rb') as f:
+            m = mappet.Mappet.from_bytes(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+        assert m.a.get() == 'A'
+
+    def test_from_bytes__given_buffer_larger_than_chunk__should_parse_it(self, monkeypatch):
+        monkeypatch.setattr(mappet, 'PARSE_CHUNK_SIZE', 7)
+        m = mappet.Mappet.from_bytes(bytearray(self.xml))
+        assert m.to_str() == '<root><a attr="&#261;">A</a></root>'
+
+    def test_from_bytes__given_interrupted_read__should_reset_the_parser(self, monkeypatch):
+        def failing_chunks(buf):
+            yield bytes(buf[:7])
+            raise IOError('read failed')
+
+        monkeypatch.setattr(mappet, '_iter_chunks', failing_chunks)
+        with pytest.raises(IOError):
+            mappet.Mappet.from_bytes(bytearray(self.xml))
+
+        monkeypatch.undo()
+        assert mappet.Mappet.from_bytes(bytearray('<y/>')).to_str() == '<y/>'
+
+
+class TestFeedParser(object):
+    u"""Tests for incremental parsing of documents received in chunks."""
+
+    xml = TestMappetIterRecords.xml
+
+    @staticmethod
+    def chunks(xml, size=5):
+        return [xml[i:i + size] for i in xrange(0, len(xml), size)]
+
+    def test_from_chunks__should_parse_the_whole_document(self):
+        m = mappet.Mappet.from_chunks(iter(self.chunks(self.xml)))
+        assert m.to_str() == self.xml
+
+    def test_feed__without_tag__should_return_no_records(self):
+        parser = mappet.Mappet.feed_parser()
+        assert all(parser.feed(chunk) == [] for chunk in self.chunks(self.xml))
+        # No events are collected.
+        assert list(parser._parser.read_events()) == []
+        assert parser.close().to_str() == self.xml
+
+    def test_feed__given_tag__should_return_records_once_the_parser_moves_past_them(self):
+        parser = mappet.Mappet.feed_parser(tag='car_model')
+        first_record_end = self.xml.index('</Car-Model>') + len('</Car-Model>')
+        second_record_start = self.xml.index('<Car-Model>', first_record_end) + len('<Car-Model>')
+
+        assert parser.feed(self.xml[:first_record_end]) == []
+        records = parser.feed(self.xml[first_record_end:second_record_start])
+        assert [record.id.get() for record in records] == ['1']
+        assert records[0]._xml.getparent() is None
+        records = parser.feed(self.xml[second_record_start:])
+        assert [record.tag for record in records] == ['Car-Model', 'Car-Model']
+        assert isinstance(records[1], mappet.Literal)
+
+        # Records are detached, only their ancestors remain.
+        assert parser.close().to_str() == '<a-message><reply><cars/></reply></a-message>'
+
+    def test_feed__given_parser_config__should_use_it(self):
+        from mappet.parsing import FAST_PARSER
+
+        parser = mappet.FeedParser(tag='id', parser_config=FAST_PARSER)
+        records = parser.feed('<root>\n  <!-- comment -->\n  <id>1</id>\n</root>')
+
+        assert [record.get() for record in records] == ['1']
+        assert parser.close().to_str() == '<root/>'
+
+    def test_feed__given_malformed_chunk__should_raise(self):
+        parser = mappet.Mappet.feed_parser()
+        parser.feed('<root><a>')
+        with pytest.raises(etree.XMLSyntaxError):
+            parser.feed('</b></root>')
+
+
+def _car_ids(m):
+    u"""Transformation used by parse_many tests, must be picklable."""
+    return [car.id.get() for car in m.iter_children('car')]
+
+
+class TestMappetParseMany(object):
+    u"""Tests for parsing documents in a pool of workers."""
+
+    sources = [
+        '<cars><Car><id>{}</id></Car><Car><id>{}</id></Car></cars>'.format(i, -i)
+        for i in xrange(20)
+    ]
+
+    @pytest.mark.parametrize('backend', ['thread', 'process'])
+    def test_parse_many__should_return_results_in_order(self, backend):
+        results = list(mappet.Mappet.parse_many(self.sources, backend=backend, workers=2, chunksize=3))
+
+        assert all(isinstance(result, mappet.Mappet) for result in results)
+        assert [result.to_str() for result in results] == self.sources
+
+    @pytest.mark.parametrize('backend', ['thread', 'process'])
+    def test_parse_many__given_transform__should_return_its_results(self, backend):
+        results = mappet.Mappet.parse_many(self.sources, backend=backend, workers=2, transform=_car_ids)
+        assert list(results) == [[str(i), str(-i)] for i in xrange(20)]
+
+    def test_parse_many__unordered__should_return_all_results(self):
+        results = mappet.Mappet.parse_many(iter(self.sources), workers=4, ordered=False, transform=_car_ids)
+        assert sorted(results) == sorted([str(i), str(-i)] for i in xrange(20))
+
+    def test_parse_many__given_parser_config__should_use_it(self):
+        from mappet.parsing import FAST_PARSER
+
+        results = mappet.Mappet.parse_many(['<a> <!-- c --> <b/> </a>'], parser_config=FAST_PARSER)
+        assert [result.to_str() for result in results] == ['<a><b/></a>']
+
+    def test_parse_many__given_malformed_document__should_raise(self):
+        results = mappet.Mappet.parse_many(['<a/>', '<a>'], workers=2)
+        with pytest.raises(etree.XMLSyntaxError):
+            list(results)
+
+    def test_parse_many__should_start_workers_lazily_and_stop_them(self, monkeypatch):
+        from multiprocessing.pool import ThreadPool
+
+        pools = []
+
+        class RecordedPool(ThreadPool):
+            def __init__(self, *args, **kwargs):
+                super(RecordedPool, self).__init__(*args, **kwargs)
+                pools.append(self)
+
+        monkeypatch.setitem(mappet.POOL_BACKENDS, 'thread', RecordedPool)
+        results = mappet.Mappet.parse_many(self.sources, workers=2)
+        assert pools == []
+
+        next(results)
+        results.close()
+        assert len(pools) == 1
+        assert all(not worker.is_alive() for worker in pools[0]._pool)
+
+    def test_parse_many__given_unknown_backend__should_raise(self):
+        with pytest.raises(ValueError) as exc:
+            mappet.Mappet.parse_many(self.sources, backend='fiber')
+
+        assert 'Unknown backend' in str(exc.value)
+
+
+class TestLazyMappet(object):
+    u"""Tests for mappet objects parsing their documents on first access."""
+
+    xml = "<?xml version='1.0' encoding='utf-8'?>\n<root>\n  <a attr='1'>A</a>\n</root>"
+
+    @pytest.fixture
+    def lazy(self):
+        return mappet.LazyMappet(self.xml)
+
+    def test_init__given_string__should_not_parse_it(self, lazy):
+        assert lazy._tree is None
+        # Malformed documents are only detected on first access.
+        malformed = mappet.LazyMappet('<root>')
+        with pytest.raises(etree.XMLSyntaxError):
+            len(malformed)
+
+    def test_init__given_element_or_dict__should_behave_like_mappet(self):
+        assert mappet.LazyMappet(etree.Element('root')).to_str() == '<root/>'
+        assert mappet.LazyMappet({'root': {'a': 'A'}}).a.get() == 'A'
+
+    def test_to_str__unparsed__should_return_original_string(self, lazy):
+        assert lazy.to_str() is self.xml
+        assert lazy._tree is None
+        # Formatting options require serialization.
+        assert lazy.to_str(encoding='utf-8') == '<root>\n  <a attr="1">A</a>\n</root>'
+
+    def test_access__should_parse_the_document_once(self, lazy):
+        assert lazy.a.get() == 'A'
+        tree = lazy._tree
+        assert lazy.sget('a.@attr') == '1'
+        assert lazy._tree is tree
+        assert lazy._raw is None
+
+    def test_to_str__after_mutation__should_serialize_the_tree(self, lazy):
+        lazy.a = 'B'
+        assert lazy.to_str() == '<root>\n  <a>B</a></root>'
+
+    def test_pickle__unparsed__should_keep_original_string(self, lazy):
+        import pickle
+
+        unpickled = pickle.loads(pickle.dumps(lazy))
+        assert unpickled._tree is None
+        assert unpickled.to_str() == self.xml
+        assert unpickled.a.get() == 'A'
+
+        lazy.a = 'B'
+        assert pickle.loads(pickle.dumps(lazy)).a.get() == 'B'
+
+    def test_deepcopy__unparsed__should_not_parse(self, lazy):
+        from copy import deepcopy
+
+        copied = deepcopy(lazy)
+        assert copied._tree is None
+        assert copied.to_str() == self.xml
+        assert deepcopy(copied.a).get() == 'A'
+
+    def test_init__given_parser_config__should_use_it(self):
+        from mappet.parsing import FAST_PARSER
+
+        lazy = mappet.LazyMappet(self.xml, FAST_PARSER)
+        assert lazy.to_str() == self.xml
+        lazy.a['@attr'] = '2'
+        assert lazy.to_str() == '<root><a attr="2">A</a></root>'
+
+
+class TestMappetSelectiveParsing(object):
+    u"""Tests for parsing only selected subtrees of documents."""
+
+    expected = {
+        'head': {
+            'id': {'@seq': '20', '@tstamp': '2015-07-13T10:55:25+02:00'},
+            'initiator': 'Mr Sender',
+            'date': '2015-07-13T10:56:05.597420+02:00',
+            'type': 'reply-type',
+        },
+        'status': {'result': 'OK'},
+        'reply': None,
+    }
+
+    @pytest.fixture(scope='class')
+    def xml(self):
+        with open(EXAMPLE_XML, 'rb') as f:
+            return f.read()
+
+    @pytest.mark.parametrize('only', [
+        ['head', 'status.result', 'reply.fake'],
+        ['head.id.@seq', 'head', 'status.result.#text', 'status.result', 'reply.fake.node'],
+    ])
+    def test_from_bytes__given_only__should_keep_selected_subtrees(self, xml, only):
+        m = mappet.Mappet.from_bytes(xml, only=only)
+        assert m.to_dict() == self.expected
+
+    def test_from_bytes__given_buffer_and_only__should_keep_selected_subtrees(self, xml, monkeypatch):
+        monkeypatch.setattr(mappet, 'PARSE_CHUNK_SIZE', 16)
+        m = mappet.Mappet.from_bytes(bytearray(xml), only=['head', 'status.result', 'reply.fake'])
+        assert m.to_dict() == self.expected
+
+    def test_from_file__given_only__should_keep_selected_subtrees(self):
+        m = mappet.Mappet.from_file(EXAMPLE_XML, only=['head', 'status.result', 'reply.fake'])
+        assert m.to_dict() == self.expected
+
+    def test_from_bytes__given_normalized_names__should_match_original_tags(self, xml):
+        m = mappet.Mappet.from_bytes(xml, only=['reply.cars.car.model_name'])
+        assert m.reply.cars.to_dict(without_comments=True) == {'Car': [{'Model_Name': 'X6'}, {'Model_Name': 'X1'}]}
+
+    def test_from_bytes__given_text_between_dropped_elements__should_drop_them_safely(self, monkeypatch):
+        xml = '<root>\n  text\n  ' + '<a><b>1</b></a>\n  tail text\n  <c>C</c>' * 200 + '</root>'
+        for size in (7, 16, 64):
+            monkeypatch.setattr(mappet, 'PARSE_CHUNK_SIZE', size)
+            m = mappet.Mappet.from_bytes(bytearray(xml), only=['c'])
+            assert m.to_dict() == {'#text': 'text', 'c': ['C'] * 200}
+
+    def test_from_bytes__given_empty_selection__should_keep_the_root(self, xml):
+        assert mappet.Mappet.from_bytes(xml, only=[]).to_str() == '<a-message>\n    </a-message>'
+
+    def test_from_bytes__given_index__should_raise(self, xml):
+        with pytest.raises(ValueError) as exc:
+            mappet.Mappet.from_bytes(xml, only=['reply.cars.car.0'])
+
+        assert 'Indices are not supported' in str(exc.value)
+
+    def test_selection__should_drop_elements_while_parsing(self):
+        selection = mappet._Selection(['a'])
+        parser = etree.XMLPullParser(events=('start', 'end'))
+        parser.feed('<root><b><c/><d>')
+        events = list(parser.read_events())
+        selection.process(events)
+
+        # ``b`` is not complete yet, but its finished children are already gone.
+        _, b = events[1]
+        assert [child.tag for child in b] == ['d']
+
+
+class TestMappetTreeIndex(object):
+    u"""Tests for the index of children shared by objects of the same tree."""
+
+    @pytest.fixture
+    def m(self):
+        return mappet.Mappet.from_file(EXAMPLE_XML)
+
+    def test_index__should_be_shared_by_objects_of_the_same_tree(self, m):
+        assert m.reply.cars._index is m._index
+        assert m.reply.cars.car[0]._index is m._index
+        assert m.xpath('reply/cars')._index is m._index
+        assert list(m.iter_children('head'))[0]._index is m._index
+
+    def test_index__should_normalize_each_tag_once(self, m, monkeypatch):
+        calls = []
+        normalize_tag = mappet.helpers.normalize_tag
+        monkeypatch.setattr(mappet.helpers, 'normalize_tag', lambda tag: calls.append(tag) or normalize_tag(tag))
+
+        for _ in xrange(3):
+            assert m.reply.cars.car[1].hp.to_int() == 198
+
+        assert sorted(calls) == sorted(set(calls))
+
+    def test_index__should_skip_comments(self, m):
+        # The ``cars`` node contains comments.
+        assert m.reply.cars.keys() == {'car'}
+        assert len(m.reply.cars.car) == 2
+
+    def test_find(self, m):
+        index = m._get_index()
+        cars = m.reply.cars._xml
+
+        assert index.find(cars, 'car') == ('Car', cars[0])
+        assert index.find(cars, 'Car') == (None, None)
+
+    def test_index__should_be_invalidated_by_set_and_create(self, m):
+        head = m.head
+        assert 'new_node' not in head.keys()
+
+        head.new_node = 'text'
+        assert m.head.keys() == {'id', 'initiator', 'date', 'type', 'new_node'}
+
+        head.new_node = {'a': 'A', 'b': 'B'}
+        assert m.head.new_node.keys() == {'a', 'b'}
+        head.new_node = [{'c': 'C'}]
+        assert m.head.new_node.keys() == {'c'}
+
+        head.create('Other-Node', {'d': 'D'})
+        assert m.head.other_node.keys() == {'d'}
+
+    def test_index__should_be_invalidated_by_update(self, m):
+        auth = m.auth
+        auth.update(password='secret')
+        assert m.auth.keys() == {'user', 'password'}
+
+    def test_index__should_be_invalidated_by_removal(self, m):
+        head = m.head
+        assert head.keys()
+        m.reply.cars.car[0].keys()
+        assert len(m._index._entries) > 2
+
+        del head.initiator
+        del m['reply']
+        assert m.head.keys() == {'id', 'date', 'type'}
+        assert m.keys() == {'head', 'auth', 'status'}
+        # Entries of removed subtrees are dropped.
+        assert all(element.getroottree().getroot() is m._xml for element in m._index._entries)
+
+    def test_index__given_changes_made_with_lxml__should_be_rebuilt(self):
+        m = mappet.Mappet('<r><cars><car>A</car><car>B</car><car>C</car></cars></r>')
+        assert [car.get() for car in m.cars.car] == ['A', 'B', 'C']
+
+        for car in m.xpath('cars/car[position() < 3]'):
+            car.getparent().remove(car)
+        assert m.cars.car.get() == 'C'
+        assert m.sget('cars.car').get() == 'C'
+
+        m.cars._xml.insert(0, etree.fromstring('<car>Z</car>'))
+        assert [car.get() for car in m.cars.car] == ['Z', 'C']
+        assert m.cars.car[0].get() == 'Z'
+
+        etree.SubElement(m._xml, 'Bikes')
+        assert m.keys() == {'cars', 'bikes'}
+
+    def test_index__given_changes_made_by_other_object__should_be_rebuilt(self, m):
+        assert len(m.reply.cars.car) == 2
+
+        other = mappet.Mappet(m._xml)
+        del other.reply.cars.Car
+        assert 'car' not in m.reply.cars.keys()
+        assert m.sget('reply.cars.car.0') is mappet.NONE_NODE
+
+
+def _comparable(value):
+    u"""Returns a value of sget comparable between two ways of resolving a path."""
+    if isinstance(value, (list, mappet.MappetList)):
+        return [_comparable(item) for item in value]
+    if isinstance(value, mappet.Node):
+        return value.__class__, value._xml
+    if callable(value):
+        return getattr(value, '__name__', None)
+    return value
+
+
+class TestCompiledPath(object):
+    u"""Tests for paths compiled to element walks."""
+
+    PATHS = [
+        '#text',
+        '@missing',
+        'head',
+        'head.id.@seq',
+        'head.id.@missing',
+        'head.initiator.#text',
+        'head.keys',
+        'head.initiator.get',
+        'head.initiator.to_int',
+        'head.initiator.x',
+        'auth.user.0',
+        'auth.user.@first-name',
+        'reply.cars.car',
+        'reply.cars.Car',
+        'reply.cars.car.#text',
+        'reply.cars.car.0',
+        'reply.cars.car.1.hp',
+        'reply.cars.car.-1.model_name.#text',
+        'reply.cars.car.2',
+        'reply.cars.car.x',
+        'reply.cars.car.count',
+        'reply.cars.car.0.id.@missing',
+        'status.result.x.y',
+    ]
+
+    @pytest.fixture
+    def m(self):
+        return mappet.Mappet.from_file(EXAMPLE_XML)
+
+    @pytest.mark.parametrize('path', PATHS)
+    @pytest.mark.parametrize('default', [mappet.NONE_NODE, 'default'])
+    def test_resolve__should_match_attribute_access(self, m, path, default):
+        compiled = mappet.CompiledPath(path)
+        expected = compiled.resolve_attributes(m, default)
+
+        assert _comparable(compiled.resolve(m, default)) == _comparable(expected)
+        assert _comparable(m.sget(path, default)) == _comparable(expected)
+
+    def test_init__should_parse_segments(self):
+        path = mappet.CompiledPath('reply.cars.car.-1.@attr')
+
+        assert path.segments == ('reply', 'cars', 'car', -1)
+        assert path.text_or_attr == 'attr'
+        assert str(path) == 'reply.cars.car.-1.@attr'
+
+    @pytest.mark.parametrize('path', ['', '.#text', 'head..id', 'head.', '.head'])
+    def test_init__given_empty_segment__should_raise(self, m, path):
+        with pytest.raises(ValueError):
+            mappet.CompiledPath(path)
+        with pytest.raises(ValueError):
+            m.sget(path)
+        with pytest.raises(ValueError):
+            m.exists(path)
+
+    def test_resolve__should_wrap_only_the_result(self, m, monkeypatch):
+        wrapped = []
+        wrap = mappet.Mappet._wrap.__func__
+        monkeypatch.setattr(mappet.Mappet, '_wrap', classmethod(lambda cls, *args: wrapped.append(args) or wrap(cls, *args)))
+
+        assert m.sget('reply.cars.car.1.hp').to_int() == 198
+        assert len(wrapped) == 1
+        assert m.sget('reply.cars.car.1.hp.#text') == '198'
+        assert len(wrapped) == 1
+
+    def test_resolve__should_see_changes(self, m):
+        assert m.sget('head.new_node') is mappet.NONE_NODE
+        m.head.new_node = 'text'
+        assert m.sget('head.new_node.#text') == 'text'
+        del m.head.new_node
+        assert m.sget('head.new_node.#text') is None
+
+    def test_compile_path__should_cache_paths(self, monkeypatch):
+        monkeypatch.setattr(mappet, 'PATH_CACHE', mappet.caching.LRUCache(maxsize=2))
+        path = mappet.Mappet.compile_path('head.id')
+
+        assert mappet.Mappet.compile_path('head.id') is path
+        mappet.Mappet.compile_path('a')
+        mappet.Mappet.compile_path('b')
+        assert mappet.Mappet.compile_path('head.id') is not path
+        assert mappet.PATH_CACHE.info() == (1, 4, 2, 2)
+
+    def test_sget__given_compiled_path__should_use_it(self, m):
+        path = mappet.Mappet.compile_path('head.initiator.#text')
+        assert m.sget(path) == 'Mr Sender'
+        assert mappet.Mappet({'root': {'head': {'initiator': 'Other'}}}).sget(path) == 'Other'
+
+
+class TestMappetSgetMany(object):
+    u"""Tests for resolving many paths at once."""
+
+    @pytest.fixture
+    def m(self):
+        return mappet.Mappet.from_file(EXAMPLE_XML)
+
+    @pytest.mark.parametrize('default', [mappet.NONE_NODE, 'default'])
+    def test_sget_many__should_match_sget(self, m, default):
+        values = m.sget_many(TestCompiledPath.PATHS, default)
+
+        assert sorted(values) == sorted(TestCompiledPath.PATHS)
+        for path in TestCompiledPath.PATHS:
+            assert _comparable(values[path]) == _comparable(m.sget(path, default)), path
+
+    def test_sget_many__should_walk_common_prefixes_once(self, m, monkeypatch):
+        steps = []
+        step = mappet._step
+        monkeypatch.setattr(mappet, '_step', lambda *args: steps.append(args[-1]) or step(*args))
+
+        values = m.sget_many([
+            'head.id.@seq',
+            'head.initiator.#text',
+            'head.type.#text',
+            'reply.cars.car.0.hp.#text',
+            'reply.cars.car.1.hp.#text',
+            'reply.fake.a',
+            'reply.fake.b',
+        ])
+
+        assert values['head.initiator.#text'] == 'Mr Sender'
+        assert values['reply.cars.car.1.hp.#text'] == '198'
+        assert values['reply.fake.b'] is mappet.NONE_NODE
+        assert sorted(steps) == sorted([
+            'head', 'id', 'initiator', 'type', 'reply', 'cars', 'car', 0, 'hp', 1, 'hp', 'fake',
+        ])
+
+    def test_sget_many__given_converters__should_convert_values(self, m):
+        values = m.sget_many(
+            ['head.id.@seq', 'reply.cars.car.0.hp', 'head.date.#text', 'auth.user', 'fake.node', 'head.id.@missing'],
+            converters={
+                'head.id.@seq': 'to_int',
+                'reply.cars.car.0.hp': 'to_int',
+                'head.date.#text': 'to_datetime',
+                'auth.user': lambda value: value.upper(),
+                'fake.node': 'to_int',
+                'head.id.@missing': int,
+            },
+        )
+
+        assert values == {
+            'head.id.@seq': 20,
+            'reply.cars.car.0.hp': 256,
+            'head.date.#text': m.head.date.to_datetime(),
+            'auth.user': 'ID',
+            'fake.node': mappet.NONE_NODE,
+            'head.id.@missing': None,
+        }
+
+    def test_sget_many__given_unknown_converter__should_raise(self, m):
+        with pytest.raises(ValueError):
+            m.sget_many(['head.id.@seq'], converters={'head.id.@seq': 'normalize_tag'})
+
+    def test_sget_many__given_compiled_paths__should_use_them_as_keys(self, m):
+        path = mappet.Mappet.compile_path('head.type.#text')
+        assert m.sget_many([path]) == {path: 'reply-type'}
+
+
+class TestMappetXPathCache(object):
+    u"""Tests for the cache of compiled XPath expressions."""
+
+    @pytest.fixture
+    def m(self, monkeypatch):
+        monkeypatch.setattr(mappet, 'XPATH_CACHE', mappet.caching.LRUCache(maxsize=4))
+        return mappet.Mappet.from_file(EXAMPLE_XML)
+
+    def test_xpath__should_compile_expressions_once(self, m):
+        assert m.xpath('count(//Car)') == 2
+        assert m.xpath('count(//Car)') == 2
+        assert m.xpath('count(//Car)', smart_strings=False) == 2
+
+        assert mappet.XPATH_CACHE.info() == (1, 2, 4, 2)
+
+    def test_xpath__given_scalar_result__should_return_it(self, m):
+        assert m.xpath('substring(head/type, 1, 1)') == 'r'
+        assert m.xpath('boolean(//Car)') is True
+
+    def test_xpath__given_namespaces__should_use_them_in_key(self, m):
+        namespaces = {'a': 'urn:a', 'b': 'urn:b'}
+
+        assert m.xpath('count(//a:x)', namespaces=namespaces) == 0
+        assert m.xpath('count(//a:x)', namespaces=dict(reversed(namespaces.items()))) == 0
+        assert m.xpath('count(//a:x)', namespaces={'a': 'urn:other'}) == 0
+
+        assert mappet.XPATH_CACHE.info().hits == 1
+        assert mappet.XPATH_CACHE.info().misses == 2
+
+    def test_xpath__given_regexp__should_match(self, m):
+        assert m.xpath("//*[re:test(., '^mr', 'i')]", regexp=True).get() == 'Mr Sender'
+        assert m.xpath("//*[re:test(., '^mr', 'i')]", namespaces='exslt', regexp=True).get() == 'Mr Sender'
+        # Both describe the same expression.
+        assert mappet.XPATH_CACHE.info().hits == 1
+
+    def test_xpath__single_use__should_honour_options_and_skip_cache(self, m):
+        assert m.xpath("//*[re:test(., '^mr', 'i')]", regexp=True, single_use=True).get() == 'Mr Sender'
+        assert m.xpath('count(//a:x)', namespaces={'a': 'urn:a'}, single_use=True) == 0
+        assert m.xpath('string(head/type)', smart_strings=False, single_use=True) == 'reply-type'
+
+        assert len(mappet.XPATH_CACHE) == 0
+
+    def test_precompile__should_fill_the_cache(self, m):
+        mappet.Mappet.precompile(['//Car', 'count(//Car)'])
+        mappet.Mappet.precompile(["//*[re:test(., 'x')]"], regexp=True)
+
+        assert len(mappet.XPATH_CACHE) == 3
+        assert len(m.xpath('//Car')) == 2
+        assert mappet.XPATH_CACHE.info().hits == 1
+
+    def test_precompile__given_invalid_expression__should_raise(self):
+        with pytest.raises(etree.XPathSyntaxError):
+            mappet.Mappet.precompile(['//Car['])
+
+    def test_xpath__should_be_usable_from_many_threads(self, m):
+        from multiprocessing.pool import ThreadPool
+
+        pool = ThreadPool(4)
+        try:
+            results = pool.map(lambda _: m.xpath('count(//Car)'), xrange(100))
+        finally:
+            pool.terminate()
+
+        assert results == [2] * 100
+        assert mappet.XPATH_CACHE.info().hits + mappet.XPATH_CACHE.info().misses == 100
+
+
+class TestMappetXPathIteration(object):
+    u"""Tests for lazily wrapped and converted XPath results."""
+
+    @pytest.fixture
+    def m(self):
+        return mappet.Mappet.from_file(EXAMPLE_XML)
+
+    def test_iterxpath__should_wrap_nodes_lazily(self, m, monkeypatch):
+        wrapped = []
+        wrap = mappet.Mappet._wrap.__func__
+        monkeypatch.setattr(mappet.Mappet, '_wrap', classmethod(lambda cls, *args: wrapped.append(args) or wrap(cls, *args)))
+
+        cars = m.iterxpath('//Car')
+        assert wrapped == []
+
+        car = next(cars)
+        assert isinstance(car, mappet.Mappet)
+        assert car.model_name.get() == 'X6'
+        assert car._index is m._index
+        assert len(wrapped) == 2  # The car and its model name.
+
+    def test_iterxpath__should_return_leaves_as_literals(self, m):
+        assert [hp.to_int() for hp in m.iterxpath('//Car/HP')] == [256, 198]
+        assert all(isinstance(hp, mappet.Literal) for hp in m.iterxpath('//Car/HP'))
+
+    def test_iterxpath__given_other_results__should_yield_them(self, m):
+        assert list(m.iterxpath('//Car/HP/text()')) == ['256', '198']
+        assert list(m.iterxpath('count(//Car)')) == [2.0]
+        assert list(m.iterxpath('//Car[HP > 1000]')) == []
+
+    def test_iterxpath__should_accept_xpath_options(self, m):
+        names = m.iterxpath("//*[re:test(., '^x', 'i')]", regexp=True)
+        assert [name.get() for name in names] == ['X6', 'X1']
+
+    def test_xpath_values(self, m):
+        assert m.xpath_values('//Car/HP') == ['256', '198']
+        assert m.xpath_values('//Car/HP', to='int') == [256, 198]
+        assert m.xpath_values('//Car/weight/text()', to='to_decimal') == [Decimal(3690), Decimal(2890)]
+        assert m.xpath_values('//id/@seq', to=int) == [20]
+        assert m.xpath_values('count(//Car)', to='int') == [2]
+
+    def test_xpath_values__should_not_convert_empty_values(self, m):
+        assert m.xpath_values('head/id', to='int') == [None]
+        assert m.xpath_values('//Car[HP > 1000]/HP', to='int') == []
+
+    def test_xpath_values__given_unknown_converter__should_raise(self, m):
+        with pytest.raises(ValueError):
+            m.xpath_values('//Car/HP', to='normalize_tag')
+
+
+class TestMappetExists(object):
+    u"""Tests for checking existence of paths."""
+
+    @pytest.fixture
+    def m(self):
+        return mappet.Mappet.from_file(EXAMPLE_XML)
+
+    @pytest.mark.parametrize('path', TestCompiledPath.PATHS + ['head.id.#text', 'reply.cars.car.-3', 'reply.cars.car.1.#text'])
+    def test_exists__should_match_sget(self, m, path):
+        value = m.sget(path)
+        expected = not (value is None or value is mappet.NONE_NODE)
+
+        assert m.exists(path) is expected
+        assert (path in m) is expected
+        assert m.exists(mappet.Mappet.compile_path(path)) is expected
+
+    def test_exists__should_not_wrap_nodes(self, m, monkeypatch):
+        monkeypatch.setattr(mappet.Mappet, '_wrap', None)
+
+        assert 'reply.cars.car.1.hp' in m
+        assert 'reply.cars.car.1.hp.#text' in m
+        assert 'head.id.@seq' in m
+        assert 'reply.cars.car.1.fake' not in m
+        assert 'reply.cars.car.2' not in m
+
+    def test_exists__should_see_changes(self, m):
+        assert 'head.new_node' not in m
+        m.head.new_node = 'text'
+        assert 'head.new_node.#text' in m
+
+
+class TestMappetList(object):
+    u"""Tests for lazy lists of children."""
+
+    XML = '<root><a>0</a><!-- c --><a>1</a><b>b</b><a>2</a><a>3</a><a>4</a></root>'
+
+    @pytest.fixture
+    def m(self):
+        return mappet.Mappet(self.XML)
+
+    @staticmethod
+    def values(nodes):
+        return [node.get() for node in nodes]
+
+    def test_getattr__should_return_list_for_many_children(self, m):
+        assert isinstance(m.a, mappet.MappetList)
+        assert isinstance(m['a'], mappet.MappetList)
+        assert isinstance(m.b, mappet.Literal)
+        assert m['b'] == 'b'
+
+        with pytest.raises(KeyError):
+            m.missing
+
+    def test_len_and_indexing(self, m):
+        assert len(m.a) == 5
+        assert m.a[0].get() == '0'
+        assert m.a[1].get() == '1'
+        assert m.a[-1].get() == '4'
+        assert m.a[-5].get() == '0'
+
+        with pytest.raises(IndexError):
+            m.a[5]
+        with pytest.raises(IndexError):
+            m.a[-6]
+
+    @pytest.mark.parametrize('key', [
+        slice(None),
+        slice(1, 4),
+        slice(None, None, 2),
+        slice(-2, None),
+        slice(None, None, -1),
+        slice(3, 0, -2),
+        slice(10, 20),
+    ])
+    def test_slicing__should_match_lists(self, m, key):
+        expected = ['0', '1', '2', '3', '4'][key]
+        sliced = m.a[key]
+
+        assert isinstance(sliced, mappet.MappetList)
+        assert len(sliced) == len(expected)
+        assert self.values(sliced) == expected
+        assert [sliced[i].get() for i in range(-len(sliced), len(sliced))] == expected * 2
+        assert self.values(reversed(sliced)) == expected[::-1]
+
+    def test_iteration(self, m):
+        assert self.values(m.a) == ['0', '1', '2', '3', '4']
+        assert self.values(reversed(m.a)) == ['4', '3', '2', '1', '0']
+        assert self.values(m.a[1:][::2]) == ['1', '3']
+        assert m.a.index(m.a[2]) == 2
+        assert m.a[3] in m.a
+
+    def test_wrappers__should_be_created_on_demand(self, m, monkeypatch):
+        wrapped = []
+        wrap = mappet.Mappet._wrap.__func__
+        monkeypatch.setattr(mappet.Mappet, '_wrap', classmethod(lambda cls, *args: wrapped.append(args) or wrap(cls, *args)))
+
+        nodes = m.a
+        assert len(nodes) == 5
+        assert not wrapped
+        nodes[3]
+        assert len(wrapped) == 1
+        next(iter(nodes))
+        assert len(wrapped) == 2
+
+    def test_eq(self, m):
+        assert m.a == list(m.a)
+        assert m.a[:2] == (m.a[0], m.a[1])
+        assert m.a[1:] != m.a[:-1]
+        assert m.a != 'a'
+
+    def test_repr(self, m):
+        assert repr(m.a[:2]) == '[0, 1]'
+
+    def test_sget__should_return_lists(self, m):
+        nodes = m.sget('a')
+
+        assert isinstance(nodes, mappet.MappetList)
+        assert self.values(nodes) == self.values(m.a)
+        assert m.sget_many(['a', 'a.3'])['a.3'].get() == '3'
+
+    def test_nodes(self):
+        m = mappet.Mappet.from_file(EXAMPLE_XML)
+        cars = m.reply.cars.car
+
+        assert [car.model_name.get() for car in cars] == ['X6', 'X1']
+        assert cars[0].hp.to_int() == 256
+        assert m.sget('reply.cars.car.-1.hp').to_int() == 198
+
+
+class TestMappetColumn(object):
+    u"""Tests for extraction of columns of values."""
+
+    XML = '''<root><cars>
+        <Car id="1"><HP>256</HP><weight>3690.5</weight></Car>
+        <!-- comment -->
+        <Car id="2"><HP>198</HP><weight>2890</weight></Car>
+        <Car id="x"><HP>n/a</HP></Car>
+        <Car id="4"/>
+    </cars></root>'''
+
+    @pytest.fixture
+    def m(self):
+        return mappet.Mappet(self.XML)
+
+    def test_column__should_return_array(self, m):
+        hp = m.column('cars.car', 'hp', missing='skip', invalid='skip', as_numpy=False)
+
+        assert isinstance(hp, array.array)
+        assert hp.typecode == mappet.ARRAY_TYPECODES['int64']
+        assert hp.tolist() == [256, 198]
+
+    def test_column__should_handle_missing_and_invalid_values(self, m):
+        assert m.column('cars.car', 'hp', missing=-1, invalid=0, as_numpy=False).tolist() == [256, 198, 0, -1]
+        assert m.column('cars.car', 'weight', 'float64', missing='skip', as_numpy=False).tolist() == [3690.5, 2890.0]
+
+        with pytest.raises(ValueError):
+            m.column('cars.car', 'hp', invalid='skip', as_numpy=False)
+        with pytest.raises(ValueError):
+            m.column('cars.car', 'hp', missing='skip', as_numpy=False)
+
+    def test_column__should_accept_paths_and_fields(self, m):
+        assert m.column('cars.car', '@id', 'int32', invalid=0, as_numpy=False).tolist() == [1, 2, 0, 4]
+        assert m.column('cars.car.0', 'hp', as_numpy=False).tolist() == [256]
+        assert m.column('cars.car.1.hp', '#text', 'float32', as_numpy=False).tolist() == [198.0]
+        assert m.column('cars.fake', 'hp', as_numpy=False).tolist() == []
+
+    def test_column__should_find_fields_by_normalized_names(self):
+        m = mappet.Mappet(
+            '<root><a><B>1</B><c><B>9</B></c></a><a><b>2</b></a><a><c><B>9</B></c><B>3</B><B>9</B></a>'
+            '<a><c><a><B>9</B></a></c></a><a><a-b>5</a-b></a></root>'
+        )
+        assert m.column('a', 'b', missing=0, as_numpy=False).tolist() == [1, 2, 3, 0, 0]
+        assert m.column('a', 'a_b', missing=0, as_numpy=False).tolist() == [0, 0, 0, 0, 5]
+        assert m.column('a.2', 'b', as_numpy=False).tolist() == [3]
+
+    def test_column__given_several_spellings__should_use_the_one_of_the_first_node(self):
+        m = mappet.Mappet('<r><car><HP>1</HP></car><car><HP>4</HP><hp>104</hp></car><car><hp>5</hp></car></r>')
+
+        assert m.column('car', 'hp', as_numpy=False).tolist() == [1, 4, 5]
+        assert m.sget('car.1.hp').to_int() == 104
+
+    def test_column__should_check_arguments(self, m):
+        with pytest.raises(ValueError):
+            m.column('cars.car', 'hp', dtype='complex128')
+        with pytest.raises(ValueError):
+            m.column('cars.car.@id', 'hp')
+
+    def test_column__should_not_wrap_nodes(self, m, monkeypatch):
+        monkeypatch.setattr(mappet.Mappet, '_wrap', None)
+        assert m.column('cars.car', 'hp', missing=0, invalid=0, as_numpy=False).tolist() == [256, 198, 0, 0]
+
+    def test_column__should_require_numpy(self, m, monkeypatch):
+        monkeypatch.setattr(mappet, '_import_numpy', lambda: None)
+
+        assert isinstance(m.column('cars.car.0', 'hp'), array.array)
+        with pytest.raises(ImportError):
+            m.column('cars.car.0', 'hp', as_numpy=True)
+
+    def test_column__should_return_numpy_arrays(self, m):
+        numpy = pytest.importorskip('numpy')
+        hp = m.column('cars.car', 'hp', missing=0, invalid=0)
+
+        assert isinstance(hp, numpy.ndarray)
+        assert hp.dtype == numpy.dtype('int64')
+        assert hp.tolist() == [256, 198, 0, 0]
+        assert m.column('cars.fake', 'hp', 'float32').dtype == numpy.dtype('float32')
+
+    @pytest.mark.parametrize('dtype', sorted(mappet.ARRAY_TYPECODES))
+    def test_column__should_use_typecodes_of_dtype_size(self, dtype):
+        bits = int(dtype.lstrip('uintfloa'))
+        assert array.array(mappet.ARRAY_TYPECODES[dtype]).itemsize * 8 == bits
+
+    def test_import__should_not_import_numpy(self):
+        code = 'import sys, mappet; mappet.Mappet("<a/>"); print("numpy" in sys.modules)'
+        assert subprocess.check_output([sys.executable, '-c', code]).strip() == 'False'
+
+
+class TestMappetTyped(object):
+    u"""Tests for typed views of values."""
+
+    SCHEMA = {
+        'head.id.@seq': int,
+        'head.date': datetime.datetime,
+        'head.initiator.#text': 'str',
+        'reply.cars.car.hp': 'int',
+        'reply.cars.car.1.weight': float,
+        'reply.cars.car.id.#text': int,
+        'reply.cars.fake': int,
+        'status': bool,
+    }
+
+    @pytest.fixture
+    def m(self):
+        return mappet.Mappet.from_file(EXAMPLE_XML)
+
+    def test_typed__should_convert_values(self, m):
+        view = m.typed(self.SCHEMA)
+
+        assert isinstance(view, mappet.TypedView)
+        assert dict(view) == {
+            'head.id.@seq': 20,
+            'head.date': m.head.date.to_datetime(),
+            'head.initiator.#text': u'Mr Sender',
+            'reply.cars.car.hp': [256, 198],
+            'reply.cars.car.1.weight': 2890.0,
+            'reply.cars.car.id.#text': [12345, 54321],
+            'reply.cars.fake': None,
+            'status': None,
+        }
+        assert view[mappet.Mappet.compile_path('head.id.@seq')] == 20
+        assert len(view) == len(self.SCHEMA)
+
+    def test_typed__should_match_sget(self, m):
+        paths = ['head.id.@seq', 'reply.cars.car.-1.hp', 'auth.user.@first-name', 'head.fake', 'reply.cars.car.2.hp']
+        view = m.typed({path: 'str' for path in paths})
+
+        for path in paths:
+            value = m.sget(path, default=None)
+            assert view[path] == (value.get() if isinstance(value, mappet.Literal) else value)
+
+    def test_typed__should_convert_equal_texts_once(self, m):
+        converted = []
+        converter = lambda value: converted.append(value) or int(value)
+
+        m.typed({'reply.cars.car.doors': converter, 'reply.cars.car.seats': converter})
+        assert converted == ['5']
+
+        m.reply.cars.typed({'car.0.doors': converter})
+        assert converted == ['5']
+
+    def test_typed__after_assignment__should_convert_values_again(self, m):
+        counter = iter(xrange(10))
+        converter = lambda value: (value, next(counter))
+
+        assert m.typed({'head.type': converter})['head.type'] == ('reply-type', 0)
+        m.head.type = 'reply-type'
+        assert m.typed({'head.type': converter})['head.type'] == ('reply-type', 1)
+
+    def test_typed__should_keep_a_bounded_number_of_converted_values(self, monkeypatch):
+        monkeypatch.setattr(mappet, 'CONVERSION_CACHE_SIZE', 2)
+        m = mappet.Mappet('<cars>{}</cars>'.format(''.join('<car><hp>{}</hp></car>'.format(i) for i in xrange(5))))
+
+        assert m.typed({'car.hp': int})['car.hp'] == range(5)
+        assert len(m._get_index()._converted) == 2
+
+    def test_typed__should_use_class_schema(self, m):
+        class Message(mappet.Mappet):
+            schema = {'reply.cars.car.hp': int}
+
+        assert Message(m.to_str()).typed()['reply.cars.car.hp'] == [256, 198]
+
+        with pytest.raises(ValueError):
+            m.typed()
+
+    def test_typed__should_map_types_to_helpers(self):
+        m = mappet.Mappet('<root><date>2015-07-13</date><time>10:56</time><flag>NO</flag><price>1.10</price></root>')
+        view = m.typed({'date': datetime.date, 'time': datetime.time, 'flag': bool, 'price': Decimal})
+
+        assert dict(view) == {
+            'date': datetime.date(2015, 7, 13),
+            'time': datetime.time(10, 56),
+            'flag': False,
+            'price': Decimal('1.10'),
+        }
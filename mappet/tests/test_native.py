@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+
+# pylint: disable=invalid-name, line-too-long
+
+u"""Unittests for native mappet elements.
+
+.. :module: test_native
+   :synopsis: Unittests for native mappet elements.
+"""
+from copy import deepcopy
+from io import BytesIO
+import pickle
+
+from lxml import etree
+import pytest
+
+from mappet import mappet, native
+from mappet.parsing import FAST_PARSER
+
+from . import test_mappet
+from .test_mappet import EXAMPLE_XML
+
+PATHS = [
+    'head',
+    'head.id.@seq',
+    'head.initiator',
+    'head.initiator.#text',
+    'auth.user.@first-name',
+    'reply.cars.car.0.manufacturer',
+    'reply.cars.car.1.hp',
+    'reply.cars.car.-1.model_name',
+    'reply.cars.car.2.hp',
+    'reply.fake_node',
+    'status.result.fake_node',
+]
+
+
+@pytest.fixture
+def m():
+    return native.parse(EXAMPLE_XML)
+
+
+@pytest.fixture
+def wrapped():
+    return mappet.Mappet.from_file(EXAMPLE_XML)
+
+
+class TestMappetElement(object):
+    u"""Tests comparing native elements with mappet objects."""
+
+    def test_parse__should_create_native_elements(self, m):
+        assert isinstance(m, native.MappetElement)
+        assert all(isinstance(element, native.MappetElement) for element in m.iter(etree.Element))
+
+    def test_fromstring(self):
+        m = native.fromstring('<root><a>A</a></root>')
+        assert m.a.get_value() == 'A'
+
+    def test_fromstring__should_accept_parser_options(self):
+        config = FAST_PARSER.updated(element_class=native.MappetElement)
+        m = native.fromstring('<root>\n  <a>A</a>\n  <!-- B -->\n</root>', config)
+
+        assert isinstance(m.a, native.MappetElement)
+        assert m.to_str() == '<root><a>A</a></root>'
+
+    def test_child_access__should_not_wrap_elements(self, m):
+        cars = m.reply.cars
+        assert cars is m.reply.cars
+        car = cars.car[0]
+        assert car is cars.car[0]
+        assert car.hp.getparent() is car
+
+    @pytest.mark.parametrize('path', PATHS)
+    def test_sget__should_match_mappet(self, m, wrapped, path):
+        expected = wrapped.sget(path)
+        value = m.sget(path)
+
+        if isinstance(expected, mappet.Mappet):
+            assert value.to_dict() == expected.to_dict()
+        elif isinstance(expected, mappet.Literal):
+            assert value.get_value() == expected.get()
+            assert repr(value) == repr(expected)
+        else:
+            assert value == expected
+
+        assert (path in m) == (path in wrapped)
+
+    def test_repr(self, m, wrapped):
+        assert repr(m) == repr(wrapped)
+        assert repr(m.head) == repr(wrapped.head)
+        assert repr(m.head.initiator) == 'Mr Sender'
+
+    def test_literal(self, m):
+        hp = m.reply.cars.car[0].hp
+
+        assert hp.to_int() == 256
+        assert int(hp) == 256
+        assert float(hp) == 256.0
+        assert str(hp) == '256'
+        assert hp + 'km' == '256km'
+        assert 'hp: ' + hp == 'hp: 256'
+        assert hp.get_value(callback=int) == 256
+        assert 'to_int' in dir(hp)
+
+        with pytest.raises(AttributeError):
+            hp.child
+
+    def test_dict_access(self, m, wrapped):
+        assert m['reply']['cars']['car'][0]['manufacturer'] == 'BMW'
+        assert m['head']['id'] is None
+        assert m.head.id['@seq'] == '20'
+        assert m.head['@missing'] is None
+        assert isinstance(m[0], native.MappetElement)
+
+    def test_missing_child(self, m):
+        with pytest.raises(KeyError):
+            m.fake_node
+
+    def test_keys_and_dir(self, m, wrapped):
+        assert m.child_keys() == wrapped.keys()
+        assert m.reply.cars.child_keys() == wrapped.reply.cars.keys()
+        assert dir(m.head) == dir(wrapped.head)
+
+    def test_to_dict(self, m, wrapped):
+        assert m.to_dict() == wrapped.to_dict()
+        assert m.to_dict(without_comments=True) == wrapped.to_dict(without_comments=True)
+
+    def test_to_json(self, m, wrapped):
+        assert m.to_json() == wrapped.to_json()
+        assert m.reply.to_json(without_comments=True) == wrapped.reply.to_json(without_comments=True)
+
+    def test_to_str(self, m, wrapped):
+        assert m.head.to_str() == wrapped.head.to_str()
+        assert m.reply.to_str(without_comments=True) == wrapped.reply.to_str(without_comments=True)
+        assert m.head.initiator.to_str() == u'Mr Sender'
+
+    def test_xpath_one(self, m, wrapped):
+        assert [hp.get_value() for hp in m.xpath_one('//HP')] == ['256', '198']
+        assert m.xpath_one('head/initiator').get_value() == 'Mr Sender'
+        assert m.xpath_one('//*[re:test(., "^mr", "i")]', regexp=True).get_value() == 'Mr Sender'
+        assert m.xpath_one('string(head/type)', single_use=True) == 'reply-type'
+
+    def test_eq(self, m):
+        assert m.head == native.parse(EXAMPLE_XML).head
+        assert m.head != m.auth
+        assert m.head.initiator == m.head.initiator
+        assert m.head.initiator != native.parse(EXAMPLE_XML).head.initiator
+
+    def test_set(self, m, wrapped):
+        for node in (m, wrapped):
+            node.head.initiator = 'Other'
+            node.head.new_node = {'a': 'A', 'b': {'#text': 'B', '@attr': 'val'}}
+            node.status = [{'result': 'NOK'}, {'result': 'OK'}]
+            node.head.update(type='other', seq=5)
+            node.auth.create('token', 'T')
+
+        assert m.to_dict() == wrapped.to_dict()
+        assert m.head.new_node.b['@attr'] == 'val'
+        assert m.head.new_node.assign('c', 'C') is None
+        assert m.head.new_node.c.get_value() == 'C'
+        assert all(isinstance(element, native.MappetElement) for element in m.iter(etree.Element))
+
+    def test_set__should_keep_element_properties(self, m):
+        m.head.initiator.text = 'Other'
+        assert m.head.initiator.get_value() == 'Other'
+
+        with pytest.raises(KeyError):
+            m.auth.create('user', 'other')
+
+    def test_setattr(self, m):
+        m.head.setattr('ver', 2)
+        m.head.initiator.setattr('text', 'Other')
+
+        assert m.head.getattr('ver', callback=int) == 2
+        assert m.head.get('ver') == '2'
+        assert m.head.initiator.getattr('text') == 'Other'
+
+    def test_delete(self, m):
+        del m.head.initiator
+        del m['auth']
+        del m.reply.cars[0]
+
+        assert m.head.child_keys() == {'id', 'date', 'type'}
+        assert m.child_keys() == {'head', 'status', 'reply'}
+
+    def test_pickle(self, m):
+        restored = pickle.loads(pickle.dumps(m.head))
+
+        assert isinstance(restored, native.MappetElement)
+        assert restored.to_str() == etree.tostring(m.head, with_tail=False)
+
+    def test_deepcopy(self, m):
+        copied = deepcopy(m.head)
+        copied.initiator = 'Other'
+
+        assert isinstance(copied.initiator, native.MappetElement)
+        assert m.head.initiator.get_value() == 'Mr Sender'
+
+    def test_iter_records(self):
+        cars = [car.hp.to_int() for car in native.iter_records(EXAMPLE_XML, 'car')]
+        assert cars == [256, 198]
+
+    def test_iter_records__should_accept_file_objects(self):
+        with open(EXAMPLE_XML, 'rb') as xml:
+            source = BytesIO(xml.read())
+
+        assert [car.model_name.get_value() for car in native.iter_records(source, 'car')] == ['X6', 'X1']
+
+    def test_get__without_attribute_name__should_return_the_value(self, m):
+        hp = m.reply.cars.car[0].hp
+
+        assert hp.get() == '256'
+        assert hp.get(callback=int) == 256
+        assert m.head.id.get('seq') == '20'
+        assert m.head.id.get('missing', default='x') == 'x'
+
+    def test_lxml_api__should_be_kept(self, m):
+        hp = m.reply.cars.car[0].hp
+
+        assert len(hp) == 0
+        assert len(m.head) == len(etree._Element.getchildren(m.head))
+        assert m.head.id.get('seq') == '20'
+        assert m.head.id.keys() == ['seq', 'tstamp']
+        m.head.set('ver', '2')
+        assert m.head.attrib == {'ver': '2'}
+        assert [element.text for element in m.xpath('head/initiator')] == ['Mr Sender']
+
+
+class TestMappetOfNativeElements(object):
+    u"""Tests wrapping native elements in mappet objects, like plain ones."""
+
+    @pytest.fixture
+    def m(self):
+        return mappet.Mappet.from_file(EXAMPLE_XML, parser_config=native.NATIVE_PARSER)
+
+    @pytest.mark.parametrize('path', PATHS)
+    def test_sget__should_match_plain_elements(self, m, wrapped, path):
+        value = m.sget(path)
+        expected = wrapped.sget(path)
+
+        assert type(value) is type(expected)
+        assert repr(value) == repr(expected)
+
+    def test_conversions__should_match_plain_elements(self, m, wrapped):
+        assert m.to_dict() == wrapped.to_dict()
+        assert m.to_json() == wrapped.to_json()
+        assert ''.join(m.iter_bytes(64)) == wrapped.to_str()
+        assert [hp.text for hp in m.xpath('//HP')] == [hp.text for hp in wrapped.xpath('//HP')]
+        assert list(m.iter_dicts('reply.cars.car')) == list(wrapped.iter_dicts('reply.cars.car'))
+
+    def test_iter_records__should_match_plain_elements(self):
+        records = mappet.Mappet.iter_records(EXAMPLE_XML, 'car', native.NATIVE_PARSER)
+        assert [record.hp.to_int() for record in records] == [256, 198]
+
+
+class TestNativeElementsWithMappetTests(test_mappet.TestMappet):
+    u"""Runs the tests of mappet objects on native elements.
+
+    Tests of the wrapper's internals and of the names keeping their ``lxml``
+    meaning (``keys``, ``xpath`` and ``bool``, which warns) are left out.
+    """
+
+    def setup(self):
+        super(TestNativeElementsWithMappetTests, self).setup()
+        self.xml = self.m = native.fromstring(etree.tostring(self.xml))
+
+    test__nonzero__ = None
+    test__setattr__ = None
+    test_slots__should_not_create_instance_dicts = None
+    test__getstate__ = None
+    test__setstate__ = None
+    test_set = None
+    test__get_aliases = None
+    test_keys = None
+    test_xpath__given_existing_leaf__should_return_that_leaf = None
+    test_create_xpath_evaluator = None
+    test_xpath_regexp = None
+    test_xpath_regexp_exslt = None
+
+
+class TestNativeLeavesWithLiteralTests(test_mappet.TestLiteral):
+    u"""Runs the tests of literals on native leaves.
+
+    Tests of the wrapper's internals and of ``len`` and ``bool``, which keep
+    their ``lxml`` meaning (leaves have no children), are left out.
+    """
+
+    @pytest.fixture
+    def literal(self):
+        return native.fromstring('<root><literal_node>literal-text</literal_node></root>').literal_node
+
+    test__int__ = None
+    test__float__ = None
+    test_to_decimal = None
+    test__nonzero__ = None
+    test__eq__ = None
+    test__hash__ = None
+    test__len__ = None
+    test_get_empty_text = None
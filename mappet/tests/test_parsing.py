@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+u"""Unittests for parser configuration.
+
+.. :module: test_parsing
+   :synopsis: Unittests for parser configuration.
+"""
+from io import BytesIO
+import pickle
+import threading
+
+from lxml import etree
+from mappet import mappet
+from mappet import parsing
+
+
+XML = '''<root>
+    <!-- a comment -->
+    <a>A</a>
+</root>'''
+
+
+class FastMappet(mappet.Mappet):
+    parser_config = parsing.FAST_PARSER
+
+
+class CustomElement(etree.ElementBase):
+    u"""Element class used to test the lookup set by a parser configuration."""
+
+
+class TestParserConfig(object):
+    u"""Unittests for the class describing parser options."""
+
+    def test_parser__should_be_reused_within_a_thread(self):
+        config = parsing.ParserConfig(remove_blank_text=True)
+        assert isinstance(config.parser(), etree.XMLParser)
+        assert config.parser() is config.parser()
+
+    def test_parser__should_differ_between_threads(self):
+        config = parsing.ParserConfig()
+        parsers = []
+        thread = threading.Thread(target=lambda: parsers.append(config.parser()))
+        thread.start()
+        thread.join()
+
+        assert parsers[0] is not config.parser()
+
+    def test_updated__should_return_new_config(self):
+        config = parsing.ParserConfig(remove_comments=True)
+        updated = config.updated(huge_tree=True)
+
+        assert updated.options == {'remove_comments': True, 'huge_tree': True}
+        assert config.options == {'remove_comments': True}
+
+    def test__repr__(self):
+        assert repr(parsing.FAST_PARSER) == (
+            'ParserConfig(collect_ids=False, remove_blank_text=True, '
+            'remove_comments=True, resolve_entities=False)'
+        )
+
+    def test_pickle__should_keep_options(self):
+        config = pickle.loads(pickle.dumps(parsing.FAST_PARSER))
+        assert config.options == parsing.FAST_PARSER.options
+        assert isinstance(config.parser(), etree.XMLParser)
+
+    def test_iterparse__should_use_options(self):
+        events = parsing.FAST_PARSER.iterparse(BytesIO(XML), events=('end',))
+        assert [element.tag for _, element in events] == ['a', 'root']
+
+    def test_element_class__should_be_used_by_all_parsers(self):
+        config = parsing.ParserConfig(element_class=CustomElement)
+        events = config.iterparse(BytesIO(XML), events=('end',))
+        pull_parser = config.pull_parser()
+        pull_parser.feed(XML)
+
+        assert isinstance(etree.fromstring(XML, config.parser()), CustomElement)
+        assert all(isinstance(element, CustomElement) for _, element in events)
+        assert isinstance(pull_parser.close(), CustomElement)
+        assert pickle.loads(pickle.dumps(config)).options == {'element_class': CustomElement}
+
+
+class TestMappetParserConfig(object):
+    u"""Tests for parsing mappet objects with configured parsers."""
+
+    def test_parser__should_default_to_class_config(self):
+        assert mappet.Mappet.parser() is parsing.DEFAULT_PARSER.parser()
+        assert FastMappet.parser() is parsing.FAST_PARSER.parser()
+        assert mappet.Mappet.parser(parsing.FAST_PARSER) is parsing.FAST_PARSER.parser()
+
+    def test_init__given_parser_config__should_use_it(self):
+        assert mappet.Mappet(XML).to_str() == XML
+        assert mappet.Mappet(XML, parsing.FAST_PARSER).to_str() == '<root><a>A</a></root>'
+
+    def test_from_file_and_from_bytes__given_parser_config__should_use_it(self):
+        assert mappet.Mappet.from_file(BytesIO(XML), parsing.FAST_PARSER).to_str() == '<root><a>A</a></root>'
+        assert mappet.Mappet.from_bytes(XML, parsing.FAST_PARSER).to_str() == '<root><a>A</a></root>'
+        assert mappet.Mappet.from_bytes(bytearray(XML), parsing.FAST_PARSER).to_str() == '<root><a>A</a></root>'
+
+    def test_iter_records__given_parser_config__should_use_it(self):
+        records = mappet.Mappet.iter_records(BytesIO(XML), 'root', parsing.FAST_PARSER)
+        assert [record.to_str() for record in records] == ['<root><a>A</a></root>']
+
+    def test__setstate__should_use_class_config(self):
+        m = FastMappet.__new__(FastMappet)
+        m.__setstate__(mappet.Mappet(XML).__getstate__())
+        assert m.to_str() == '<root><a>A</a></root>'
+
+        m = pickle.loads(pickle.dumps(FastMappet(XML)))
+        assert m.to_str() == '<root><a>A</a></root>'